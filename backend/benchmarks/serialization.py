@@ -0,0 +1,134 @@
+"""
+Benchmark of the document list response path on 100-document pages.
+
+Compares the previous path (stdlib JSON decode of the PostgREST body,
+Document(**row) per row, response_model validation and serialization) with
+the fast path (orjson decode, rows returned as-is through FastJSONResponse),
+and the cost and savings of response compression.
+
+Run from the backend directory:
+    
+    python -m benchmarks.serialization [--pages 100] [--requests 2000]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+
+import orjson
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import CompressionMiddleware, brotli  # noqa: E402
+from models import Document  # noqa: E402
+from responses import FastJSONResponse  # noqa: E402
+
+
+def make_rows(count: int) -> List[dict]:
+    """Rows shaped like PostgREST output for DOCUMENT_COLUMNS."""
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "title": f"Relatório financeiro {i}",
+            "author": "Maria Silva",
+            "category": "Financeiro",
+            "tags": ["relatório", "2025", "trimestral"],
+            "description": "Resumo das receitas e despesas do trimestre, com projeções. " * 3,
+            "id": str(uuid.UUID(int=i)),
+            "file_name": f"relatorio_{i}.pdf",
+            "file_type": "pdf",
+            "file_size": 1024 * (i + 1),
+            "file_url": f"https://example.supabase.co/storage/v1/object/public/documents/{uuid.UUID(int=i).hex}.pdf",
+            "content_hash": uuid.UUID(int=i).hex * 2,
+            "created_at": (now + timedelta(minutes=i)).isoformat(),
+            "updated_at": (now + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def cpu_per_call(function: Callable[[], object], calls: int) -> float:
+    """Average process CPU time of a call, in microseconds."""
+    function()
+    start = time.process_time()
+    for _ in range(calls):
+        function()
+    return (time.process_time() - start) / calls * 1e6
+
+
+def build_app(body: bytes) -> FastAPI:
+    """App serving the same PostgREST body through both paths."""
+    app = FastAPI()
+    
+    @app.get("/legacy", response_model=List[Document])
+    async def legacy():
+        return [Document(**doc) for doc in json.loads(body)]
+    
+    @app.get("/fast", response_model=List[Document])
+    async def fast():
+        return FastJSONResponse(orjson.loads(body))
+    
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=100, help="documents per page")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per measurement")
+    args = parser.parse_args()
+    
+    rows = make_rows(args.pages)
+    body = json.dumps(rows).encode()
+    print(f"{args.pages}-document page, PostgREST body {len(body)} bytes\n")
+    
+    print("Serialization path (CPU per call, in-process):")
+    legacy_parts = {
+        "decode (json)": lambda: json.loads(body),
+        "Document(**row)": lambda: [Document(**doc) for doc in rows],
+        "response_model serialize": lambda: json.dumps(
+            [Document(**doc).model_dump(mode="json") for doc in rows]
+        ).encode(),
+    }
+    fast_parts = {
+        "decode (orjson)": lambda: orjson.loads(body),
+        "encode (orjson)": lambda: orjson.dumps(rows),
+    }
+    for name, function in {**legacy_parts, **fast_parts}.items():
+        print(f"  {name:<28}{cpu_per_call(function, args.requests):>10.1f} us")
+    
+    client = TestClient(build_app(body))
+    headers = {"Accept-Encoding": "identity"}
+    assert client.get("/legacy", headers=headers).status_code == 200
+    legacy = cpu_per_call(lambda: client.get("/legacy", headers=headers), args.requests)
+    fast = cpu_per_call(lambda: client.get("/fast", headers=headers), args.requests)
+    print("\nFull request through FastAPI (CPU per request, includes test client overhead):")
+    print(f"  {'legacy':<28}{legacy:>10.1f} us")
+    print(f"  {'fast':<28}{fast:>10.1f} us")
+    print(f"  {'saved':<28}{legacy - fast:>10.1f} us ({(legacy - fast) / legacy:.0%})")
+    
+    payload = orjson.dumps(rows)
+    print(f"\nCompression of the {len(payload)}-byte response:")
+    codecs = {"gzip level 6": lambda: gzip.compress(payload, compresslevel=6)}
+    if brotli is not None:
+        codecs["brotli quality 4"] = lambda: brotli.compress(payload, mode=brotli.MODE_TEXT, quality=4)
+    else:
+        print("  (brotli not installed, skipped)")
+    for name, function in codecs.items():
+        size = len(function())
+        print(f"  {name:<28}{cpu_per_call(function, args.requests // 10 or 1):>10.1f} us  {size} bytes ({size / len(payload):.0%})")
+    
+    compressed = TestClient(CompressionMiddleware(build_app(body)))
+    response = compressed.get("/fast", headers={"Accept-Encoding": "gzip"})
+    print(f"  via middleware: Content-Encoding {response.headers.get('content-encoding')}, "
+          f"{response.headers.get('content-length')} bytes on the wire")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import asyncio
+import zlib
+from typing import Dict, Optional, Union
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Bodies at least this large are compressed in a worker thread
+THREAD_MINIMUM_SIZE = 128 * 1024
+
+# Media types that are already compressed, or must reach the client unbuffered
+EXCLUDED_CONTENT_TYPES = (
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    "audio/",
+    "image/",
+    "video/",
+    "font/woff",
+    "text/event-stream",
+)
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}."""
+    encodings = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            encodings[coding.lower()] = q
+    return encodings
+
+
+class GZipEncoder:
+    """Gzip stream of a response body."""
+    
+    content_encoding = "gzip"
+    
+    def __init__(self, level: int):
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        """Compress a body chunk, flushing it so streamed chunks reach the client."""
+        if more_body:
+            return self._compressor.compress(body) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self._compressor.compress(body) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    """Brotli stream of a response body."""
+    
+    content_encoding = "br"
+    
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+    
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        """Compress a body chunk, flushing it so streamed chunks reach the client."""
+        if more_body:
+            return self._compressor.process(body) + self._compressor.flush()
+        return self._compressor.process(body) + self._compressor.finish()
+
+
+class CompressionResponder:
+    """
+    Sends one response, compressed with encoder unless it is too small or excluded.
+    
+    The start message is held back until the first body chunk shows whether
+    the response is worth compressing. Single-chunk bodies smaller than
+    minimum_size go out as they are; streamed bodies are compressed chunk
+    by chunk without a Content-Length. Without an encoder (the client
+    accepts neither brotli nor gzip) bodies are sent as they are, still
+    marked as varying by Accept-Encoding for caches.
+    """
+    
+    def __init__(self, app: ASGIApp, minimum_size: int, encoder: Optional[Union[GZipEncoder, BrotliEncoder]]):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoder = encoder
+        self.send: Optional[Send] = None
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressing = False
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+    
+    async def _compress(self, body: bytes, more_body: bool) -> bytes:
+        if len(body) >= THREAD_MINIMUM_SIZE:
+            return await asyncio.to_thread(self.encoder.compress, body, more_body)
+        return self.encoder.compress(body, more_body)
+    
+    async def send_with_compression(self, message: Message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] == 206
+                or media_type.startswith(EXCLUDED_CONTENT_TYPES)
+            )
+            if self.passthrough:
+                await self.send(message)
+            else:
+                self.start_message = message
+            return
+        
+        if message_type != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+        
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressing:
+            await self.send({**message, "body": await self._compress(body, more_body)})
+            return
+        
+        start_message, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=start_message["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if self.encoder is None or (len(body) < self.minimum_size and not more_body):
+            self.passthrough = True
+            await self.send(start_message)
+            await self.send(message)
+            return
+        
+        self.compressing = True
+        body = await self._compress(body, more_body)
+        headers["Content-Encoding"] = self.encoder.content_encoding
+        if more_body:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(len(body))
+        await self.send(start_message)
+        await self.send({**message, "body": body})
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least minimum_size bytes with brotli or gzip.
+    
+    The encoding is negotiated from Accept-Encoding, preferring brotli when
+    the brotli package is installed. Responses that already have a
+    Content-Encoding or an already-compressed type (e.g. the gzip export)
+    are passed through untouched.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+    
+    def _encoding(self, scope: Scope) -> Optional[str]:
+        """Best encoding the client accepts, or None."""
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = self._encoding(scope)
+        if encoding == "br":
+            encoder = BrotliEncoder(self.brotli_quality)
+        elif encoding == "gzip":
+            encoder = GZipEncoder(self.gzip_level)
+        else:
+            encoder = None
+        await CompressionResponder(self.app, self.minimum_size, encoder)(scope, receive, send)
@@ -9,14 +9,98 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_key: str
     
+    # Supabase HTTP pool
+    supabase_max_connections: int = 20
+    supabase_max_keepalive_connections: int = 10
+    supabase_keepalive_expiry: float = 30.0
+    supabase_max_concurrency: int = 10
+    supabase_timeout: float = 30.0
+    
     # OpenAI
     openai_api_key: str
+    openai_max_concurrency: int = 4
+    
+    # AI analysis cache (SQLite file shared by all workers on the host)
+    analysis_cache_path: str = "analysis_cache.sqlite3"
+    analysis_cache_max_entries: int = 10000
+    analysis_cache_ttl: int = 30 * 24 * 3600
+    
+    # Long documents are analyzed in chunks of at most analysis_chunk_tokens tokens
+    analysis_chunk_tokens: int = 1500
+    analysis_chunk_min_tokens: int = 500
+    
+    # Semantic search: embeddings provider ("openai" or the local "hashing" stand-in),
+    # index location, catch-up interval in seconds, and size above which search uses LSH
+    embedding_provider: str = "openai"
+    embedding_index_dir: str = "embeddings"
+    embedding_sync_interval: int = 60
+    embedding_exact_threshold: int = 20000
+    embedding_cache_max_entries: int = 100000
+    
+    # Near-duplicate detection: minimum estimated text similarity (Jaccard) reported,
+    # and seconds between catch-ups with other processes' uploads
+    duplicate_threshold: float = 0.8
+    duplicate_sync_interval: int = 60
+    
+    # Local tag suggestions: tags scoring below tag_suggestion_min_score are dropped,
+    # and GPT is asked when no tag reaches tag_suggestion_min_confidence
+    tag_suggestion_min_score: float = 0.1
+    tag_suggestion_min_confidence: float = 0.3
+    tag_sync_interval: int = 60
+    
+    # Local category classifier run before AI analyses: at or above min_confidence its
+    # category is used and classified_analysis_model extracts the rest of the metadata
+    category_classifier_path: str = "category_model.npz"
+    category_classifier_min_confidence: float = 0.9
+    category_classifier_min_documents: int = 100
+    category_classifier_sync_interval: int = 60
+    classified_analysis_model: str = "gpt-3.5-turbo"
+    
+    # Default parallel analyses per /analyze-batch request
+    batch_analysis_workers: int = 4
+    
+    # Background analysis jobs
+    job_workers: int = 2
+    job_poll_interval: float = 5.0
+    job_max_attempts: int = 3
+    job_retry_backoff: float = 30.0
+    job_lease_seconds: int = 300
+    
+    # Bulk import (records per insert, concurrent inserts per request)
+    import_batch_size: int = 500
+    import_concurrency: int = 4
+    
+    # Text extraction (process pool; stops after extraction_max_chars)
+    extraction_workers: int = 2
+    extraction_max_chars: int = 100000
+    extraction_max_file_size: int = 50 * 1024 * 1024
+    
+    # Documents per database read when streaming /api/documents/export
+    export_batch_size: int = 1000
+    
+    # Seconds /api/documents/changes waits before serving a change, so slower
+    # concurrent transactions cannot commit behind the returned watermark
+    changes_settle_seconds: int = 5
     
     # Application
     app_name: str = "Document Management System"
     app_version: str = "1.0.0"
     debug: bool = True
     
+    # Analytics rollups drift check interval in seconds (0 disables)
+    analytics_reconcile_interval: int = 3600
+    # Max seconds a cached analytics payload is served (bounds cross-worker staleness)
+    analytics_cache_ttl: int = 60
+    
+    # Response compression (brotli when installed, else gzip) for bodies of at least minimum_size bytes
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    
+    # Uploads
+    max_upload_size: int = 500 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
+    
     # CORS
     frontend_url: str = "http://localhost:3000"
     
@@ -1,10 +1,22 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import logging
 
 from config import settings
-from routes import documents, analytics
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware, render as render_metrics
+from routes import documents, analytics, jobs
+from services.supabase_service import supabase_service
+from services.job_service import job_service
+from services.extraction_service import extraction_service
+from services.embedding_service import embedding_service
+from services.duplicate_service import duplicate_service
+from services.tag_service import tag_service
+from services.category_classifier import category_classifier
+from services.chunking import load_tokenizer
 
 # Configure logging
 logging.basicConfig(
@@ -14,13 +26,56 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+
+async def reconcile_analytics_periodically(interval: int):
+    """Periodically check the analytics rollups for drift and repair them."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await supabase_service.reconcile_analytics()
+        except Exception as e:
+            logger.error(f"Analytics reconciliation failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Manage resources that live for the whole application lifetime."""
+    # Loaded (and downloaded if needed) now rather than inside the first long analysis
+    await asyncio.to_thread(load_tokenizer)
+    
+    background_tasks = []
+    if settings.analytics_reconcile_interval > 0:
+        background_tasks.append(asyncio.create_task(
+            reconcile_analytics_periodically(settings.analytics_reconcile_interval)
+        ))
+    job_service.start()
+    embedding_service.start()
+    duplicate_service.start()
+    tag_service.start()
+    category_classifier.start()
+    
+    yield
+    
+    await category_classifier.stop()
+    await tag_service.stop()
+    await duplicate_service.stop()
+    await embedding_service.stop()
+    await job_service.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    extraction_service.shutdown()
+    await supabase_service.close()
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="Sistema de Gestão de Documentos com IA e Automação",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -30,12 +85,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+
+
+# Compress large responses (brotli or gzip, as the client accepts)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality
 )
 
 
+# Time every request, compression included (added last, so it runs first)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(documents.router)
 app.include_router(analytics.router)
+app.include_router(jobs.router)
 
 
 @app.get("/")
@@ -55,6 +124,13 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics of this worker process."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler."""
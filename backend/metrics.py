@@ -0,0 +1,203 @@
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Upstream calls range from cached PostgREST reads to minute-long GPT-4 analyses
+UPSTREAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve an HTTP request, by route template",
+    ["method", "route", "status"]
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being served",
+    ["method"]
+)
+
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Time of calls to Supabase and OpenAI, errors included",
+    ["upstream", "operation"],
+    buckets=UPSTREAM_BUCKETS
+)
+
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Failed calls to Supabase and OpenAI (error responses and transport errors)",
+    ["upstream", "operation"]
+)
+
+UPLOAD_BYTES = Counter(
+    "upload_bytes_total",
+    "Bytes of files received by document uploads"
+)
+
+UPLOADS = Counter(
+    "uploads_total",
+    "Files received by document uploads"
+)
+
+
+def upstream_labels(method: str, path: str) -> Tuple[str, str]:
+    """(upstream, operation) of a Supabase API path, e.g. ("supabase_table", "GET documents")."""
+    parts = path.split("/")
+    if parts[1] == "storage":
+        return "supabase_storage", method
+    if parts[3] == "rpc":
+        return "supabase_table", f"RPC {parts[4]}"
+    return "supabase_table", f"{method} {parts[3]}"
+
+
+@asynccontextmanager
+async def track_upstream(upstream: str, operation: str) -> AsyncIterator[None]:
+    """Time an upstream call, counting it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(upstream, operation).inc()
+        raise
+    finally:
+        UPSTREAM_DURATION.labels(upstream, operation).observe(time.perf_counter() - start)
+
+
+class CacheCollector(Collector):
+    """
+    Reads the hit and miss counters of caches when metrics are scraped.
+    
+    The caches keep counting as they always did, so lookups pay nothing extra.
+    """
+    
+    def __init__(self):
+        """Initialize the collector with no caches."""
+        self._caches: Dict[str, Callable[[], Optional[object]]] = {}
+    
+    def register(self, name: str, cache: Callable[[], Optional[object]]):
+        """
+        Report a cache under name.
+        
+        cache returns the object with hits and misses attributes, or None
+        while it does not exist (e.g. before startup).
+        """
+        self._caches[name] = cache
+    
+    def collect(self) -> Iterator[CounterMetricFamily]:
+        """Current hit, miss and hit ratio values of the registered caches."""
+        hits = CounterMetricFamily("cache_hits", "Cache lookups that found an entry", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that found no entry", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Share of cache lookups that found an entry", labels=["cache"])
+        for name, get_cache in self._caches.items():
+            cache = get_cache()
+            if cache is None:
+                continue
+            lookups = cache.hits + cache.misses
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            ratio.add_metric([name], cache.hits / lookups if lookups else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+class ClassifierCollector(Collector):
+    """Reads the prediction counters of the local category classifier when metrics are scraped."""
+    
+    def __init__(self):
+        """Initialize the collector with no classifier."""
+        self._classifier: Optional[object] = None
+    
+    def register(self, classifier: object):
+        """Report classifier, an object with predictions, hits, checked and agreed attributes."""
+        self._classifier = classifier
+    
+    def collect(self) -> Iterator[CounterMetricFamily]:
+        """Current prediction, hit and agreement values of the classifier."""
+        classifier = self._classifier
+        if classifier is None:
+            return
+        yield CounterMetricFamily(
+            "category_classifier_predictions",
+            "Documents the local classifier predicted a category for",
+            value=classifier.predictions
+        )
+        yield CounterMetricFamily(
+            "category_classifier_hits",
+            "Confident predictions, applied without asking GPT-4 for the category",
+            value=classifier.hits
+        )
+        yield GaugeMetricFamily(
+            "category_classifier_hit_ratio",
+            "Share of predictions confident enough to skip GPT-4's category",
+            value=classifier.hits / classifier.predictions if classifier.predictions else 0.0
+        )
+        yield CounterMetricFamily(
+            "category_classifier_checked",
+            "Unconfident predictions compared with GPT-4's category",
+            value=classifier.checked
+        )
+        yield CounterMetricFamily(
+            "category_classifier_agreed",
+            "Unconfident predictions that matched GPT-4's category",
+            value=classifier.agreed
+        )
+        yield GaugeMetricFamily(
+            "category_classifier_agreement_ratio",
+            "Share of unconfident predictions that matched GPT-4's category",
+            value=classifier.agreed / classifier.checked if classifier.checked else 0.0
+        )
+
+
+classifier_collector = ClassifierCollector()
+REGISTRY.register(classifier_collector)
+
+
+class MetricsMiddleware:
+    """Records the latency of every HTTP request by route template, and the requests in flight."""
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        status = 500
+        
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        in_flight = REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            # The router stores the matched route in the scope; templates keep the label set small
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                method,
+                route.path_format if route is not None else "unmatched",
+                str(status)
+            ).observe(time.perf_counter() - start)
+
+
+def render() -> Tuple[bytes, str]:
+    """All metrics of this process in the Prometheus text format, with its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -14,6 +14,14 @@ class CategoryEnum(str, Enum):
     GERAL = "Geral"
 
 
+class JobStatusEnum(str, Enum):
+    """Background job states."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class DocumentBase(BaseModel):
     """Base document model."""
     title: str = Field(..., min_length=1, max_length=255)
@@ -29,6 +37,10 @@ class DocumentCreate(DocumentBase):
     file_type: str
     file_size: int
     file_url: str
+    content_hash: Optional[str] = None
+    content_text: Optional[str] = None
+    # MinHash signature of content_text as a bytea literal, computed at upload
+    content_minhash: Optional[str] = Field(None, pattern=r"^\\x([0-9a-f]{1024})?$")
 
 
 class DocumentUpdate(BaseModel):
@@ -40,6 +52,11 @@ class DocumentUpdate(BaseModel):
     description: Optional[str] = None
 
 
+class AnalysisUpdate(DocumentUpdate):
+    """Metadata update applied from an AI analysis, recording where its category came from."""
+    category_source: Optional[str] = None
+
+
 class Document(DocumentBase):
     """Complete document model with all fields."""
     id: str
@@ -47,6 +64,9 @@ class Document(DocumentBase):
     file_type: str
     file_size: int
     file_url: str
+    content_hash: Optional[str] = None
+    # "classifier" when the category was applied from a local prediction without review
+    category_source: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     
@@ -54,6 +74,51 @@ class Document(DocumentBase):
         from_attributes = True
 
 
+class PartialDocument(BaseModel):
+    """Document projected to the fields requested with ?fields=."""
+    id: Optional[str] = None
+    title: Optional[str] = None
+    author: Optional[str] = None
+    category: Optional[CategoryEnum] = None
+    tags: Optional[List[str]] = None
+    description: Optional[str] = None
+    file_name: Optional[str] = None
+    file_type: Optional[str] = None
+    file_size: Optional[int] = None
+    file_url: Optional[str] = None
+    content_hash: Optional[str] = None
+    content_text: Optional[str] = None
+    category_source: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class SimilarDocument(BaseModel):
+    """A document and its cosine similarity to the query (1.0 = same meaning)."""
+    document: Document
+    score: float
+
+
+class DuplicateDocument(BaseModel):
+    """A near-duplicate document and its estimated text similarity (Jaccard, 1.0 = same text)."""
+    document: Document
+    similarity: float
+
+
+class DocumentDeletion(BaseModel):
+    """Tombstone of a deleted document in the change feed."""
+    id: str
+    deleted_at: datetime
+
+
+class DocumentChanges(BaseModel):
+    """Page of the document change feed."""
+    documents: List[Document]
+    deletions: List[DocumentDeletion]
+    watermark: str
+    has_more: bool
+
+
 class AIAnalysisRequest(BaseModel):
     """Request model for AI analysis."""
     document_id: str
@@ -69,6 +134,105 @@ class AIAnalysisResponse(BaseModel):
     suggested_tags: List[str] = Field(default_factory=list)
     summary: Optional[str] = None
     confidence: float = Field(ge=0.0, le=1.0)
+    # "classifier" if the local classifier chose the category, "model" if GPT-4 did
+    category_source: Optional[str] = None
+
+
+class TagSuggestionRequest(BaseModel):
+    """Request model for tag suggestions."""
+    title: str = Field(..., min_length=1, max_length=255)
+    description: Optional[str] = None
+    tags: List[str] = Field(default_factory=list)
+
+
+class TagSuggestionResponse(BaseModel):
+    """Suggested tags and where they came from ("local" model or "ai")."""
+    tags: List[str]
+    source: str
+    confidence: float = Field(ge=0.0, le=1.0)
+
+
+class BatchAnalysisRequest(BaseModel):
+    """Request model for batch AI analysis. Select documents by IDs or by filters."""
+    document_ids: Optional[List[str]] = Field(None, max_length=1000)
+    category: Optional[CategoryEnum] = None
+    file_type: Optional[str] = None
+    limit: int = Field(100, ge=1, le=1000)
+    apply: bool = True
+    workers: Optional[int] = Field(None, ge=1, le=32)
+
+
+class BatchAnalysisItem(BaseModel):
+    """Analysis outcome for one document in a batch."""
+    document_id: str
+    analysis: Optional[AIAnalysisResponse] = None
+    error: Optional[str] = None
+
+
+class BatchAnalysisResponse(BaseModel):
+    """Response model for batch AI analysis."""
+    total: int
+    analyzed: int
+    updated: int
+    failed: int
+    results: List[BatchAnalysisItem]
+
+
+class BulkSelection(BaseModel):
+    """Documents targeted by a bulk operation. IDs and filters are combined with AND."""
+    document_ids: Optional[List[str]] = Field(None, max_length=10000)
+    category: Optional[CategoryEnum] = None
+    file_type: Optional[str] = None
+
+
+class BulkUpdateRequest(BulkSelection):
+    """Request model for applying one metadata update to many documents."""
+    update: DocumentUpdate
+
+
+class BulkUpdateResponse(BaseModel):
+    """Response model for bulk update."""
+    updated: int
+    document_ids: List[str]
+
+
+class BulkDeleteResponse(BaseModel):
+    """Response model for bulk delete."""
+    deleted: int
+    files_removed: int
+    document_ids: List[str]
+
+
+class ImportFailure(BaseModel):
+    """A record rejected by a bulk import. index is its 0-based position in the input."""
+    index: int
+    error: str
+
+
+class ImportResponse(BaseModel):
+    """Response model for bulk document import."""
+    received: int
+    imported: int
+    failed: int
+    errors: List[ImportFailure]
+
+
+class JobCreate(BaseModel):
+    """Request model for queuing AI analysis of an existing document."""
+    document_id: str
+
+
+class Job(BaseModel):
+    """Background AI analysis job."""
+    id: str
+    document_id: str
+    status: JobStatusEnum
+    attempts: int
+    max_attempts: int
+    result: Optional[AIAnalysisResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
 
 
 class CategoryStats(BaseModel):
@@ -105,6 +269,11 @@ class UploadResponse(BaseModel):
     success: bool
     message: str
     document: Optional[Document] = None
+    deduplicated: bool = False
+    duplicate_of: Optional[str] = None
+    likely_duplicate_of: Optional[str] = None
+    likely_duplicate_similarity: Optional[float] = None
+    job_id: Optional[str] = None
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,16 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson.
+    
+    Returning a response from a route bypasses response_model validation and
+    serialization, so only use it for trusted, JSON-ready content such as
+    rows read from the database.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
@@ -1,15 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Response
+from typing import Optional
 import logging
 from models import AnalyticsResponse
 from services.supabase_service import supabase_service
+from services.analytics_cache import analytics_cache, etag_matches
+from services.openai_service import openai_service
+from services.category_classifier import category_classifier
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
 
+async def _load_analytics() -> bytes:
+    """Fetch and encode the analytics payload."""
+    stats = await supabase_service.get_analytics()
+    return AnalyticsResponse(**stats).model_dump_json().encode()
+
+
 @router.get("/stats", response_model=AnalyticsResponse)
-async def get_analytics():
+async def get_analytics(if_none_match: Optional[str] = Header(None)):
     """
     Get comprehensive analytics about all documents.
     
@@ -20,10 +30,61 @@ async def get_analytics():
     - Top tags
     - Timeline of document creation
     - Distribution by file type
+    
+    The payload is cached until the next document write and carries an
+    ETag; requests with a matching If-None-Match get 304 Not Modified.
     """
+    headers = {"Cache-Control": "no-cache"}
     try:
-        stats = await supabase_service.get_analytics()
-        return AnalyticsResponse(**stats)
+        # Answer revalidations without touching the payload at all
+        if etag_matches(if_none_match, analytics_cache.etag):
+            headers["ETag"] = analytics_cache.etag
+            return Response(status_code=304, headers=headers)
+        
+        body, etag = await analytics_cache.get(_load_analytics)
+        headers["ETag"] = etag
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        
+        return Response(content=body, media_type="application/json", headers=headers)
     except Exception as e:
         logger.error(f"Error getting analytics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/reconcile")
+async def reconcile_analytics(repair: bool = True):
+    """
+    Check the analytics rollups against the documents table.
+    
+    Returns the number of drifted buckets and a sample of them.
+    Drift is repaired unless repair=false.
+    """
+    try:
+        result = await supabase_service.reconcile_analytics(repair=repair)
+        if result["repaired"]:
+            analytics_cache.invalidate()
+        return result
+    except Exception as e:
+        logger.error(f"Error reconciling analytics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/ai-cache")
+async def get_ai_cache_stats():
+    """Get size and hit/miss counters of the AI analysis cache."""
+    try:
+        return openai_service.cache.stats()
+    except Exception as e:
+        logger.error(f"Error getting AI cache stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/classifier")
+async def get_classifier_stats():
+    """Get training size and hit rate of the local category classifier."""
+    try:
+        return category_classifier.stats()
+    except Exception as e:
+        logger.error(f"Error getting classifier stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
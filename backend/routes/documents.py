@@ -1,23 +1,197 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
-from typing import Optional, List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from typing import AsyncIterator, Awaitable, Callable, Literal, Optional, List, Union
+import asyncio
+import hashlib
+import json
 import logging
-import uuid
+import zlib
 from datetime import datetime
 
+from config import settings
+from metrics import UPLOAD_BYTES, UPLOADS
+from responses import FastJSONResponse
 from models import (
     Document,
+    PartialDocument,
     DocumentCreate,
     DocumentUpdate,
     UploadResponse,
     AIAnalysisRequest,
-    AIAnalysisResponse
+    AIAnalysisResponse,
+    BatchAnalysisRequest,
+    TagSuggestionRequest,
+    TagSuggestionResponse,
+    BatchAnalysisItem,
+    BatchAnalysisResponse,
+    BulkSelection,
+    BulkUpdateRequest,
+    BulkUpdateResponse,
+    BulkDeleteResponse,
+    DocumentChanges,
+    SimilarDocument,
+    DuplicateDocument,
+    ImportResponse
 )
-from services.supabase_service import supabase_service
-from services.openai_service import openai_service
+from services.supabase_service import (
+    supabase_service,
+    encode_cursor,
+    decode_cursor,
+    decode_watermark,
+    DOCUMENT_COLUMNS,
+    ANALYSIS_COLUMNS
+)
+from services.openai_service import openai_service, analysis_to_update
+from services.job_service import job_service
+from services.import_service import import_service
+from services.extraction_service import extraction_service
+from services.embedding_service import embedding_service
+from services.tag_service import tag_service
+from services.duplicate_service import duplicate_service, encode_signature, decode_signature
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/documents", tags=["documents"])
+# Room for the multipart boundaries and part headers around an uploaded file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _too_large() -> HTTPException:
+    """Build the 413 error for files over the upload size limit."""
+    return HTTPException(
+        status_code=413,
+        detail=f"File exceeds the maximum upload size of {settings.max_upload_size} bytes"
+    )
+
+
+class UploadLimitRequest(Request):
+    """Request whose body is cut off as soon as it exceeds the upload size limit."""
+    
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Yield body chunks as they are received, counting them against the limit."""
+        received = 0
+        async for chunk in super().stream():
+            received += len(chunk)
+            if received > settings.max_upload_size + MULTIPART_OVERHEAD:
+                raise _too_large()
+            yield chunk
+
+
+class UploadLimitRoute(APIRoute):
+    """
+    Route that rejects oversized multipart bodies while they are received.
+    
+    Form parsing spools files to disk before the endpoint runs, so the limit
+    has to apply to the body itself: a declared Content-Length over the limit
+    is refused before anything is read, and other bodies are counted as they
+    stream in.
+    """
+    
+    def get_route_handler(self) -> Callable[[Request], Awaitable[Response]]:
+        handler = super().get_route_handler()
+        
+        async def limited_handler(request: Request) -> Response:
+            if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                content_length = request.headers.get("content-length", "")
+                if content_length.isdigit() and int(content_length) > settings.max_upload_size + MULTIPART_OVERHEAD:
+                    raise _too_large()
+                request = UploadLimitRequest(request.scope, request.receive)
+            return await handler(request)
+        
+        return limited_handler
+
+
+router = APIRouter(prefix="/api/documents", tags=["documents"], route_class=UploadLimitRoute)
+
+FIELDS_QUERY = Query(
+    None,
+    description="Comma-separated fields to return, e.g. id,title,category (default: all)"
+)
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a ?fields= list against the PartialDocument model. id is always included."""
+    if not fields:
+        return None
+    
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(PartialDocument.model_fields))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    return ["id"] + [field for field in requested if field != "id"]
+
+
+def _require_selection(selection: BulkSelection):
+    """Refuse bulk operations that would target every document."""
+    if selection.document_ids is None and not selection.category and not selection.file_type:
+        raise HTTPException(
+            status_code=400,
+            detail="Provide document_ids or at least one filter (category, file_type)"
+        )
+
+
+async def _export_stream(
+    category: Optional[str],
+    file_type: Optional[str],
+    compress: bool
+) -> AsyncIterator[bytes]:
+    """Encode documents as NDJSON (optionally gzip) one database batch at a time."""
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    exported = 0
+    
+    try:
+        async for batch in supabase_service.iter_documents(
+            batch_size=settings.export_batch_size,
+            category=category,
+            file_type=file_type
+        ):
+            chunk = "".join(json.dumps(doc, ensure_ascii=False) + "\n" for doc in batch).encode()
+            exported += len(batch)
+            yield compressor.compress(chunk) if compressor else chunk
+        
+        if compressor:
+            yield compressor.flush()
+        logger.info(f"Exported {exported} documents")
+    except Exception as e:
+        # Headers are already sent: abort the response so the export is visibly incomplete
+        logger.error(f"Error exporting documents after {exported} rows: {e}")
+        raise
+
+
+async def _documents_in_order(document_ids: List[str], columns: str = DOCUMENT_COLUMNS) -> List[dict]:
+    """Fetch documents by ID, keeping the order of document_ids."""
+    docs = await supabase_service.get_documents_by_ids(document_ids, columns=columns)
+    by_id = {doc["id"]: doc for doc in docs}
+    return [by_id[document_id] for document_id in document_ids if document_id in by_id]
+
+
+def _partial(doc: dict, fields: List[str]) -> dict:
+    """Keep only the requested fields of a row."""
+    return {field: doc[field] for field in fields}
+
+
+class UploadStream:
+    """Async iterator over an uploaded file in fixed-size chunks, hashing as it goes."""
+    
+    def __init__(self, file: UploadFile):
+        self.file = file
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """Yield chunks, enforcing the upload size limit as bytes arrive."""
+        while True:
+            chunk = await self.file.read(settings.upload_chunk_size)
+            if not chunk:
+                break
+            
+            self.size += len(chunk)
+            if self.size > settings.max_upload_size:
+                raise _too_large()
+            self.sha256.update(chunk)
+            yield chunk
 
 
 @router.post("/upload", response_model=UploadResponse)
@@ -26,26 +200,67 @@ async def upload_document(file: UploadFile = File(...)):
     Upload a new document.
     
     The file will be uploaded to Supabase Storage and metadata will be stored in the database.
+    Files whose bytes were uploaded before reuse the existing Storage object.
+    Text is extracted from PDF, DOCX, TXT and CSV files for later analyses,
+    and compared with the archive to report a likely near-duplicate.
     """
     try:
         # Validate file
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
         
-        # Read file content
-        content = await file.read()
-        file_size = len(content)
+        if file.size is not None and file.size > settings.max_upload_size:
+            raise _too_large()
         
-        # Generate unique file path
         file_extension = file.filename.split(".")[-1] if "." in file.filename else ""
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
         
-        # Upload to Supabase Storage
-        file_url = await supabase_service.upload_file(
-            unique_filename,
-            content,
-            file.content_type or "application/octet-stream"
-        )
+        # Hash the spooled file in chunks, enforcing the size limit
+        hashing = UploadStream(file)
+        async for _ in hashing:
+            pass
+        file_size = hashing.size
+        UPLOADS.inc()
+        UPLOAD_BYTES.inc(file_size)
+        content_hash = hashing.sha256.hexdigest()
+        
+        # Reuse the Storage object and extracted text if the same bytes were uploaded before
+        duplicate = await supabase_service.find_document_by_hash(content_hash)
+        content_text = duplicate.get("content_text") if duplicate else None
+        
+        # Extract the text in the process pool, from a copy on disk, while the file is stored
+        extraction = None
+        if not content_text and extraction_service.accepts(file_extension, file_size):
+            await file.seek(0)
+            spooled_path = await extraction_service.spool(file.file)
+            extraction = asyncio.ensure_future(extraction_service.extract(spooled_path, file_extension))
+        
+        try:
+            if duplicate:
+                file_url = duplicate["file_url"]
+            else:
+                # Content-addressed path, streamed in chunks
+                storage_path = f"{content_hash}.{file_extension}" if file_extension else content_hash
+                await file.seek(0)
+                file_url = await supabase_service.upload_file(
+                    storage_path,
+                    UploadStream(file),
+                    file.content_type or "application/octet-stream",
+                    content_length=file_size
+                )
+            
+            if extraction:
+                content_text = await extraction
+        finally:
+            # The upload failed: drop the extraction job and its copy of the file
+            if extraction and not extraction.done():
+                extraction.cancel()
+                await asyncio.gather(extraction, return_exceptions=True)
+                extraction_service.discard(spooled_path)
+        
+        if duplicate and duplicate.get("content_minhash") is not None:
+            signature = decode_signature(duplicate["content_minhash"])
+        else:
+            signature = await duplicate_service.signature(content_text)
         
         # Create document record
         document_data = DocumentCreate(
@@ -54,58 +269,263 @@ async def upload_document(file: UploadFile = File(...)):
             file_type=file_extension,
             file_size=file_size,
             file_url=file_url,
+            content_hash=content_hash,
+            content_text=content_text,
+            content_minhash=encode_signature(signature),
             tags=[],
             description=None
         )
         
         doc = await supabase_service.create_document(document_data)
+        likely = duplicate_service.find(signature, limit=1, exclude=doc["id"])
         
         return UploadResponse(
             success=True,
             message="Document uploaded successfully",
-            document=Document(**doc)
+            document=Document(**doc),
+            deduplicated=duplicate is not None,
+            duplicate_of=duplicate["id"] if duplicate else None,
+            likely_duplicate_of=likely[0][0] if likely else None,
+            likely_duplicate_similarity=likely[0][1] if likely else None
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("", response_model=List[Document])
+@router.post("/import", response_model=ImportResponse)
+async def import_documents(
+    request: Request,
+    batch_size: Optional[int] = Query(None, ge=1, le=5000, description="Records per insert")
+):
+    """
+    Bulk import document metadata (files must already be in Storage).
+    
+    The body is NDJSON (one DocumentCreate per line) or a JSON array of
+    DocumentCreate records. Records are validated as they stream in and
+    inserted in batches; invalid or rejected records are reported by index
+    without aborting the import.
+    """
+    try:
+        return await import_service.import_documents(request.stream(), batch_size)
+    except Exception as e:
+        logger.error(f"Error importing documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/export")
+async def export_documents(
+    category: Optional[str] = Query(None, description="Filter by category"),
+    file_type: Optional[str] = Query(None, description="Filter by file type"),
+    gzip: bool = Query(False, description="Compress the export with gzip")
+):
+    """
+    Stream every document as NDJSON (one JSON document per line), newest first.
+    
+    Documents are read in keyset batches of EXPORT_BATCH_SIZE, so memory use
+    does not grow with the number of documents.
+    """
+    file_name = f"documents_{datetime.now().strftime('%Y-%m-%d')}.ndjson"
+    if gzip:
+        file_name += ".gz"
+    
+    return StreamingResponse(
+        _export_stream(category, file_type, gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
+
+
+@router.get("/changes", response_model=DocumentChanges)
+async def get_document_changes(
+    since: Optional[str] = Query(None, description="Watermark from the previous call (omit for a full sync)"),
+    limit: int = Query(500, ge=1, le=1000, description="Max documents and max deletions to return")
+):
+    """
+    Get documents created or updated, and tombstones of documents deleted, since a watermark.
+    
+    Store the returned watermark and pass it as since on the next call.
+    Call again right away while has_more is true.
+    """
+    try:
+        if since:
+            try:
+                decode_watermark(since)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        return FastJSONResponse(await supabase_service.get_changes(since=since, limit=limit))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting document changes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("", response_model=Union[List[Document], List[PartialDocument]])
 async def get_documents(
+    response: Response,
     category: Optional[str] = Query(None, description="Filter by category"),
     file_type: Optional[str] = Query(None, description="Filter by file type"),
     search: Optional[str] = Query(None, description="Search in title, author, description"),
+    search_mode: Literal["relevance", "recent", "semantic"] = Query(
+        "relevance",
+        description="Order search results by relevance, by creation date, or by meaning (embeddings)"
+    ),
     limit: int = Query(50, ge=1, le=100, description="Number of documents to return"),
-    offset: int = Query(0, ge=0, description="Number of documents to skip")
+    offset: int = Query(0, ge=0, description="Number of documents to skip"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor of the previous page"),
+    fields: Optional[str] = FIELDS_QUERY
 ):
     """
     Get all documents with optional filters.
     
     Supports filtering by category, file type, and text search.
-    Results are paginated and ordered by creation date (newest first).
+    Results are paginated and ordered by creation date (newest first), or
+    by relevance when searching with search_mode=relevance (the default).
+    search_mode=semantic matches by meaning instead of by keywords.
+    
+    When a full page is returned, the X-Next-Cursor header holds the cursor
+    for the next page. Cursor pagination costs the same at any depth and is
+    not affected by concurrent inserts; offset is ignored when cursor is given.
+    
+    Use fields to return only some fields (e.g. for card views); each item is
+    then a PartialDocument with just those fields.
+    
+    Rows are returned as read from the database, encoded once with orjson.
     """
     try:
-        docs = await supabase_service.get_documents(
-            category=category,
-            file_type=file_type,
-            search=search,
-            limit=limit,
-            offset=offset
-        )
-        return [Document(**doc) for doc in docs]
+        projection = _parse_fields(fields)
+        # The next cursor is built from created_at, so it is read even if not requested
+        columns = DOCUMENT_COLUMNS
+        if projection:
+            columns = ",".join(projection + ([] if "created_at" in projection else ["created_at"]))
+        
+        if search and search_mode in ("relevance", "semantic"):
+            if cursor:
+                raise HTTPException(
+                    status_code=400,
+                    detail="cursor pagination requires search_mode=recent when searching"
+                )
+            
+            if search_mode == "semantic":
+                matches = await embedding_service.search(
+                    search,
+                    limit=limit,
+                    offset=offset,
+                    category=category,
+                    file_type=file_type
+                )
+                docs = await _documents_in_order([document_id for document_id, _ in matches], columns)
+            else:
+                docs = await supabase_service.search_documents(
+                    search,
+                    category=category,
+                    file_type=file_type,
+                    limit=limit,
+                    offset=offset,
+                    columns=columns
+                )
+        else:
+            if cursor:
+                try:
+                    decode_cursor(cursor)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            
+            docs = await supabase_service.get_documents(
+                category=category,
+                file_type=file_type,
+                search=search,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+                columns=columns
+            )
+            if len(docs) == limit:
+                response.headers["X-Next-Cursor"] = encode_cursor(docs[-1])
+        
+        if projection:
+            docs = [_partial(doc, projection) for doc in docs]
+        return FastJSONResponse(docs, headers=dict(response.headers))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/{document_id}", response_model=Document)
-async def get_document(document_id: str):
-    """Get a specific document by ID."""
+@router.patch("/bulk", response_model=BulkUpdateResponse)
+async def bulk_update_documents(request: BulkUpdateRequest):
+    """
+    Apply one metadata update to many documents.
+    
+    Documents are selected by IDs and/or filters and updated in a single statement.
+    """
+    try:
+        _require_selection(request)
+        if not request.update.model_dump(exclude_none=True):
+            raise HTTPException(status_code=400, detail="No fields to update")
+        
+        docs = await supabase_service.update_documents(
+            request.update,
+            document_ids=request.document_ids,
+            category=request.category.value if request.category else None,
+            file_type=request.file_type
+        )
+        return BulkUpdateResponse(
+            updated=len(docs),
+            document_ids=[doc["id"] for doc in docs]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk updating documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/bulk", response_model=BulkDeleteResponse)
+async def bulk_delete_documents(request: BulkSelection):
+    """
+    Delete many documents.
+    
+    Documents are selected by IDs and/or filters and deleted in a single
+    statement; their files are removed from storage in batched calls.
+    """
+    try:
+        _require_selection(request)
+        
+        docs = await supabase_service.delete_documents(
+            document_ids=request.document_ids,
+            category=request.category.value if request.category else None,
+            file_type=request.file_type
+        )
+        return BulkDeleteResponse(
+            deleted=len(docs),
+            files_removed=len({doc["file_url"] for doc in docs if doc.get("file_orphaned")}),
+            document_ids=[doc["id"] for doc in docs]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk deleting documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{document_id}", response_model=Union[Document, PartialDocument])
+async def get_document(document_id: str, fields: Optional[str] = FIELDS_QUERY):
+    """Get a specific document by ID (a PartialDocument when fields is given)."""
     try:
-        doc = await supabase_service.get_document(document_id)
+        projection = _parse_fields(fields)
+        doc = await supabase_service.get_document(
+            document_id,
+            columns=",".join(projection) if projection else DOCUMENT_COLUMNS
+        )
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
-        return Document(**doc)
+        return FastJSONResponse(_partial(doc, projection) if projection else doc)
     except HTTPException:
         raise
     except Exception as e:
@@ -113,6 +533,55 @@ async def get_document(document_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{document_id}/similar", response_model=List[SimilarDocument])
+async def get_similar_documents(
+    document_id: str,
+    category: Optional[str] = Query(None, description="Filter by category"),
+    file_type: Optional[str] = Query(None, description="Filter by file type"),
+    limit: int = Query(10, ge=1, le=100, description="Number of documents to return")
+):
+    """Find the documents most similar in meaning to a document, best match first."""
+    try:
+        matches = await embedding_service.similar(
+            document_id,
+            limit=limit,
+            category=category,
+            file_type=file_type
+        )
+        if matches is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        scores = dict(matches)
+        docs = await _documents_in_order(list(scores))
+        return FastJSONResponse([{"document": doc, "score": scores[doc["id"]]} for doc in docs])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding similar documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{document_id}/duplicates", response_model=List[DuplicateDocument])
+async def get_duplicate_documents(
+    document_id: str,
+    limit: int = Query(10, ge=1, le=100, description="Number of documents to return")
+):
+    """Find documents whose text nearly matches a document's, most similar first."""
+    try:
+        matches = await duplicate_service.duplicates(document_id, limit=limit)
+        if matches is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        similarities = dict(matches)
+        docs = await _documents_in_order(list(similarities))
+        return FastJSONResponse([{"document": doc, "similarity": similarities[doc["id"]]} for doc in docs])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding duplicate documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.put("/{document_id}", response_model=Document)
 async def update_document(document_id: str, update_data: DocumentUpdate):
     """
@@ -124,7 +593,7 @@ async def update_document(document_id: str, update_data: DocumentUpdate):
         doc = await supabase_service.update_document(document_id, update_data)
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
-        return Document(**doc)
+        return FastJSONResponse(doc)
     except HTTPException:
         raise
     except Exception as e:
@@ -167,7 +636,7 @@ async def analyze_document(document_id: str):
     """
     try:
         # Get document
-        doc = await supabase_service.get_document(document_id)
+        doc = await supabase_service.get_document(document_id, columns=ANALYSIS_COLUMNS)
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
         
@@ -175,7 +644,8 @@ async def analyze_document(document_id: str):
         analysis = await openai_service.analyze_document(
             file_name=doc["file_name"],
             file_type=doc["file_type"],
-            content_preview=doc.get("description")
+            content_preview=doc.get("content_text") or doc.get("description"),
+            content_hash=doc.get("content_hash")
         )
         
         return analysis
@@ -186,13 +656,104 @@ async def analyze_document(document_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/analyze-upload", response_model=UploadResponse)
+@router.post("/suggest-tags", response_model=TagSuggestionResponse)
+async def suggest_tags(
+    request: TagSuggestionRequest,
+    limit: int = Query(5, ge=1, le=20, description="Number of tags to suggest")
+):
+    """
+    Suggest tags for a title and description.
+    
+    Tags come from a model of the tags already used in the archive. GPT is
+    only asked when that model is not confident enough.
+    """
+    try:
+        tags, confidence, source = await tag_service.suggest_tags(
+            request.title,
+            request.description,
+            request.tags,
+            limit=limit
+        )
+        return TagSuggestionResponse(tags=tags, source=source, confidence=confidence)
+    except Exception as e:
+        logger.error(f"Error suggesting tags: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/analyze-batch", response_model=BatchAnalysisResponse)
+async def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyze many documents with OpenAI in parallel.
+    
+    Documents are selected by document_ids, or by the category/file_type
+    filters (up to limit documents, newest first). Up to workers analyses
+    run at a time. When apply is true, all suggestions are written back
+    with one bulk update.
+    """
+    try:
+        if request.document_ids:
+            docs = await supabase_service.get_documents_by_ids(request.document_ids, columns=ANALYSIS_COLUMNS)
+        elif request.category or request.file_type:
+            docs = await supabase_service.get_documents(
+                category=request.category.value if request.category else None,
+                file_type=request.file_type,
+                limit=request.limit,
+                columns=ANALYSIS_COLUMNS
+            )
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail="Provide document_ids or at least one filter (category, file_type)"
+            )
+        
+        semaphore = asyncio.Semaphore(request.workers or settings.batch_analysis_workers)
+        
+        async def analyze(doc: dict) -> BatchAnalysisItem:
+            async with semaphore:
+                analysis = await openai_service.analyze_document(
+                    file_name=doc["file_name"],
+                    file_type=doc["file_type"],
+                    content_preview=doc.get("content_text") or doc.get("description"),
+                    content_hash=doc.get("content_hash")
+                )
+            # analyze_document reports upstream failures as a zero-confidence result
+            if analysis.confidence == 0.0:
+                return BatchAnalysisItem(document_id=doc["id"], error="Analysis failed")
+            return BatchAnalysisItem(document_id=doc["id"], analysis=analysis)
+        
+        results = await asyncio.gather(*[analyze(doc) for doc in docs])
+        analyzed = [item for item in results if item.analysis]
+        
+        updated = []
+        if request.apply and analyzed:
+            titles = {doc["id"]: doc["title"] for doc in docs}
+            updated = await supabase_service.bulk_update_documents({
+                item.document_id: analysis_to_update(item.analysis, titles[item.document_id])
+                for item in analyzed
+            })
+        
+        return BatchAnalysisResponse(
+            total=len(docs),
+            analyzed=len(analyzed),
+            updated=len(updated),
+            failed=len(results) - len(analyzed),
+            results=results
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/analyze-upload", response_model=UploadResponse, status_code=202)
 async def upload_and_analyze(file: UploadFile = File(...)):
     """
-    Upload a document and automatically analyze it with AI.
+    Upload a document and queue it for AI analysis.
     
-    This combines upload and AI analysis in a single request.
-    The document will be created with AI-suggested metadata.
+    Returns as soon as the file is stored, with the job_id of the background
+    analysis. Poll GET /api/jobs/{job_id}; when the job completes the document
+    holds the AI-suggested metadata.
     """
     try:
         # First upload the document
@@ -201,31 +762,21 @@ async def upload_and_analyze(file: UploadFile = File(...)):
         if not upload_result.document:
             return upload_result
         
-        # Analyze with AI
-        analysis = await openai_service.analyze_document(
-            file_name=upload_result.document.file_name,
-            file_type=upload_result.document.file_type
-        )
-        
-        # Update document with AI suggestions
-        update_data = DocumentUpdate(
-            title=analysis.suggested_title or upload_result.document.title,
-            author=analysis.suggested_author,
-            category=analysis.suggested_category,
-            tags=analysis.suggested_tags,
-            description=analysis.summary
-        )
-        
-        updated_doc = await supabase_service.update_document(
-            upload_result.document.id,
-            update_data
-        )
+        # Hand AI enrichment to the background workers
+        job = await job_service.enqueue(upload_result.document.id)
         
         return UploadResponse(
             success=True,
-            message="Document uploaded and analyzed successfully",
-            document=Document(**updated_doc) if updated_doc else upload_result.document
+            message="Document uploaded; AI analysis queued",
+            document=upload_result.document,
+            deduplicated=upload_result.deduplicated,
+            duplicate_of=upload_result.duplicate_of,
+            likely_duplicate_of=upload_result.likely_duplicate_of,
+            likely_duplicate_similarity=upload_result.likely_duplicate_similarity,
+            job_id=job["id"]
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in upload and analyze: {e}")
         raise HTTPException(status_code=500, detail=str(e))
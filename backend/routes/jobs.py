@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException
+import logging
+from models import Job, JobCreate
+from services.supabase_service import supabase_service
+from services.job_service import job_service
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.post("", response_model=Job, status_code=202)
+async def create_job(job_data: JobCreate):
+    """
+    Queue AI analysis of an existing document.
+    
+    A background worker analyzes the document and applies the suggested
+    metadata. Poll GET /api/jobs/{job_id} for the outcome.
+    """
+    try:
+        doc = await supabase_service.get_document(job_data.document_id, columns="id")
+        if not doc:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        job = await job_service.enqueue(job_data.document_id)
+        return Job(**job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """Get the status of a background job, including its result once completed."""
+    try:
+        job = await job_service.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return Job(**job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """
+    Disk-backed LRU/TTL cache for AI results.
+    
+    Entries live in a SQLite database in WAL mode, so every uvicorn worker
+    on the host shares them and they survive restarts. Hit/miss counters
+    are per process.
+    """
+    
+    # Evict at most once every this many writes
+    EVICT_EVERY = 100
+    
+    def __init__(self, path: str, max_entries: int, ttl: int):
+        """
+        Initialize the cache and create its table if needed.
+        
+        Args:
+            path: SQLite database file
+            max_entries: Entries kept before least recently used ones are evicted
+            ttl: Seconds an entry stays valid after it is written
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed_at ON analysis_cache(accessed_at)"
+        )
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        value, created_at = row
+        now = time.time()
+        if now - created_at > self.ttl:
+            conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            return None
+        
+        conn.execute("UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+    
+    def _set(self, key: str, value: str):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, value, now, now)
+        )
+        
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict(conn, now)
+    
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        conn.execute("DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl,))
+        conn.execute(
+            """DELETE FROM analysis_cache WHERE key IN (
+                SELECT key FROM analysis_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,)
+        )
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached value, counting the hit or miss."""
+        try:
+            value = await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            logger.warning(f"Error reading analysis cache: {e}")
+            value = None
+        
+        if value is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return json.loads(value)
+    
+    async def set(self, key: str, value: Dict[str, Any]):
+        """Store a JSON-serializable value."""
+        try:
+            await asyncio.to_thread(self._set, key, json.dumps(value))
+        except sqlite3.Error as e:
+            logger.warning(f"Error writing analysis cache: {e}")
+    
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        self._connection().execute("DELETE FROM analysis_cache")
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Entry count and this process's hit/miss counters."""
+        entries = self._connection().execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from config import settings
+from services.supabase_service import supabase_service
+
+
+class AnalyticsCache:
+    """Cache for the encoded analytics payload, invalidated by document writes."""
+    
+    def __init__(self, ttl: float):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            ttl: Seconds a payload may be served before it is reloaded. This
+                bounds staleness for writes made by other workers.
+        """
+        self.ttl = ttl
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._expires_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+    
+    def invalidate(self, *args: Any):
+        """Drop the cached payload. Accepts and ignores change-listener arguments."""
+        self._version += 1
+        self._body = None
+        self._etag = None
+    
+    def _fresh(self) -> bool:
+        return self._body is not None and time.monotonic() < self._expires_at
+    
+    @property
+    def etag(self) -> Optional[str]:
+        """ETag of the cached payload, if it is still fresh."""
+        return self._etag if self._fresh() else None
+    
+    async def get(self, loader: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, str]:
+        """Return the cached body and ETag, loading them once on a miss."""
+        if self._fresh():
+            return self._body, self._etag
+        
+        async with self._lock:
+            if self._fresh():
+                return self._body, self._etag
+            
+            version = self._version
+            body = await loader()
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            
+            # Only keep the result if no write happened while it was loading
+            if version == self._version:
+                self._body = body
+                self._etag = etag
+                self._expires_at = time.monotonic() + self.ttl
+            
+            return body, etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Check an If-None-Match header value against an ETag."""
+    if not if_none_match or not etag:
+        return False
+    
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
+# Global cache instance, invalidated on every document write
+analytics_cache = AnalyticsCache(ttl=settings.analytics_cache_ttl)
+supabase_service.on_change(analytics_cache.invalidate)
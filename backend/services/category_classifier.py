@@ -0,0 +1,321 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from config import settings
+from metrics import classifier_collector
+from models import CategoryEnum
+from services.supabase_service import supabase_service
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single development process saves the model
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = list(CategoryEnum)
+
+# Hashed word features: a fixed vocabulary, so the counts never need a rebuild
+N_FEATURES = 2 ** 18
+
+# Characters of document text the classifier reads
+CLASSIFIER_TEXT_CHARS = 5000
+
+# Additive smoothing of the per-category word frequencies
+ALPHA = 0.1
+
+# Columns that decide whether a document is a training example, and with which label
+LABEL_COLUMNS = "id,category,category_source,tags,description"
+
+# Documents per change feed read
+SYNC_BATCH_SIZE = 500
+
+
+def _features(file_name: Optional[str], file_type: Optional[str], text: Optional[str]) -> np.ndarray:
+    """Distinct hashed features of a file name, type and text."""
+    words = re.findall(r"[^\W_]{2,}", f"{file_name or ''} {(text or '')[:CLASSIFIER_TEXT_CHARS]}".lower())
+    tokens = {word for word in words if not word.isdigit()}
+    tokens.add(f"type:{(file_type or '').lower()}")
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big") % N_FEATURES for token in tokens),
+        dtype=np.int64,
+        count=len(tokens)
+    )
+
+
+def _label(doc: Dict[str, Any]) -> Optional[int]:
+    """
+    Category index a document teaches, or None if it is not a training example.
+    
+    Uploads start as Geral with no tags or description, so those rows say
+    nothing about their category. Categories applied from the classifier's
+    own predictions would only reinforce its mistakes, so they are skipped
+    until a person or GPT-4 sets the category. Any other category, or
+    curated metadata, counts as a label.
+    """
+    if doc.get("category_source") == "classifier":
+        return None
+    try:
+        category = CategoryEnum(doc["category"])
+    except ValueError:
+        return None
+    if category == CategoryEnum.GERAL and not doc.get("tags") and not doc.get("description"):
+        return None
+    return CATEGORIES.index(category)
+
+
+class CategoryClassifier:
+    """
+    Naive Bayes category classifier over hashed words of the file name and text.
+    
+    The model is a matrix of feature counts per category, so training on a
+    document is one vectorized increment (and relabeling one decrement plus
+    one increment). It is saved to category_classifier_path with its change
+    feed watermark, so restarts only catch up.
+    """
+    
+    def __init__(self):
+        """Initialize an empty model (it is loaded by start())."""
+        self._counts = np.zeros((len(CATEGORIES), N_FEATURES), dtype=np.int32)
+        self._totals = np.zeros(len(CATEGORIES), dtype=np.int64)
+        self._documents = np.zeros(len(CATEGORIES), dtype=np.int64)
+        self._labels: Dict[str, int] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.watermark: Optional[str] = None
+        self._dirty = False
+        self._saved_at = 0.0
+        # Predictions made, confident ones (GPT-4 skipped the category), and
+        # agreement with GPT-4 on the others
+        self.predictions = 0
+        self.hits = 0
+        self.checked = 0
+        self.agreed = 0
+    
+    def start(self):
+        """Load the saved model and start keeping it in sync."""
+        self._load()
+        self._saved_at = time.monotonic()
+        self._task = asyncio.create_task(self._sync_loop())
+    
+    async def stop(self):
+        """Stop syncing and save the model."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await asyncio.to_thread(self._write, self._snapshot())
+    
+    def predict(
+        self,
+        file_name: str,
+        file_type: str,
+        text: Optional[str] = None
+    ) -> Tuple[Optional[CategoryEnum], float]:
+        """Most likely category and its posterior probability, or (None, 0.0) while the model is too small."""
+        if self._documents.sum() < settings.category_classifier_min_documents:
+            return None, 0.0
+        
+        features = _features(file_name, file_type, text)
+        log_likelihood = np.log(self._counts[:, features] + ALPHA).sum(axis=1)
+        log_likelihood -= len(features) * np.log(self._totals + ALPHA * N_FEATURES)
+        log_posterior = log_likelihood + np.log(self._documents + 1)
+        
+        posterior = np.exp(log_posterior - log_posterior.max())
+        posterior /= posterior.sum()
+        best = int(posterior.argmax())
+        return CATEGORIES[best], float(posterior[best])
+    
+    def classify(
+        self,
+        file_name: str,
+        file_type: str,
+        text: Optional[str] = None
+    ) -> Tuple[Optional[CategoryEnum], Optional[CategoryEnum]]:
+        """
+        Classify a document before an AI analysis, as (confident category, best guess).
+        
+        The confident category is None unless the posterior reaches
+        category_classifier_min_confidence.
+        """
+        category, probability = self.predict(file_name, file_type, text)
+        if category is None:
+            return None, None
+        
+        self.predictions += 1
+        if probability >= settings.category_classifier_min_confidence:
+            self.hits += 1
+            return category, category
+        return None, category
+    
+    def record_agreement(self, guess: CategoryEnum, category: CategoryEnum):
+        """Compare an unconfident guess with the category GPT-4 chose."""
+        self.checked += 1
+        if guess == category:
+            self.agreed += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Training size and this process's hit and agreement counters."""
+        return {
+            "documents": int(self._documents.sum()),
+            "documents_per_category": {
+                category.value: int(count) for category, count in zip(CATEGORIES, self._documents)
+            },
+            "min_confidence": settings.category_classifier_min_confidence,
+            "predictions": self.predictions,
+            "hits": self.hits,
+            "hit_ratio": round(self.hits / self.predictions, 4) if self.predictions else 0.0,
+            "checked": self.checked,
+            "agreed": self.agreed,
+            "agreement_ratio": round(self.agreed / self.checked, 4) if self.checked else 0.0,
+        }
+    
+    def _train(self, features: np.ndarray, label: int, sign: int):
+        """Add (sign=1) or remove (sign=-1) one document's features under a label."""
+        self._counts[label, features] += sign
+        self._totals[label] += sign * len(features)
+        self._documents[label] += sign
+    
+    def on_document_change(self, event: str, document: Dict[str, Any]):
+        """Queue a document written by this process for training."""
+        if event == "deleted":
+            # A deleted document was still a correctly labeled example, so its counts stay
+            self._labels.pop(document["id"], None)
+            return
+        if "category" in document:
+            self._pending[document["id"]] = document
+            self._wakeup.set()
+    
+    async def _sync_loop(self):
+        """Train on local writes right away and catch up with other processes' writes periodically."""
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Category classifier sync failed: {e}")
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.category_classifier_sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    async def sync(self):
+        """Bring the model up to date: pending documents first, then the change feed."""
+        pending, self._pending = self._pending, {}
+        changed = await self._learn(list(pending.values()))
+        watermark = self.watermark
+        
+        while True:
+            changes = await supabase_service.get_changes(
+                since=self.watermark,
+                limit=SYNC_BATCH_SIZE,
+                columns=LABEL_COLUMNS
+            )
+            for deletion in changes["deletions"]:
+                self._labels.pop(deletion["id"], None)
+            changed += await self._learn(changes["documents"])
+            self.watermark = changes["watermark"]
+            if not changes["has_more"]:
+                break
+        
+        if changed:
+            logger.info(f"Category classifier trained on {changed} documents")
+        self._dirty = self._dirty or bool(changed) or self.watermark != watermark
+        
+        # The model is megabytes, so it is saved at most once per sync interval (and at stop())
+        if self._dirty and time.monotonic() - self._saved_at >= settings.category_classifier_sync_interval:
+            self._dirty = False
+            self._saved_at = time.monotonic()
+            await asyncio.to_thread(self._write, self._snapshot())
+    
+    async def _learn(self, docs: List[Dict[str, Any]]) -> int:
+        """Train on documents whose label changed, reading the text of only those."""
+        relabeled = {
+            doc["id"]: label
+            for doc in docs
+            if (label := _label(doc)) != self._labels.get(doc["id"])
+        }
+        if not relabeled:
+            return 0
+        
+        rows = await supabase_service.get_documents_by_ids(
+            list(relabeled),
+            columns="id,file_name,file_type,content_text"
+        )
+        for row in rows:
+            features = _features(row["file_name"], row["file_type"], row["content_text"])
+            previous = self._labels.pop(row["id"], None)
+            if previous is not None:
+                self._train(features, previous, -1)
+            label = relabeled[row["id"]]
+            if label is not None:
+                self._train(features, label, 1)
+                self._labels[row["id"]] = label
+        return len(rows)
+    
+    def _load(self):
+        """Load the saved model, if any."""
+        path = settings.category_classifier_path
+        if not os.path.exists(path):
+            return
+        try:
+            with np.load(path) as saved:
+                self._counts = saved["counts"]
+                self._totals = saved["totals"]
+                self._documents = saved["documents"]
+                self._labels = dict(zip(saved["ids"].tolist(), saved["labels"].tolist()))
+                self.watermark = str(saved["watermark"]) or None
+            logger.info(f"Loaded category classifier trained on {self._documents.sum()} documents")
+        except Exception as e:
+            logger.error(f"Error loading category classifier, retraining: {e}")
+            self._counts = np.zeros((len(CATEGORIES), N_FEATURES), dtype=np.int32)
+            self._totals = np.zeros(len(CATEGORIES), dtype=np.int64)
+            self._documents = np.zeros(len(CATEGORIES), dtype=np.int64)
+            self._labels = {}
+            self.watermark = None
+    
+    def _snapshot(self) -> Dict[str, np.ndarray]:
+        """Copy of the model and its watermark, so it can be written while training goes on."""
+        return {
+            "counts": self._counts.copy(),
+            "totals": self._totals.copy(),
+            "documents": self._documents.copy(),
+            "ids": np.array(list(self._labels), dtype=str),
+            "labels": np.array(list(self._labels.values()), dtype=np.uint8),
+            "watermark": np.array(self.watermark or "")
+        }
+    
+    def _write(self, snapshot: Dict[str, np.ndarray]):
+        """
+        Write a model snapshot atomically (blocking, so run it in a thread).
+        
+        Every worker saves its own model, so each writes a temporary file of
+        its own and the lock file serializes the replacements.
+        """
+        path = settings.category_classifier_path
+        directory = os.path.dirname(path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **snapshot)
+            with open(f"{path}.lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+# Global classifier instance, kept in sync with this process's writes
+category_classifier = CategoryClassifier()
+supabase_service.on_change(category_classifier.on_document_change)
+classifier_collector.register(category_classifier)
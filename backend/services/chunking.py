@@ -0,0 +1,102 @@
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Iterator, List, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to an estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+# About one paragraph in BOUNDARY_MODULUS ends a chunk (once it has min_tokens)
+BOUNDARY_MODULUS = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Load the tokenizer of the chat models, or None to estimate."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of text for the chat models."""
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def load_tokenizer():
+    """Load the tokenizer ahead of the first analysis (tiktoken may download its BPE file)."""
+    _encoding()
+
+
+def _paragraphs(text: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    """
+    Yield the non-empty lines of text with their token counts.
+    
+    Lines longer than max_tokens are split by words. Each line is tokenized
+    once; only the pieces of split lines are tokenized again.
+    """
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        
+        tokens = count_tokens(line)
+        if tokens <= max_tokens:
+            yield line, tokens
+            continue
+        
+        words = line.split()
+        step = max(1, len(words) * max_tokens // tokens)
+        for start in range(0, len(words), step):
+            piece = " ".join(words[start:start + step])
+            yield piece, count_tokens(piece)
+
+
+def _is_boundary(paragraph: str) -> bool:
+    """Whether a chunk may end after this paragraph. Depends only on the paragraph itself."""
+    digest = hashlib.sha256(paragraph.encode()).digest()
+    return int.from_bytes(digest[:4], "big") % BOUNDARY_MODULUS == 0
+
+
+def split_into_chunks(text: str, max_tokens: int, min_tokens: int) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens tokens on paragraph boundaries.
+    
+    Chunk ends are chosen from the content (content-defined chunking) rather
+    than by position, so editing one paragraph changes the chunk around it and
+    leaves the other chunks, and their cached results, intact.
+    
+    Tokenizing is CPU-bound: call this off the event loop.
+    """
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    
+    for paragraph, tokens in _paragraphs(text, max_tokens):
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        
+        current.append(paragraph)
+        current_tokens += tokens
+        if current_tokens >= min_tokens and _is_boundary(paragraph):
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+    
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
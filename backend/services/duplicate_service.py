@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import logging
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from config import settings
+from services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+# Hash functions per MinHash signature (stored as 4 bytes each)
+MINHASH_PERMUTATIONS = 128
+
+# LSH bands of MINHASH_PERMUTATIONS // LSH_BANDS values. With 16 bands of 8,
+# documents above ~0.7 Jaccard similarity share a band with high probability.
+LSH_BANDS = 16
+
+# Words per shingle
+SHINGLE_WORDS = 5
+
+# Largest prime below 2**32, so (a * h + b) of 32-bit values never overflows uint64
+MINHASH_PRIME = 4294967291
+
+# Fixed seed: signatures stored in the database must stay comparable across restarts
+_rng = np.random.default_rng(0)
+_A = _rng.integers(1, MINHASH_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, MINHASH_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+# Documents per change feed read while building the index
+SYNC_BATCH_SIZE = 1000
+
+
+def minhash_signature(text: Optional[str]) -> Optional[np.ndarray]:
+    """MinHash signature of the word shingles of text, or None if it has no words."""
+    words = re.findall(r"[^\W_]+", (text or "").lower())
+    if not words:
+        return None
+    
+    shingles = {
+        " ".join(words[start:start + SHINGLE_WORDS])
+        for start in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "big") for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    return ((hashes[:, np.newaxis] * _A + _B) % MINHASH_PRIME).min(axis=0).astype(np.uint32)
+
+
+def encode_signature(signature: Optional[np.ndarray]) -> str:
+    """Encode a signature as a bytea literal (empty for documents without text)."""
+    if signature is None:
+        return "\\x"
+    return "\\x" + signature.astype("<u4").tobytes().hex()
+
+
+def decode_signature(value: Optional[str]) -> Optional[np.ndarray]:
+    """Decode a bytea signature, or None if the document has none."""
+    if not value or len(value) != 2 + MINHASH_PERMUTATIONS * 8:
+        return None
+    return np.frombuffer(bytes.fromhex(value[2:]), dtype="<u4").astype(np.uint32)
+
+
+class DuplicateService:
+    """
+    Finds near-duplicate documents with MinHash signatures and an LSH band index.
+    
+    Each signature is cut into LSH_BANDS bands; documents sharing any band are
+    candidates, and only candidates are compared, so a lookup costs a few dict
+    reads instead of a scan of the archive. The index lives in memory, is built
+    from the change feed at startup and is updated on every write.
+    """
+    
+    def __init__(self):
+        """Initialize the service (the index is built by start())."""
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._bands: List[Dict[bytes, Set[str]]] = [{} for _ in range(LSH_BANDS)]
+        self._pending: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.watermark: Optional[str] = None
+    
+    def start(self):
+        """Start building the index and keeping it in sync."""
+        self._task = asyncio.create_task(self._sync_loop())
+    
+    async def stop(self):
+        """Stop syncing."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+    
+    async def signature(self, text: Optional[str]) -> Optional[np.ndarray]:
+        """Compute the signature of a text off the event loop."""
+        if not text:
+            return None
+        return await asyncio.to_thread(minhash_signature, text)
+    
+    @staticmethod
+    def _band_keys(signature: np.ndarray) -> List[bytes]:
+        """Bucket key of the signature in each band."""
+        return [band.tobytes() for band in signature.reshape(LSH_BANDS, -1)]
+    
+    def add(self, document_id: str, signature: Optional[np.ndarray]):
+        """Store or replace the signature of a document."""
+        self.remove(document_id)
+        if signature is None:
+            return
+        self._signatures[document_id] = signature
+        for buckets, key in zip(self._bands, self._band_keys(signature)):
+            buckets.setdefault(key, set()).add(document_id)
+    
+    def remove(self, document_id: str):
+        """Remove the signature of a document, if stored."""
+        signature = self._signatures.pop(document_id, None)
+        if signature is None:
+            return
+        for buckets, key in zip(self._bands, self._band_keys(signature)):
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(document_id)
+                if not bucket:
+                    del buckets[key]
+    
+    def find(
+        self,
+        signature: Optional[np.ndarray],
+        limit: int = 10,
+        exclude: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Find documents at least duplicate_threshold similar, as (id, similarity), best first."""
+        if signature is None:
+            return []
+        
+        candidates: Set[str] = set()
+        for buckets, key in zip(self._bands, self._band_keys(signature)):
+            candidates |= buckets.get(key, set())
+        candidates.discard(exclude)
+        if not candidates:
+            return []
+        
+        # Share of equal MinHash values estimates the Jaccard similarity of the shingle sets
+        ids = list(candidates)
+        similarities = (np.stack([self._signatures[document_id] for document_id in ids]) == signature).mean(axis=1)
+        matches = [
+            (document_id, float(similarity))
+            for document_id, similarity in zip(ids, similarities)
+            if similarity >= settings.duplicate_threshold
+        ]
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches[:limit]
+    
+    async def duplicates(self, document_id: str, limit: int = 10) -> Optional[List[Tuple[str, float]]]:
+        """Find the near-duplicates of a document. None if the document does not exist."""
+        signature = self._signatures.get(document_id)
+        if signature is None:
+            # Not indexed: no text, or written by another process moments ago
+            doc = await supabase_service.get_document(document_id, columns="id,content_minhash")
+            if not doc:
+                return None
+            signature = decode_signature(doc["content_minhash"])
+        
+        return self.find(signature, limit, exclude=document_id)
+    
+    def on_document_change(self, event: str, document: Dict[str, Any]):
+        """Update the index after a document is written by this process."""
+        if event == "deleted":
+            self.remove(document["id"])
+        elif event == "created":
+            # Text (and so the signature) only changes on creation
+            self._pending.add(document["id"])
+            self._wakeup.set()
+    
+    async def _sync_loop(self):
+        """Index created documents right away and catch up with other processes' writes periodically."""
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Duplicate index sync failed: {e}")
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.duplicate_sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    async def sync(self):
+        """Bring the index up to date: pending documents first, then the change feed."""
+        pending, self._pending = self._pending, set()
+        if pending:
+            docs = await supabase_service.get_documents_by_ids(list(pending), columns="id,content_minhash")
+            await self._index_documents(docs)
+        
+        while True:
+            changes = await supabase_service.get_changes(
+                since=self.watermark,
+                limit=SYNC_BATCH_SIZE,
+                columns="id,content_minhash"
+            )
+            for deletion in changes["deletions"]:
+                self.remove(deletion["id"])
+            await self._index_documents(changes["documents"])
+            self.watermark = changes["watermark"]
+            if not changes["has_more"]:
+                break
+    
+    async def _index_documents(self, docs: List[Dict[str, Any]]):
+        """Index stored signatures, computing and saving them for documents that have none yet."""
+        missing = []
+        for doc in docs:
+            if doc["content_minhash"] is None:
+                missing.append(doc["id"])
+            else:
+                self.add(doc["id"], decode_signature(doc["content_minhash"]))
+        
+        if not missing:
+            return
+        
+        # Documents created before signatures existed, or imported with their text
+        docs = await supabase_service.get_documents_by_ids(missing, columns="id,content_text")
+        signatures = [await self.signature(doc["content_text"]) for doc in docs]
+        await asyncio.gather(*(
+            supabase_service.set_content_minhash(doc["id"], encode_signature(signature))
+            for doc, signature in zip(docs, signatures)
+        ))
+        for doc, signature in zip(docs, signatures):
+            self.add(doc["id"], signature)
+        logger.info(f"Computed MinHash signatures for {len(docs)} documents")
+
+
+# Global service instance, kept in sync with this process's writes
+duplicate_service = DuplicateService()
+supabase_service.on_change(duplicate_service.on_document_change)
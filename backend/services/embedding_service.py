@@ -0,0 +1,308 @@
+import asyncio
+import base64
+from abc import ABC, abstractmethod
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from config import settings
+from metrics import cache_collector, track_upstream
+from services.analysis_cache import AnalysisCache
+from services.supabase_service import supabase_service
+from services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Columns an embedding is computed from
+EMBEDDING_COLUMNS = "id,title,author,tags,description,content_text"
+
+# Characters of extracted text included in a document's embedding
+EMBEDDING_TEXT_CHARS = 8000
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into fixed-size vectors. Subclass to plug in another model."""
+    
+    name = "base"
+    dimension = 0
+    # Remote providers have their vectors cached, since recomputing them costs money
+    remote = False
+    
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into an array of shape (len(texts), dimension)."""
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic local embeddings from hashed words and word pairs.
+    
+    No model or network needed: documents sharing vocabulary are close. Meant
+    for tests and development; use the OpenAI provider for semantic matches.
+    """
+    
+    name = "hashing"
+    dimension = 256
+    
+    def _embed_one(self, text: str) -> np.ndarray:
+        """Signed feature hashing of unigrams and bigrams."""
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        words = re.findall(r"[^\W_]+", text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+            vector[digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        return vector
+    
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into an array of shape (len(texts), dimension)."""
+        return np.stack([self._embed_one(text) for text in texts]) if texts else np.zeros((0, self.dimension), np.float32)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI API."""
+    
+    name = "openai:text-embedding-3-small"
+    dimension = 1536
+    remote = True
+    BATCH_SIZE = 100
+    
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into an array of shape (len(texts), dimension)."""
+        from services.openai_service import openai_service
+        
+        vectors = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            async with openai_service.semaphore, track_upstream("openai", "text-embedding-3-small"):
+                response = await openai_service.client.embeddings.create(
+                    model="text-embedding-3-small",
+                    input=texts[start:start + self.BATCH_SIZE]
+                )
+            vectors.extend(item.embedding for item in response.data)
+        return np.array(vectors, dtype=np.float32).reshape(len(texts), self.dimension)
+
+
+PROVIDERS = {
+    "hashing": HashingEmbeddingProvider,
+    "openai": OpenAIEmbeddingProvider,
+}
+
+
+def document_text(doc: Dict[str, Any]) -> str:
+    """Text an embedding is computed from."""
+    parts = [
+        doc.get("title"),
+        doc.get("author"),
+        " ".join(doc.get("tags") or []),
+        doc.get("description"),
+        (doc.get("content_text") or "")[:EMBEDDING_TEXT_CHARS]
+    ]
+    return "\n".join(part for part in parts if part)
+
+
+class EmbeddingService:
+    """Keeps a vector index of all documents in sync and answers similarity queries."""
+    
+    def __init__(self):
+        """Initialize the service (the index opens with start())."""
+        self.provider: EmbeddingProvider = PROVIDERS[settings.embedding_provider]()
+        self.index: Optional[VectorIndex] = None
+        self._cache: Optional[AnalysisCache] = None
+        self._pending: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._saved_watermark: Optional[str] = None
+        self._saved_at = 0.0
+    
+    def start(self):
+        """Open the index and start keeping it in sync."""
+        self.index = VectorIndex(
+            settings.embedding_index_dir,
+            self.provider.dimension,
+            self.provider.name,
+            exact_threshold=settings.embedding_exact_threshold
+        )
+        self._saved_watermark = self.index.watermark
+        self._saved_at = time.monotonic()
+        if self.provider.remote:
+            self._cache = AnalysisCache(
+                os.path.join(settings.embedding_index_dir, "embedding_cache.sqlite3"),
+                max_entries=settings.embedding_cache_max_entries,
+                ttl=settings.analysis_cache_ttl
+            )
+        self._task = asyncio.create_task(self._sync_loop())
+    
+    async def stop(self):
+        """Stop syncing and save the index."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self.index is not None:
+            index, self.index = self.index, None
+            await asyncio.to_thread(index.close)
+    
+    def on_document_change(self, event: str, doc: Dict[str, Any]):
+        """Update the index after a document is written by this process."""
+        if self.index is None:
+            return
+        if event == "deleted":
+            self.index.remove(doc["id"])
+        else:
+            self._pending.add(doc["id"])
+            self._wakeup.set()
+    
+    async def _sync_loop(self):
+        """Embed written documents right away and catch up with other processes' writes periodically."""
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Embedding index sync failed: {e}")
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.embedding_sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    async def sync(self):
+        """Bring the index up to date: pending documents first, then the change feed."""
+        pending, self._pending = self._pending, set()
+        if pending:
+            docs = await supabase_service.get_documents_by_ids(list(pending), columns=EMBEDDING_COLUMNS)
+            await self._index_documents(docs)
+        
+        while True:
+            changes = await supabase_service.get_changes(
+                since=self.index.watermark,
+                limit=500,
+                columns=EMBEDDING_COLUMNS
+            )
+            for deletion in changes["deletions"]:
+                self.index.remove(deletion["id"])
+            await self._index_documents(changes["documents"])
+            self.index.watermark = changes["watermark"]
+            if not changes["has_more"]:
+                break
+        
+        # Saving writes metadata for every document, so it happens at most once per
+        # sync interval (and at stop()); local writes reach the saved copy through the feed
+        if (
+            self.index.watermark != self._saved_watermark
+            and time.monotonic() - self._saved_at >= settings.embedding_sync_interval
+        ):
+            self._saved_watermark = self.index.watermark
+            self._saved_at = time.monotonic()
+            await self.index.save_async()
+    
+    async def _index_documents(self, docs: List[Dict[str, Any]]):
+        """Embed documents whose text changed since they were indexed."""
+        stale = []
+        for doc in docs:
+            text = document_text(doc)
+            text_hash = hashlib.sha256(text.encode()).hexdigest()
+            if self.index.text_hash(doc["id"]) != text_hash:
+                stale.append((doc["id"], text, text_hash))
+        
+        if not stale:
+            return
+        
+        vectors = await self.embed([text for _, text, _ in stale])
+        for (document_id, _, text_hash), vector in zip(stale, vectors):
+            self.index.upsert(document_id, vector, text_hash)
+        logger.info(f"Indexed {len(stale)} document embeddings")
+    
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, reusing cached vectors of remote providers."""
+        if self._cache is None:
+            return await self.provider.embed(texts)
+        
+        keys = [
+            hashlib.sha256(f"{self.provider.name}\x00{text}".encode()).hexdigest()
+            for text in texts
+        ]
+        cached = await asyncio.gather(*(self._cache.get(key) for key in keys))
+        missing = [i for i, entry in enumerate(cached) if entry is None]
+        
+        vectors = np.zeros((len(texts), self.provider.dimension), dtype=np.float32)
+        for i, entry in enumerate(cached):
+            if entry is not None:
+                vectors[i] = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+        
+        if missing:
+            computed = await self.provider.embed([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+                await self._cache.set(keys[i], {"vector": base64.b64encode(vector.tobytes()).decode()})
+        return vectors
+    
+    async def search(
+        self,
+        query: str,
+        limit: int = 50,
+        offset: int = 0,
+        category: Optional[str] = None,
+        file_type: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Find the documents closest in meaning to a text query, as (id, score)."""
+        vector = (await self.embed([query]))[0]
+        return await self._nearest(vector, limit, offset, category, file_type)
+    
+    async def similar(
+        self,
+        document_id: str,
+        limit: int = 10,
+        category: Optional[str] = None,
+        file_type: Optional[str] = None
+    ) -> Optional[List[Tuple[str, float]]]:
+        """Find the documents most similar to a document. None if the document does not exist."""
+        vector = self.index.get(document_id)
+        if vector is None:
+            # Not indexed yet (e.g. written by another process moments ago)
+            doc = await supabase_service.get_document(document_id, columns=EMBEDDING_COLUMNS)
+            if not doc:
+                return None
+            await self._index_documents([doc])
+            vector = self.index.get(document_id)
+        
+        return await self._nearest(vector, limit, 0, category, file_type, exclude=document_id)
+    
+    async def _nearest(
+        self,
+        vector: np.ndarray,
+        limit: int,
+        offset: int,
+        category: Optional[str],
+        file_type: Optional[str],
+        exclude: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Nearest documents, over-fetching when filters have to be applied afterwards."""
+        wanted = limit + offset
+        if not (category or file_type):
+            return self.index.search(vector, wanted, exclude=exclude)[offset:]
+        
+        fetch = wanted * 5
+        while True:
+            candidates = self.index.search(vector, fetch, exclude=exclude)
+            docs = await supabase_service.get_documents_by_ids(
+                [document_id for document_id, _ in candidates],
+                columns="id,category,file_type"
+            )
+            allowed = {
+                doc["id"] for doc in docs
+                if (not category or doc["category"] == category)
+                and (not file_type or doc["file_type"] == file_type)
+            }
+            matches = [match for match in candidates if match[0] in allowed]
+            # Widen the search while the filters leave too few matches
+            if len(matches) >= wanted or len(candidates) < fetch or fetch >= len(self.index):
+                return matches[offset:wanted]
+            fetch *= 4
+
+
+# Global service instance, kept in sync with this process's writes
+embedding_service = EmbeddingService()
+supabase_service.on_change(embedding_service.on_document_change)
+cache_collector.register("embedding", lambda: embedding_service._cache)
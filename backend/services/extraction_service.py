@@ -0,0 +1,185 @@
+import asyncio
+import codecs
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Callable, Dict, Iterator, Optional
+from xml.etree import ElementTree
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# WordprocessingML namespace used in word/document.xml
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Bytes decoded per step for plain text files
+TEXT_WINDOW_SIZE = 64 * 1024
+
+# Longer lines of plain text files are split, so a file without newlines is never buffered whole
+TEXT_MAX_LINE_CHARS = 1024 * 1024
+
+
+def _pdf_pages(path: str) -> Iterator[str]:
+    """Yield the text of each PDF page, reading and parsing pages only as they are requested."""
+    from pypdf import PdfReader
+    
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+
+def _docx_paragraphs(path: str) -> Iterator[str]:
+    """Yield the text of each DOCX paragraph while streaming through the document XML."""
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as xml:
+        runs = []
+        for _, element in ElementTree.iterparse(xml, events=("end",)):
+            if element.tag == f"{WORD_NAMESPACE}t":
+                runs.append(element.text or "")
+            elif element.tag == f"{WORD_NAMESPACE}tab":
+                runs.append("\t")
+            elif element.tag == f"{WORD_NAMESPACE}p":
+                yield "".join(runs)
+                runs = []
+                element.clear()
+
+
+def _text_lines(path: str) -> Iterator[str]:
+    """
+    Yield the lines of a TXT/CSV file (UTF-8, else Windows-1252), decoding one window at a time.
+    
+    Lines longer than TEXT_MAX_LINE_CHARS are yielded in pieces.
+    """
+    with open(path, "rb") as f:
+        window = f.read(TEXT_WINDOW_SIZE)
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(window)
+            decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        except UnicodeDecodeError:
+            decoder = codecs.getincrementaldecoder("cp1252")(errors="replace")
+        
+        pending = ""
+        while window:
+            *lines, pending = (pending + decoder.decode(window)).split("\n")
+            yield from lines
+            if len(pending) >= TEXT_MAX_LINE_CHARS:
+                yield pending
+                pending = ""
+            window = f.read(TEXT_WINDOW_SIZE)
+    yield pending + decoder.decode(b"", final=True)
+
+
+# Text extractor per file extension
+EXTRACTORS: Dict[str, Callable[[str], Iterator[str]]] = {
+    "pdf": _pdf_pages,
+    "docx": _docx_paragraphs,
+    "txt": _text_lines,
+    "csv": _text_lines,
+}
+
+
+def extract_text(path: str, file_type: str, max_chars: int) -> Optional[str]:
+    """
+    Extract up to max_chars of text from a file on disk.
+    
+    Runs in a worker process. Extraction stops as soon as enough text is
+    collected, so the rest of a long PDF is never read or parsed.
+    """
+    parts = []
+    collected = 0
+    for part in EXTRACTORS[file_type](path):
+        part = part.strip()
+        if not part:
+            continue
+        parts.append(part)
+        collected += len(part) + 1
+        if collected >= max_chars:
+            break
+    
+    return "\n".join(parts)[:max_chars] or None
+
+
+class ExtractionService:
+    """Extracts document text in a process pool so parsing never blocks the event loop."""
+    
+    def __init__(self):
+        """Initialize the service (the pool starts on first use)."""
+        self._pool: Optional[ProcessPoolExecutor] = None
+    
+    def accepts(self, file_type: str, file_size: int) -> bool:
+        """Whether text can be extracted from a file of this type and size."""
+        return file_type.lower() in EXTRACTORS and file_size <= settings.extraction_max_file_size
+    
+    async def spool(self, file: BinaryIO) -> str:
+        """
+        Copy an uploaded file to a named temporary file the workers can open.
+        
+        The copy is made in chunks off the event loop, so only a path (never
+        the file's bytes) is held in memory and sent to the worker.
+        """
+        def copy() -> str:
+            spooled = tempfile.NamedTemporaryFile(prefix="extract-", delete=False)
+            try:
+                with spooled:
+                    shutil.copyfileobj(file, spooled, settings.upload_chunk_size)
+                return spooled.name
+            except BaseException:
+                os.remove(spooled.name)
+                raise
+        
+        return await asyncio.to_thread(copy)
+    
+    async def extract(self, path: str, file_type: str) -> Optional[str]:
+        """Extract the text of a spooled file, then remove the file. Returns None if it cannot be extracted."""
+        try:
+            return await self._extract(path, file_type)
+        finally:
+            self.discard(path)
+    
+    def discard(self, path: str):
+        """Remove a spooled file, if it still exists."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    async def _extract(self, path: str, file_type: str) -> Optional[str]:
+        """Run extract_text in the process pool."""
+        if self._pool is None:
+            # spawn: forking a process that already runs threads (to_thread, caches) is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.extraction_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool,
+                extract_text,
+                path,
+                file_type.lower(),
+                settings.extraction_max_chars
+            )
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory on a hostile file); start a new pool next time
+            logger.error(f"Text extraction pool broke: {e}")
+            self._pool = None
+            return None
+        except Exception as e:
+            logger.warning(f"Error extracting text from {file_type} file: {e}")
+            return None
+    
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global service instance
+extraction_service = ExtractionService()
@@ -0,0 +1,188 @@
+import asyncio
+import codecs
+import json
+import logging
+from typing import Any, AsyncIterator, List, Optional, Tuple
+import httpx
+from pydantic import ValidationError
+from config import settings
+from models import DocumentCreate, ImportFailure, ImportResponse
+from services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+# Largest single record accepted (guards against unbounded buffering of malformed input)
+MAX_RECORD_SIZE = 1024 * 1024
+
+# Failures listed in the response; failed still counts all of them
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportService:
+    """Bulk document import from NDJSON or a JSON array of DocumentCreate records."""
+    
+    async def parse(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+        """
+        Decode records from a streamed body as (record, error) pairs.
+        
+        A body starting with '[' is read as a JSON array, anything else as NDJSON.
+        Records are yielded as soon as they are complete, so the body is never
+        held in memory as a whole. Input that cannot be resynchronized (a broken
+        array element or an oversized record) ends the stream with an error.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        array = None
+        
+        async for chunk in chunks:
+            buffer += decoder.decode(chunk)
+            if array is None:
+                buffer = buffer.lstrip()
+                if not buffer:
+                    continue
+                array = buffer.startswith("[")
+                if array:
+                    buffer = buffer[1:]
+            
+            if array:
+                records, buffer = self._split_array(buffer)
+            else:
+                *lines, buffer = buffer.split("\n")
+                records = [self._decode_line(line) for line in lines if line.strip()]
+            
+            for record in records:
+                yield record
+            
+            if len(buffer) > MAX_RECORD_SIZE:
+                yield None, f"Record larger than {MAX_RECORD_SIZE} bytes, import stopped"
+                return
+        
+        buffer += decoder.decode(b"", final=True)
+        if array:
+            records, buffer = self._split_array(buffer)
+            for record in records:
+                yield record
+            if buffer.strip():
+                yield None, "Malformed or unterminated JSON array, import stopped"
+        elif buffer.strip():
+            yield self._decode_line(buffer)
+    
+    @staticmethod
+    def _decode_line(line: str) -> Tuple[Any, Optional[str]]:
+        """Decode one NDJSON line."""
+        try:
+            return json.loads(line), None
+        except json.JSONDecodeError as e:
+            return None, f"Invalid JSON: {e}"
+    
+    @staticmethod
+    def _split_array(buffer: str) -> Tuple[List[Tuple[Any, Optional[str]]], str]:
+        """Take the complete array elements off the front of buffer."""
+        decoder = json.JSONDecoder()
+        records = []
+        pos = 0
+        
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,]":
+                pos += 1
+            if pos == len(buffer):
+                break
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Incomplete element, wait for more data
+                break
+            records.append((record, None))
+        
+        return records, buffer[pos:]
+    
+    @staticmethod
+    def _validation_error(error: ValidationError) -> str:
+        """Summarize a validation error on one line."""
+        return "; ".join(
+            f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+            for item in error.errors()
+        )
+    
+    async def import_documents(
+        self,
+        chunks: AsyncIterator[bytes],
+        batch_size: Optional[int] = None
+    ) -> ImportResponse:
+        """
+        Validate records as they stream in and insert them in batches.
+        
+        Invalid records are reported and skipped. Up to import_concurrency
+        batches are inserted at the same time while parsing continues.
+        """
+        batch_size = batch_size or settings.import_batch_size
+        received = 0
+        imported = 0
+        failures: List[ImportFailure] = []
+        batch: List[Tuple[int, DocumentCreate]] = []
+        pending = set()
+        
+        async def flush(rows: List[Tuple[int, DocumentCreate]]) -> int:
+            rejected = await self._insert(rows)
+            failures.extend(rejected)
+            return len(rows) - len(rejected)
+        
+        async def drain(wait: str):
+            nonlocal imported, pending
+            done, pending = await asyncio.wait(pending, return_when=wait)
+            imported += sum(task.result() for task in done)
+        
+        async for record, error in self.parse(chunks):
+            index = received
+            received += 1
+            
+            if error is None:
+                try:
+                    batch.append((index, DocumentCreate.model_validate(record)))
+                except ValidationError as e:
+                    error = self._validation_error(e)
+            if error is not None:
+                failures.append(ImportFailure(index=index, error=error))
+            
+            if len(batch) >= batch_size:
+                pending.add(asyncio.create_task(flush(batch)))
+                batch = []
+                if len(pending) >= settings.import_concurrency:
+                    await drain(asyncio.FIRST_COMPLETED)
+        
+        if batch:
+            pending.add(asyncio.create_task(flush(batch)))
+        if pending:
+            await drain(asyncio.ALL_COMPLETED)
+        
+        failures.sort(key=lambda failure: failure.index)
+        logger.info(f"Imported {imported}/{received} documents ({len(failures)} failed)")
+        return ImportResponse(
+            received=received,
+            imported=imported,
+            failed=len(failures),
+            errors=failures[:MAX_REPORTED_ERRORS]
+        )
+    
+    async def _insert(self, rows: List[Tuple[int, DocumentCreate]]) -> List[ImportFailure]:
+        """
+        Insert a batch and return the rows that could not be inserted.
+        
+        When the database rejects the batch, it is split in halves and retried,
+        so one bad row costs O(log n) extra inserts instead of failing all of them.
+        """
+        try:
+            await supabase_service.create_documents([document for _, document in rows])
+            return []
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500 or len(rows) == 1:
+                return [ImportFailure(index=index, error=e.response.text) for index, _ in rows]
+        except Exception as e:
+            return [ImportFailure(index=index, error=str(e)) for index, _ in rows]
+        
+        middle = len(rows) // 2
+        return await self._insert(rows[:middle]) + await self._insert(rows[middle:])
+
+
+# Global service instance
+import_service = ImportService()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from config import settings
+from models import JobStatusEnum
+from services.supabase_service import supabase_service, ANALYSIS_COLUMNS
+from services.openai_service import openai_service, analysis_to_update
+
+logger = logging.getLogger(__name__)
+
+
+class JobService:
+    """Background worker pool for AI enrichment jobs stored in analysis_jobs."""
+    
+    def __init__(self):
+        """Initialize the job service (workers start with start())."""
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+    
+    async def enqueue(self, document_id: str) -> Dict[str, Any]:
+        """Queue AI analysis for a document and wake an idle worker."""
+        job = await supabase_service.create_analysis_job(document_id, settings.job_max_attempts)
+        self._wakeup.set()
+        return job
+    
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by ID."""
+        return await supabase_service.get_analysis_job(job_id)
+    
+    def start(self):
+        """Start the worker tasks."""
+        for i in range(settings.job_workers):
+            self._workers.append(asyncio.create_task(self._work(i)))
+        logger.info(f"Started {settings.job_workers} analysis job workers")
+    
+    async def stop(self):
+        """
+        Stop the worker tasks.
+        
+        Jobs interrupted mid-run keep their lease and are picked up again
+        once it expires.
+        """
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+    
+    async def _work(self, worker_id: int):
+        """Claim and run due jobs until cancelled."""
+        while True:
+            try:
+                jobs = await supabase_service.claim_analysis_jobs(1, settings.job_lease_seconds)
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} failed to claim jobs: {e}")
+                jobs = []
+            
+            if not jobs:
+                # Sleep until the next poll, or until a job is enqueued locally
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.job_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            for job in jobs:
+                await self._run(job)
+    
+    async def _run(self, job: Dict[str, Any]):
+        """Run one claimed job and record its outcome, scheduling retries on failure."""
+        job_id = job["id"]
+        
+        # A reclaimed job may already have used up its attempts
+        if job["attempts"] > job["max_attempts"]:
+            await self._finish(job_id, JobStatusEnum.FAILED, error=job.get("error") or "Job lease expired")
+            return
+        
+        try:
+            result = await self._analyze_document(job["document_id"])
+            await self._finish(job_id, JobStatusEnum.COMPLETED, result=result)
+        except LookupError as e:
+            await self._finish(job_id, JobStatusEnum.FAILED, error=str(e))
+        except Exception as e:
+            logger.warning(f"Analysis job {job_id} attempt {job['attempts']} failed: {e}")
+            if job["attempts"] >= job["max_attempts"]:
+                await self._finish(job_id, JobStatusEnum.FAILED, error=str(e))
+                return
+            
+            # Exponential backoff before the next attempt
+            delay = settings.job_retry_backoff * 2 ** (job["attempts"] - 1)
+            run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            await self._save(job_id, {
+                "status": JobStatusEnum.QUEUED.value,
+                "run_after": run_after.isoformat(),
+                "locked_until": None,
+                "error": str(e)
+            })
+    
+    async def _analyze_document(self, document_id: str) -> Dict[str, Any]:
+        """Analyze a document with AI and apply the suggestions to it."""
+        doc = await supabase_service.get_document(document_id, columns=ANALYSIS_COLUMNS)
+        if not doc:
+            raise LookupError("Document not found")
+        
+        analysis = await openai_service.analyze_document(
+            file_name=doc["file_name"],
+            file_type=doc["file_type"],
+            content_preview=doc.get("content_text") or doc.get("description"),
+            content_hash=doc.get("content_hash")
+        )
+        # analyze_document reports upstream failures as a zero-confidence result
+        if analysis.confidence == 0.0:
+            raise RuntimeError("AI analysis failed")
+        
+        await supabase_service.update_document(document_id, analysis_to_update(analysis, doc["title"]))
+        return analysis.model_dump(mode="json")
+    
+    async def _finish(
+        self,
+        job_id: str,
+        status: JobStatusEnum,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ):
+        """Mark a job as completed or failed."""
+        await self._save(job_id, {
+            "status": status.value,
+            "locked_until": None,
+            "result": result,
+            "error": error
+        })
+    
+    async def _save(self, job_id: str, data: Dict[str, Any]):
+        """Persist job state, logging instead of crashing the worker on failure."""
+        try:
+            await supabase_service.update_analysis_job(job_id, data)
+        except Exception as e:
+            logger.error(f"Error saving analysis job {job_id}: {e}")
+
+
+# Global service instance
+job_service = JobService()
@@ -1,51 +1,241 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 from typing import Dict, Any, Optional, List
+import asyncio
+import hashlib
 import logging
 import json
 from config import settings
-from models import CategoryEnum, AIAnalysisResponse
+from metrics import cache_collector, track_upstream
+from models import CategoryEnum, AIAnalysisResponse, AnalysisUpdate
+from services.analysis_cache import AnalysisCache
+from services.category_classifier import category_classifier
+from services.chunking import split_into_chunks
+from services.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the analysis prompt changes so stale cache entries are not reused
+ANALYSIS_PROMPT_VERSION = 4
+ANALYSIS_MODEL = "gpt-4"
+
+# Characters of document content sent with the analysis prompt. Longer
+# content is analyzed in chunks (map) whose summaries are combined (reduce).
+CONTENT_PREVIEW_CHARS = 2000
+
+# Chunk summaries of long documents; bump the version when the chunk prompt changes
+CHUNK_PROMPT_VERSION = 1
+CHUNK_MODEL = "gpt-3.5-turbo"
+
 
 class OpenAIService:
     """Service for OpenAI API interactions."""
     
     def __init__(self):
         """Initialize OpenAI client."""
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.cache: Dict[str, AIAnalysisResponse] = {}
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        self.cache = AnalysisCache(
+            settings.analysis_cache_path,
+            max_entries=settings.analysis_cache_max_entries,
+            ttl=settings.analysis_cache_ttl
+        )
+        # Bounds concurrent upstream calls; identical requests share one call
+        self.semaphore = asyncio.Semaphore(settings.openai_max_concurrency)
+        self.inflight = SingleFlight()
     
     async def analyze_document(
         self,
         file_name: str,
         file_type: str,
-        content_preview: Optional[str] = None
+        content_preview: Optional[str] = None,
+        content_hash: Optional[str] = None
     ) -> AIAnalysisResponse:
         """
         Analyze a document and extract metadata using GPT-4.
         
+        Content longer than CONTENT_PREVIEW_CHARS is split into chunks that
+        are summarized concurrently, and GPT-4 analyzes the summaries.
+        
+        The local category classifier runs first. When it is confident, its
+        category is used and the rest of the metadata is requested from
+        settings.classified_analysis_model with a shorter prompt.
+        
         Args:
             file_name: Name of the file
             file_type: Type of the file (e.g., 'pdf', 'docx')
-            content_preview: Optional preview of document content
+            content_preview: Optional document content (extracted text or description)
+            content_hash: SHA-256 of the file, used as the cache identity
         
         Returns:
             AIAnalysisResponse with suggested metadata
         """
-        # Check cache
-        cache_key = f"{file_name}_{file_type}"
-        if cache_key in self.cache:
+        category, guess = category_classifier.classify(file_name, file_type, content_preview)
+        model = settings.classified_analysis_model if category else ANALYSIS_MODEL
+        
+        cache_key = self._analysis_cache_key(file_name, file_type, content_preview, content_hash, model, category)
+        if content_preview and len(content_preview) > CONTENT_PREVIEW_CHARS:
+            analyze = self._analyze_long
+        else:
+            analyze = self._analyze
+        result = await self.inflight.do(
+            cache_key,
+            lambda: analyze(cache_key, file_name, file_type, content_preview, model, category)
+        )
+        
+        if guess and not category and result.confidence > 0:
+            category_classifier.record_agreement(guess, result.suggested_category)
+        return result
+    
+    def _analysis_cache_key(
+        self,
+        file_name: str,
+        file_type: str,
+        content_preview: Optional[str],
+        content_hash: Optional[str],
+        model: str = ANALYSIS_MODEL,
+        category: Optional[CategoryEnum] = None
+    ) -> str:
+        """
+        Build the cache key for an analysis.
+        
+        Files are identified by their content hash when known; otherwise by
+        name and type, which is everything the prompt can see about them.
+        """
+        identity = content_hash or f"{file_name}\x00{file_type}"
+        raw = json.dumps([
+            "analysis",
+            ANALYSIS_PROMPT_VERSION,
+            model,
+            category.value if category else None,
+            identity,
+            hashlib.sha256((content_preview or "").encode()).hexdigest()
+        ])
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    async def _analyze(
+        self,
+        cache_key: str,
+        file_name: str,
+        file_type: str,
+        content_preview: Optional[str],
+        model: str = ANALYSIS_MODEL,
+        category: Optional[CategoryEnum] = None
+    ) -> AIAnalysisResponse:
+        """Run the GPT-4 analysis unless the cache already has it."""
+        cached = await self.cache.get(cache_key)
+        # Failed analyses cached by earlier versions are retried
+        if cached is not None and cached.get("confidence"):
+            logger.info(f"Using cached analysis for {file_name}")
+            return AIAnalysisResponse.model_validate(cached)
+        
+        try:
+            prompt = self._build_analysis_prompt(file_name, file_type, content_preview, category=category)
+            result = await self._request_analysis(prompt, model, category)
+            
+            # A reply that could not be parsed is not cached, so a retry asks again
+            if result.confidence > 0:
+                await self.cache.set(cache_key, result.model_dump(mode="json"))
+            
+            return result
+        except Exception as e:
+            logger.error(f"Error analyzing document with OpenAI: {e}")
+            return self._failed_analysis(file_name)
+    
+    async def _analyze_long(
+        self,
+        cache_key: str,
+        file_name: str,
+        file_type: str,
+        content: str,
+        model: str = ANALYSIS_MODEL,
+        category: Optional[CategoryEnum] = None
+    ) -> AIAnalysisResponse:
+        """Map-reduce analysis: summarize every chunk concurrently, then analyze the summaries."""
+        cached = await self.cache.get(cache_key)
+        # Failed analyses cached by earlier versions are retried
+        if cached is not None and cached.get("confidence"):
             logger.info(f"Using cached analysis for {file_name}")
-            return self.cache[cache_key]
+            return AIAnalysisResponse.model_validate(cached)
+        
+        chunks = await asyncio.to_thread(
+            split_into_chunks,
+            content,
+            settings.analysis_chunk_tokens,
+            settings.analysis_chunk_min_tokens
+        )
+        results = await asyncio.gather(
+            *(self.summarize_chunk(chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+        sections = [result for result in results if not isinstance(result, BaseException)]
+        if not sections:
+            logger.error(f"Every chunk summary of {file_name} failed: {results[0]}")
+            return self._failed_analysis(file_name)
         
         try:
-            # Build prompt
-            prompt = self._build_analysis_prompt(file_name, file_type, content_preview)
+            prompt = self._build_analysis_prompt(file_name, file_type, None, sections=sections, category=category)
+            result = await self._request_analysis(prompt, model, category)
+            
+            # A partial or unparseable result is not cached, so a retry re-runs what failed
+            if len(sections) == len(chunks) and result.confidence > 0:
+                await self.cache.set(cache_key, result.model_dump(mode="json"))
+            elif len(sections) < len(chunks):
+                logger.warning(f"Analyzed {file_name} from {len(sections)}/{len(chunks)} chunks")
             
-            # Call GPT-4
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            return result
+        except Exception as e:
+            logger.error(f"Error analyzing long document with OpenAI: {e}")
+            return self._failed_analysis(file_name)
+    
+    async def summarize_chunk(self, chunk: str) -> Dict[str, Any]:
+        """Summarize one chunk of a long document, cached by the chunk's hash."""
+        raw = json.dumps(["chunk", CHUNK_PROMPT_VERSION, CHUNK_MODEL, chunk])
+        key = hashlib.sha256(raw.encode()).hexdigest()
+        return await self.inflight.do(key, lambda: self._summarize_chunk(key, chunk))
+    
+    async def _summarize_chunk(self, key: str, chunk: str) -> Dict[str, Any]:
+        """Ask the chunk model for a summary unless the cache already has it."""
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        prompt = f"""Summarize this section of a longer document.
+
+Section:
+{chunk}
+
+Respond ONLY with valid JSON in this exact format:
+{{
+    "summary": "What this section says (max 300 chars)",
+    "tags": ["tag1", "tag2"],
+    "author": "Author Name or null",
+    "category": "One of: Financeiro, RH, Técnico, Marketing, Legal, Geral"
+}}
+"""
+        async with self.semaphore, track_upstream("openai", CHUNK_MODEL):
+            response = await self.client.chat.completions.create(
+                model=CHUNK_MODEL,
+                messages=[
+                    {"role": "system", "content": "You summarize document sections accurately and concisely."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                max_tokens=300
+            )
+        
+        section = self._load_json(response.choices[0].message.content)
+        await self.cache.set(key, section)
+        return section
+    
+    async def _request_analysis(
+        self,
+        prompt: str,
+        model: str = ANALYSIS_MODEL,
+        category: Optional[CategoryEnum] = None
+    ) -> AIAnalysisResponse:
+        """Send an analysis prompt to the model and parse the metadata it returns (category, if known, is kept)."""
+        async with self.semaphore, track_upstream("openai", model):
+            response = await self.client.chat.completions.create(
+                model=model,
                 messages=[
                     {
                         "role": "system",
@@ -59,55 +249,72 @@ class OpenAIService:
                 temperature=0.3,
                 max_tokens=500
             )
-            
-            # Parse response
-            result = self._parse_gpt_response(response.choices[0].message.content)
-            
-            # Cache result
-            self.cache[cache_key] = result
-            
-            return result
-        except Exception as e:
-            logger.error(f"Error analyzing document with OpenAI: {e}")
-            # Return default response on error
-            return AIAnalysisResponse(
-                suggested_title=file_name,
-                suggested_category=CategoryEnum.GERAL,
-                suggested_tags=[],
-                confidence=0.0
-            )
+        
+        result = self._parse_gpt_response(response.choices[0].message.content)
+        if category:
+            result.suggested_category = category
+        result.category_source = "classifier" if category else "model"
+        return result
+    
+    def _failed_analysis(self, file_name: str) -> AIAnalysisResponse:
+        """Default response returned when the analysis fails."""
+        return AIAnalysisResponse(
+            suggested_title=file_name,
+            suggested_category=CategoryEnum.GERAL,
+            suggested_tags=[],
+            confidence=0.0
+        )
     
     def _build_analysis_prompt(
         self,
         file_name: str,
         file_type: str,
-        content_preview: Optional[str]
+        content_preview: Optional[str],
+        sections: Optional[List[Dict[str, Any]]] = None,
+        category: Optional[CategoryEnum] = None
     ) -> str:
-        """Build the analysis prompt for GPT-4."""
+        """
+        Build the analysis prompt from a content preview or from chunk summaries.
+        
+        When the category is already known, the model is not asked for it.
+        """
         prompt = f"""Analyze this document and extract metadata:
 
 File Name: {file_name}
 File Type: {file_type}
 """
         
-        if content_preview:
-            prompt += f"\nContent Preview:\n{content_preview[:500]}\n"
+        if sections:
+            prompt += f"\nThe document is long and was read in {len(sections)} sections. Section summaries, in order:\n"
+            for i, section in enumerate(sections, 1):
+                prompt += f"[{i}] {section.get('summary') or ''}"
+                if section.get("tags"):
+                    prompt += f" (tags: {', '.join(map(str, section['tags']))})"
+                if section.get("author"):
+                    prompt += f" (author: {section['author']})"
+                prompt += "\n"
+        elif content_preview:
+            prompt += f"\nContent Preview:\n{content_preview[:CONTENT_PREVIEW_CHARS]}\n"
         
+        source = " and section summaries" if sections else " and content" if content_preview else ""
+        if category:
+            prompt += f"\nCategory (already determined): {category.value}\n"
+        items = [
+            "A clear, descriptive title (max 100 chars)",
+            "Suggested author (if identifiable, otherwise null)",
+            None if category else "Category (choose ONE from: Financeiro, RH, Técnico, Marketing, Legal, Geral)",
+            "3-5 relevant tags",
+            "A brief summary (max 200 chars)",
+            "Confidence score (0.0 to 1.0)",
+        ]
+        prompt += f"\nBased on the file name{source}, provide:\n\n"
+        prompt += "".join(f"{i}. {item}\n" for i, item in enumerate(filter(None, items), 1))
+        category_field = "" if category else '\n    "category": "Category",'
         prompt += f"""
-Based on the file name{' and content' if content_preview else ''}, provide:
-
-1. A clear, descriptive title (max 100 chars)
-2. Suggested author (if identifiable, otherwise null)
-3. Category (choose ONE from: Financeiro, RH, Técnico, Marketing, Legal, Geral)
-4. 3-5 relevant tags
-5. A brief summary (max 200 chars)
-6. Confidence score (0.0 to 1.0)
-
 Respond ONLY with valid JSON in this exact format:
 {{
     "title": "Document Title",
-    "author": "Author Name or null",
-    "category": "Category",
+    "author": "Author Name or null",{category_field}
     "tags": ["tag1", "tag2", "tag3"],
     "summary": "Brief summary",
     "confidence": 0.85
@@ -118,15 +325,7 @@ Respond ONLY with valid JSON in this exact format:
     def _parse_gpt_response(self, response_text: str) -> AIAnalysisResponse:
         """Parse GPT-4 response into AIAnalysisResponse."""
         try:
-            # Extract JSON from response
-            response_text = response_text.strip()
-            
-            # Remove markdown code blocks if present
-            if response_text.startswith("```"):
-                lines = response_text.split("\n")
-                response_text = "\n".join(lines[1:-1])
-            
-            data = json.loads(response_text)
+            data = self._load_json(response_text)
             
             # Map category string to enum
             category_str = data.get("category", "Geral")
@@ -150,6 +349,14 @@ Respond ONLY with valid JSON in this exact format:
                 confidence=0.0
             )
     
+    def _load_json(self, response_text: str) -> Any:
+        """Decode a JSON reply, removing markdown code blocks if present."""
+        response_text = response_text.strip()
+        if response_text.startswith("```"):
+            lines = response_text.split("\n")
+            response_text = "\n".join(lines[1:-1])
+        return json.loads(response_text)
+    
     def _map_category(self, category_str: str) -> CategoryEnum:
         """Map category string to CategoryEnum."""
         category_map = {
@@ -166,6 +373,13 @@ Respond ONLY with valid JSON in this exact format:
     
     async def suggest_tags(self, title: str, description: Optional[str] = None) -> List[str]:
         """Suggest tags based on title and description."""
+        return await self.inflight.do(
+            ("tags", title, description),
+            lambda: self._suggest_tags(title, description)
+        )
+    
+    async def _suggest_tags(self, title: str, description: Optional[str]) -> List[str]:
+        """Ask GPT-3.5 for tag suggestions."""
         try:
             prompt = f"Suggest 5 relevant tags for this document:\nTitle: {title}"
             if description:
@@ -173,15 +387,16 @@ Respond ONLY with valid JSON in this exact format:
             
             prompt += "\n\nRespond with ONLY a JSON array of tags, e.g., [\"tag1\", \"tag2\", \"tag3\"]"
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that suggests relevant tags."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,
-                max_tokens=100
-            )
+            async with self.semaphore, track_upstream("openai", "gpt-3.5-turbo"):
+                response = await self.client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": "You are a helpful assistant that suggests relevant tags."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.5,
+                    max_tokens=100
+                )
             
             tags_text = response.choices[0].message.content.strip()
             tags = json.loads(tags_text)
@@ -196,5 +411,18 @@ Respond ONLY with valid JSON in this exact format:
         logger.info("OpenAI cache cleared")
 
 
+def analysis_to_update(analysis: AIAnalysisResponse, current_title: str) -> AnalysisUpdate:
+    """Turn AI suggestions into a metadata update for a document."""
+    return AnalysisUpdate(
+        title=analysis.suggested_title or current_title,
+        author=analysis.suggested_author,
+        category=analysis.suggested_category,
+        category_source="classifier" if analysis.category_source == "classifier" else None,
+        tags=analysis.suggested_tags,
+        description=analysis.summary
+    )
+
+
 # Global service instance
 openai_service = OpenAIService()
+cache_collector.register("analysis", lambda: openai_service.cache)
@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution."""
+    
+    def __init__(self):
+        """Initialize the in-flight call registry."""
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+    
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func once per key while a call for that key is in flight.
+        
+        Callers arriving while the first call is running await its result
+        instead of starting their own. Cancelling one caller does not cancel
+        the shared call for the others.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        """Drop a finished call so the next caller starts a fresh one."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+    
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -1,93 +1,462 @@
-from supabase import create_client, Client
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+import asyncio
+import base64
+import httpx
+import json
+import orjson
+import re
+from typing import AsyncIterator, Callable, List, Optional, Dict, Any, Tuple, Union
+from datetime import datetime, timedelta, timezone
 import logging
 from config import settings
-from models import Document, DocumentCreate, DocumentUpdate, CategoryEnum
+from metrics import track_upstream, upstream_labels
+from models import AnalysisUpdate, Document, DocumentCreate, DocumentUpdate, CategoryEnum
 
 logger = logging.getLogger(__name__)
 
+# Columns of the Document model. "*" would also pull internal columns such as
+# search_vector, and the extracted content_text, which is only read on request.
+DOCUMENT_COLUMNS = ",".join(Document.model_fields)
+
+# Columns needed to run an AI analysis on a document
+ANALYSIS_COLUMNS = "id,title,file_name,file_type,description,content_hash,content_text"
+
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """Build the opaque keyset cursor pointing after a document."""
+    raw = json.dumps([document["created_at"], document["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[str]:
+    """Decode a keyset cursor into [created_at, id]. Raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, document_id = json.loads(base64.urlsafe_b64decode(padded))
+        return [str(created_at), str(document_id)]
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def encode_watermark(documents: Optional[List[Any]], deletions: Optional[List[Any]]) -> str:
+    """Build the opaque change feed watermark from the last (updated_at, id) and (deleted_at, id) seen."""
+    raw = json.dumps({"documents": documents, "deletions": deletions})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_watermark(watermark: str) -> Tuple[Optional[List[Any]], Optional[List[Any]]]:
+    """Decode a change feed watermark. Raises ValueError if malformed."""
+    try:
+        padded = watermark + "=" * (-len(watermark) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        marks = data["documents"], data["deletions"]
+        for mark in marks:
+            if mark is not None and len(mark) != 2:
+                raise ValueError(mark)
+        return marks
+    except Exception as e:
+        raise ValueError("Invalid watermark") from e
+
+
+def prefix_tsquery(text: str) -> Optional[str]:
+    """Build a tsquery matching every word of text as a prefix, e.g. 'rel:*&q4:*'."""
+    words = re.findall(r"[^\W_]+", text)
+    return "&".join(f"{word}:*" for word in words) or None
+
 
 class SupabaseService:
     """Service for interacting with Supabase."""
     
+    # IDs per "id=in.(...)" filter, which keeps request URLs well under proxy limits
+    ID_BATCH_SIZE = 200
+    
+    # Paths per Storage remove call (the Storage API limit)
+    STORAGE_REMOVE_BATCH_SIZE = 1000
+    
     def __init__(self):
-        """Initialize Supabase client."""
-        self.client: Client = create_client(
-            settings.supabase_url,
-            settings.supabase_key
+        """Initialize the pooled async HTTP client for PostgREST and Storage."""
+        self.base_url = settings.supabase_url.rstrip("/")
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "apikey": settings.supabase_key,
+                "Authorization": f"Bearer {settings.supabase_key}",
+            },
+            limits=httpx.Limits(
+                max_connections=settings.supabase_max_connections,
+                max_keepalive_connections=settings.supabase_max_keepalive_connections,
+                keepalive_expiry=settings.supabase_keepalive_expiry,
+            ),
+            timeout=settings.supabase_timeout,
         )
+        # Caps in-flight Supabase calls so a burst cannot exhaust the pool
+        self.semaphore = asyncio.Semaphore(settings.supabase_max_concurrency)
         self.storage_bucket = "documents"
+        self._change_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+    
+    def on_change(self, listener: Callable[[str, Dict[str, Any]], None]):
+        """
+        Register a callback run after every document write.
+        
+        The callback receives the event ("created", "updated" or "deleted")
+        and the affected document row (only "id" is guaranteed for deletes).
+        """
+        self._change_listeners.append(listener)
+    
+    def _notify_change(self, event: str, document: Dict[str, Any]):
+        """Run the change listeners, isolating their failures from the write."""
+        for listener in self._change_listeners:
+            try:
+                listener(event, document)
+            except Exception as e:
+                logger.error(f"Error in document change listener: {e}")
+    
+    async def close(self):
+        """Close the underlying HTTP connection pool."""
+        await self.http.aclose()
+    
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request to Supabase, bounded by the concurrency limit."""
+        upstream, operation = upstream_labels(method, path)
+        async with self.semaphore:
+            # Timed inside the semaphore: queueing is the caller's latency, not Supabase's
+            async with track_upstream(upstream, operation):
+                response = await self.http.request(method, path, **kwargs)
+                if response.is_error:
+                    logger.error(f"Supabase {method} {path} failed ({response.status_code}): {response.text}")
+                response.raise_for_status()
+        return response
+    
+    async def _table(
+        self,
+        method: str,
+        table: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        prefer: Optional[str] = None
+    ) -> Any:
+        """Call a PostgREST table endpoint and return the decoded body."""
+        headers = {"Prefer": prefer} if prefer else None
+        response = await self._request(
+            method,
+            f"/rest/v1/{table}",
+            params=params,
+            json=json,
+            headers=headers
+        )
+        return orjson.loads(response.content) if response.content else None
+    
+    async def _rpc(
+        self,
+        function: str,
+        params: Optional[Dict[str, Any]] = None,
+        columns: Optional[str] = None
+    ) -> Any:
+        """
+        Call a Postgres function exposed through PostgREST.
+        
+        columns projects the rows of set-returning functions.
+        """
+        response = await self._request(
+            "POST",
+            f"/rest/v1/rpc/{function}",
+            params={"select": columns} if columns else None,
+            json=params or {}
+        )
+        return orjson.loads(response.content) if response.content else None
+    
+    @staticmethod
+    def _document_row(document: DocumentCreate) -> Dict[str, Any]:
+        """Build the documents table row for a new document."""
+        return {
+            "title": document.title,
+            "author": document.author,
+            "category": document.category.value,
+            "tags": document.tags,
+            "description": document.description,
+            "file_name": document.file_name,
+            "file_type": document.file_type,
+            "file_size": document.file_size,
+            "file_url": document.file_url,
+            "content_hash": document.content_hash,
+            "content_text": document.content_text,
+            "content_minhash": document.content_minhash,
+        }
     
     async def create_document(self, document: DocumentCreate) -> Dict[str, Any]:
         """Create a new document in the database."""
         try:
-            data = {
-                "title": document.title,
-                "author": document.author,
-                "category": document.category.value,
-                "tags": document.tags,
-                "description": document.description,
-                "file_name": document.file_name,
-                "file_type": document.file_type,
-                "file_size": document.file_size,
-                "file_url": document.file_url,
-            }
+            rows = await self._table(
+                "POST",
+                "documents",
+                params={"select": DOCUMENT_COLUMNS},
+                json=self._document_row(document),
+                prefer="return=representation"
+            )
+            if not rows:
+                return None
             
-            result = self.client.table("documents").insert(data).execute()
-            return result.data[0] if result.data else None
+            self._notify_change("created", rows[0])
+            return rows[0]
         except Exception as e:
             logger.error(f"Error creating document: {e}")
             raise
     
-    async def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
-        """Get a document by ID."""
+    async def create_documents(self, documents: List[DocumentCreate]) -> List[Dict[str, Any]]:
+        """
+        Create many documents with a single INSERT.
+        
+        The insert is one statement, so if any row is rejected none are created.
+        """
+        try:
+            rows = await self._table(
+                "POST",
+                "documents",
+                params={"select": DOCUMENT_COLUMNS},
+                json=[self._document_row(document) for document in documents],
+                prefer="return=representation"
+            ) or []
+            
+            for row in rows:
+                self._notify_change("created", row)
+            return rows
+        except Exception as e:
+            logger.error(f"Error creating {len(documents)} documents: {e}")
+            raise
+    
+    async def get_document(
+        self,
+        document_id: str,
+        columns: str = DOCUMENT_COLUMNS
+    ) -> Optional[Dict[str, Any]]:
+        """Get a document by ID, selecting only the given columns."""
         try:
-            result = self.client.table("documents").select("*").eq("id", document_id).execute()
-            return result.data[0] if result.data else None
+            rows = await self._table(
+                "GET",
+                "documents",
+                params={"select": columns, "id": f"eq.{document_id}"}
+            )
+            return rows[0] if rows else None
         except Exception as e:
             logger.error(f"Error getting document: {e}")
             raise
     
+    async def get_documents_by_ids(
+        self,
+        document_ids: List[str],
+        columns: str = DOCUMENT_COLUMNS
+    ) -> List[Dict[str, Any]]:
+        """Get many documents by ID with one query per ID_BATCH_SIZE IDs."""
+        try:
+            batches = [
+                document_ids[i:i + self.ID_BATCH_SIZE]
+                for i in range(0, len(document_ids), self.ID_BATCH_SIZE)
+            ]
+            results = await asyncio.gather(*[
+                self._table(
+                    "GET",
+                    "documents",
+                    params={"select": columns, "id": f"in.({','.join(batch)})"}
+                )
+                for batch in batches
+            ])
+            return [doc for rows in results for doc in rows]
+        except Exception as e:
+            logger.error(f"Error getting documents by IDs: {e}")
+            raise
+    
+    async def find_document_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Find an existing document whose file has the given SHA-256."""
+        try:
+            rows = await self._table(
+                "GET",
+                "documents",
+                params={
+                    "select": "id,file_url,content_text,content_minhash",
+                    "content_hash": f"eq.{content_hash}",
+                    "limit": 1
+                }
+            )
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Error finding document by hash: {e}")
+            raise
+    
     async def get_documents(
         self,
         category: Optional[str] = None,
         file_type: Optional[str] = None,
         search: Optional[str] = None,
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        columns: str = DOCUMENT_COLUMNS
     ) -> List[Dict[str, Any]]:
-        """Get documents with optional filters."""
+        """
+        Get documents with optional filters, newest first.
+        
+        Pass the cursor of the last document seen (see encode_cursor) to
+        get the next page by keyset on (created_at, id) instead of offset.
+        """
         try:
-            query = self.client.table("documents").select("*")
+            params = {"select": columns}
+            conditions = []
             
             # Apply filters
             if category:
-                query = query.eq("category", category)
+                params["category"] = f"eq.{category}"
             
             if file_type:
-                query = query.eq("file_type", file_type)
+                params["file_type"] = f"eq.{file_type}"
             
             if search:
-                # Search in title, author, and description
-                query = query.or_(
-                    f"title.ilike.%{search}%,"
-                    f"author.ilike.%{search}%,"
-                    f"description.ilike.%{search}%"
+                # Indexed full-text search over title, author, and description
+                terms = prefix_tsquery(search)
+                if not terms:
+                    return []
+                params["search_vector"] = f"fts(portuguese).{terms}"
+            
+            if cursor:
+                # Rows strictly after the cursor in (created_at, id) descending order
+                created_at, document_id = decode_cursor(cursor)
+                conditions.append(
+                    f'or(created_at.lt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.lt.{document_id}))'
                 )
             
-            # Order by created_at descending
-            query = query.order("created_at", desc=True)
+            if conditions:
+                params["and"] = f"({','.join(conditions)})"
+            
+            # Order by created_at descending, id breaks ties for a stable keyset
+            params["order"] = "created_at.desc,id.desc"
             
             # Pagination
-            query = query.range(offset, offset + limit - 1)
+            params["limit"] = limit
+            if not cursor:
+                params["offset"] = offset
             
-            result = query.execute()
-            return result.data
+            return await self._table("GET", "documents", params=params)
         except Exception as e:
             logger.error(f"Error getting documents: {e}")
             raise
     
+    async def iter_documents(
+        self,
+        batch_size: int = 1000,
+        category: Optional[str] = None,
+        file_type: Optional[str] = None,
+        columns: str = DOCUMENT_COLUMNS
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Walk every matching document, newest first, in keyset batches.
+        
+        The next batch is fetched while the caller consumes the current one.
+        Only two batches are in memory at a time, whatever the table size.
+        """
+        def fetch(cursor: Optional[str]) -> asyncio.Future:
+            return asyncio.ensure_future(self.get_documents(
+                category=category,
+                file_type=file_type,
+                limit=batch_size,
+                cursor=cursor,
+                columns=columns
+            ))
+        
+        pending = fetch(None)
+        try:
+            while True:
+                batch = await pending
+                if len(batch) == batch_size:
+                    pending = fetch(encode_cursor(batch[-1]))
+                if batch:
+                    yield batch
+                if len(batch) < batch_size:
+                    return
+        finally:
+            if not pending.done():
+                pending.cancel()
+    
+    async def get_changes(
+        self,
+        since: Optional[str] = None,
+        limit: int = 500,
+        columns: str = DOCUMENT_COLUMNS
+    ) -> Dict[str, Any]:
+        """
+        Get documents created or updated, and documents deleted, after a watermark.
+        
+        Both streams are read by keyset, oldest first, up to limit rows each.
+        Rows younger than changes_settle_seconds are left for the next call, since
+        transactions that started earlier may still commit with older timestamps.
+        updated_at and id are always selected, since the watermark is built from them.
+        """
+        try:
+            selected = columns.split(",")
+            select = ",".join(selected + [column for column in ("updated_at", "id") if column not in selected])
+            documents_mark, deletions_mark = decode_watermark(since) if since else (None, None)
+            settled = (datetime.now(timezone.utc) - timedelta(seconds=settings.changes_settle_seconds)).isoformat()
+            
+            def after(column: str, mark: Optional[List[Any]]) -> str:
+                conditions = [f'{column}.lt."{settled}"']
+                if mark:
+                    value, key = mark
+                    conditions.append(f'or({column}.gt."{value}",and({column}.eq."{value}",id.gt.{key}))')
+                return f"({','.join(conditions)})"
+            
+            documents, deletions = await asyncio.gather(
+                self._table("GET", "documents", params={
+                    "select": select,
+                    "and": after("updated_at", documents_mark),
+                    "order": "updated_at.asc,id.asc",
+                    "limit": limit
+                }),
+                self._table("GET", "document_deletions", params={
+                    "select": "id,document_id,deleted_at",
+                    "and": after("deleted_at", deletions_mark),
+                    "order": "deleted_at.asc,id.asc",
+                    "limit": limit
+                })
+            )
+            
+            if documents:
+                documents_mark = [documents[-1]["updated_at"], documents[-1]["id"]]
+            if deletions:
+                deletions_mark = [deletions[-1]["deleted_at"], deletions[-1]["id"]]
+            
+            return {
+                "documents": documents,
+                "deletions": [
+                    {"id": row["document_id"], "deleted_at": row["deleted_at"]}
+                    for row in deletions
+                ],
+                "watermark": encode_watermark(documents_mark, deletions_mark),
+                "has_more": len(documents) == limit or len(deletions) == limit
+            }
+        except Exception as e:
+            logger.error(f"Error getting document changes: {e}")
+            raise
+    
+    async def search_documents(
+        self,
+        search: str,
+        category: Optional[str] = None,
+        file_type: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+        columns: str = DOCUMENT_COLUMNS
+    ) -> List[Dict[str, Any]]:
+        """Full-text search ordered by relevance, with a trigram fallback for partial words."""
+        try:
+            return await self._rpc("search_documents", {
+                "search_query": search,
+                "filter_category": category,
+                "filter_file_type": file_type,
+                "result_limit": limit,
+                "result_offset": offset
+            }, columns=columns)
+        except Exception as e:
+            logger.error(f"Error searching documents: {e}")
+            raise
+    
     async def update_document(
         self,
         document_id: str,
@@ -103,6 +472,10 @@ class SupabaseService:
                 data["author"] = update_data.author
             if update_data.category is not None:
                 data["category"] = update_data.category.value
+                # A category set by a person is reviewed
+                data["category_source"] = (
+                    update_data.category_source if isinstance(update_data, AnalysisUpdate) else None
+                )
             if update_data.tags is not None:
                 data["tags"] = update_data.tags
             if update_data.description is not None:
@@ -113,127 +486,257 @@ class SupabaseService:
             
             data["updated_at"] = datetime.utcnow().isoformat()
             
-            result = self.client.table("documents").update(data).eq("id", document_id).execute()
-            return result.data[0] if result.data else None
+            rows = await self._table(
+                "PATCH",
+                "documents",
+                params={"select": DOCUMENT_COLUMNS, "id": f"eq.{document_id}"},
+                json=data,
+                prefer="return=representation"
+            )
+            if not rows:
+                return None
+            
+            self._notify_change("updated", rows[0])
+            return rows[0]
         except Exception as e:
             logger.error(f"Error updating document: {e}")
             raise
     
+    async def set_content_minhash(self, document_id: str, content_minhash: str):
+        """
+        Store the MinHash signature of a document's text.
+        
+        Derived data, not a metadata change: no listeners run, and the
+        documents trigger keeps updated_at, so the row stays out of the change feed.
+        """
+        try:
+            await self._table(
+                "PATCH",
+                "documents",
+                params={"id": f"eq.{document_id}"},
+                json={"content_minhash": content_minhash},
+                prefer="return=minimal"
+            )
+        except Exception as e:
+            logger.error(f"Error storing MinHash signature: {e}")
+            raise
+    
+    async def bulk_update_documents(
+        self,
+        updates: Dict[str, DocumentUpdate]
+    ) -> List[Dict[str, Any]]:
+        """Apply different metadata updates to many documents in one statement."""
+        try:
+            payload = []
+            for document_id, update_data in updates.items():
+                data = update_data.model_dump(mode="json", exclude_none=True)
+                if data:
+                    payload.append({"id": document_id, **data})
+            
+            if not payload:
+                return []
+            
+            rows = await self._rpc(
+                "bulk_update_documents",
+                {"updates": payload},
+                columns=DOCUMENT_COLUMNS
+            )
+            for row in rows:
+                self._notify_change("updated", row)
+            return rows
+        except Exception as e:
+            logger.error(f"Error bulk updating documents: {e}")
+            raise
+    
+    async def update_documents(
+        self,
+        update_data: DocumentUpdate,
+        document_ids: Optional[List[str]] = None,
+        category: Optional[str] = None,
+        file_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Apply one metadata update to every document matching the IDs and/or filters in one statement."""
+        try:
+            data = update_data.model_dump(mode="json", exclude_none=True)
+            if not data:
+                return []
+            
+            rows = await self._rpc(
+                "update_documents",
+                {
+                    "patch": data,
+                    "ids": document_ids,
+                    "filter_category": category,
+                    "filter_file_type": file_type
+                },
+                columns=DOCUMENT_COLUMNS
+            )
+            for row in rows:
+                self._notify_change("updated", row)
+            return rows
+        except Exception as e:
+            logger.error(f"Error bulk updating documents: {e}")
+            raise
+    
     async def delete_document(self, document_id: str) -> bool:
         """Delete a document."""
         try:
-            # Get document to find file path
-            doc = await self.get_document(document_id)
-            if not doc:
-                return False
+            rows = await self.delete_documents(document_ids=[document_id])
+            return bool(rows)
+        except Exception as e:
+            logger.error(f"Error deleting document: {e}")
+            raise
+    
+    async def delete_documents(
+        self,
+        document_ids: Optional[List[str]] = None,
+        category: Optional[str] = None,
+        file_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Delete every document matching the IDs and/or filters in one statement.
+        
+        Files no other document uses (deduplicated uploads share one) are then
+        removed from Storage in batches. Returns the deleted rows with
+        id, file_url and file_orphaned.
+        """
+        try:
+            rows = await self._rpc(
+                "delete_documents",
+                {
+                    "ids": document_ids,
+                    "filter_category": category,
+                    "filter_file_type": file_type
+                }
+            )
             
-            # Delete from storage if file exists
-            if doc.get("file_url"):
-                file_path = doc["file_url"].split("/")[-1]
+            paths = sorted({
+                row["file_url"].split("/")[-1]
+                for row in rows
+                if row.get("file_orphaned") and row.get("file_url")
+            })
+            if paths:
                 try:
-                    self.client.storage.from_(self.storage_bucket).remove([file_path])
+                    await self.remove_files(paths)
                 except Exception as e:
-                    logger.warning(f"Error deleting file from storage: {e}")
+                    logger.warning(f"Error deleting files from storage: {e}")
             
-            # Delete from database
-            self.client.table("documents").delete().eq("id", document_id).execute()
-            return True
+            for row in rows:
+                self._notify_change("deleted", row)
+            return rows
         except Exception as e:
-            logger.error(f"Error deleting document: {e}")
+            logger.error(f"Error bulk deleting documents: {e}")
             raise
     
-    async def upload_file(self, file_path: str, file_data: bytes, content_type: str) -> str:
-        """Upload a file to Supabase Storage."""
+    async def create_analysis_job(self, document_id: str, max_attempts: int) -> Dict[str, Any]:
+        """Queue a background AI analysis job for a document."""
         try:
-            result = self.client.storage.from_(self.storage_bucket).upload(
-                file_path,
-                file_data,
-                {"content-type": content_type}
+            rows = await self._table(
+                "POST",
+                "analysis_jobs",
+                json={"document_id": document_id, "max_attempts": max_attempts},
+                prefer="return=representation"
+            )
+            return rows[0]
+        except Exception as e:
+            logger.error(f"Error creating analysis job: {e}")
+            raise
+    
+    async def get_analysis_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get an analysis job by ID."""
+        try:
+            rows = await self._table(
+                "GET",
+                "analysis_jobs",
+                params={"select": "*", "id": f"eq.{job_id}"}
+            )
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Error getting analysis job: {e}")
+            raise
+    
+    async def claim_analysis_jobs(self, batch_size: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """Atomically claim due jobs so no other worker processes them."""
+        return await self._rpc(
+            "claim_analysis_jobs",
+            {"batch_size": batch_size, "lease_seconds": lease_seconds}
+        )
+    
+    async def update_analysis_job(self, job_id: str, data: Dict[str, Any]):
+        """Update an analysis job's state."""
+        await self._table("PATCH", "analysis_jobs", params={"id": f"eq.{job_id}"}, json=data)
+    
+    async def upload_file(
+        self,
+        file_path: str,
+        file_data: Union[bytes, AsyncIterator[bytes]],
+        content_type: str,
+        content_length: Optional[int] = None
+    ) -> str:
+        """
+        Upload a file to Supabase Storage.
+        
+        file_data may be an async iterator of chunks, which is streamed to
+        Storage without buffering the whole file. Without content_length the
+        stream is sent with chunked transfer encoding.
+        """
+        try:
+            headers = {"Content-Type": content_type}
+            if content_length is not None:
+                headers["Content-Length"] = str(content_length)
+            
+            # Paths are content-addressed, so overwriting an existing object is harmless
+            headers["x-upsert"] = "true"
+            
+            await self._request(
+                "POST",
+                f"/storage/v1/object/{self.storage_bucket}/{file_path}",
+                content=file_data,
+                headers=headers
             )
             
             # Get public URL
-            public_url = self.client.storage.from_(self.storage_bucket).get_public_url(file_path)
-            return public_url
+            return self.get_public_url(file_path)
         except Exception as e:
             logger.error(f"Error uploading file: {e}")
             raise
     
+    async def remove_files(self, file_paths: List[str]):
+        """Remove files from Supabase Storage, one call per STORAGE_REMOVE_BATCH_SIZE paths."""
+        await asyncio.gather(*(
+            self._request(
+                "DELETE",
+                f"/storage/v1/object/{self.storage_bucket}",
+                json={"prefixes": file_paths[i:i + self.STORAGE_REMOVE_BATCH_SIZE]}
+            )
+            for i in range(0, len(file_paths), self.STORAGE_REMOVE_BATCH_SIZE)
+        ))
+    
+    def get_public_url(self, file_path: str) -> str:
+        """Build the public URL of a file in the storage bucket."""
+        return f"{self.base_url}/storage/v1/object/public/{self.storage_bucket}/{file_path}"
+    
     async def get_analytics(self) -> Dict[str, Any]:
-        """Get analytics data."""
-        try:
-            # Get all documents
-            all_docs = self.client.table("documents").select("*").execute()
-            docs = all_docs.data
-            
-            if not docs:
-                return {
-                    "total_documents": 0,
-                    "total_size": 0,
-                    "categories": [],
-                    "top_tags": [],
-                    "timeline": [],
-                    "documents_by_type": {}
-                }
-            
-            # Calculate statistics
-            total_size = sum(doc.get("file_size", 0) for doc in docs)
-            
-            # Category distribution
-            category_counts = {}
-            for doc in docs:
-                cat = doc.get("category", "Geral")
-                category_counts[cat] = category_counts.get(cat, 0) + 1
-            
-            categories = [
-                {
-                    "category": cat,
-                    "count": count,
-                    "percentage": round((count / len(docs)) * 100, 2)
-                }
-                for cat, count in category_counts.items()
-            ]
-            
-            # Tag statistics
-            tag_counts = {}
-            for doc in docs:
-                for tag in doc.get("tags", []):
-                    tag_counts[tag] = tag_counts.get(tag, 0) + 1
-            
-            top_tags = [
-                {"tag": tag, "count": count}
-                for tag, count in sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-            ]
-            
-            # File type distribution
-            type_counts = {}
-            for doc in docs:
-                file_type = doc.get("file_type", "unknown")
-                type_counts[file_type] = type_counts.get(file_type, 0) + 1
-            
-            # Timeline (last 30 days)
-            timeline_counts = {}
-            for doc in docs:
-                created = doc.get("created_at", "")
-                if created:
-                    date = created.split("T")[0]
-                    timeline_counts[date] = timeline_counts.get(date, 0) + 1
-            
-            timeline = [
-                {"date": date, "count": count}
-                for date, count in sorted(timeline_counts.items())
-            ]
-            
-            return {
-                "total_documents": len(docs),
-                "total_size": total_size,
-                "categories": categories,
-                "top_tags": top_tags,
-                "timeline": timeline,
-                "documents_by_type": type_counts
-            }
+        """Get analytics data from the incrementally maintained rollups."""
+        try:
+            return await self._rpc("get_document_analytics", {"top_tags_limit": 10})
         except Exception as e:
             logger.error(f"Error getting analytics: {e}")
             raise
+    
+    async def reconcile_analytics(self, repair: bool = True) -> Dict[str, Any]:
+        """Check the analytics rollups against the documents table for drift."""
+        try:
+            result = await self._rpc("reconcile_document_rollups", {"repair": repair})
+            if result["drifted_buckets"]:
+                logger.warning(
+                    f"Analytics rollups drifted in {result['drifted_buckets']} buckets "
+                    f"(repaired: {result['repaired']}): {result['drift'][:5]}"
+                )
+            return result
+        except Exception as e:
+            logger.error(f"Error reconciling analytics: {e}")
+            raise
 
 
 # Global service instance
@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import logging
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from scipy import sparse
+from config import settings
+from services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+# Columns the recommender learns from
+TAG_COLUMNS = "id,title,description,tags"
+
+# Hashed word features: a fixed vocabulary, so documents never force a rebuild
+N_FEATURES = 2 ** 18
+
+# Documents per change feed read while building the model
+SYNC_BATCH_SIZE = 1000
+
+
+def _features(title: Optional[str], description: Optional[str]) -> Dict[int, int]:
+    """Hashed word counts of a title and description (digits-only words skipped)."""
+    counts: Dict[int, int] = {}
+    for word in re.findall(r"[^\W_]{2,}", f"{title or ''} {description or ''}".lower()):
+        if word.isdigit():
+            continue
+        feature = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big") % N_FEATURES
+        counts[feature] = counts.get(feature, 0) + 1
+    return counts
+
+
+def _weighted_row_sum(matrix: sparse.csr_matrix, rows: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Sum of weights[i] * matrix[rows[i]], read straight from the CSR arrays (no scipy indexing overhead)."""
+    segments = [np.arange(matrix.indptr[row], matrix.indptr[row + 1]) for row in rows]
+    positions = np.concatenate(segments) if segments else np.zeros(0, dtype=np.int64)
+    row_weights = np.repeat(weights, [len(segment) for segment in segments])
+    return np.bincount(
+        matrix.indices[positions],
+        weights=matrix.data[positions] * row_weights,
+        minlength=matrix.shape[1]
+    ).astype(np.float32)
+
+
+def _normalize_tags(tags: Optional[List[str]]) -> List[str]:
+    """Distinct non-empty tags, in order."""
+    return list(dict.fromkeys(tag.strip() for tag in tags or [] if tag and tag.strip()))
+
+
+class TagService:
+    """
+    Suggests tags from the tags already used in the archive.
+    
+    Two sparse count matrices are learned from tagged documents: word x tag
+    (how many documents containing a word carry a tag) and tag x tag
+    co-occurrence. A tag's score for a title and description is the TF-IDF
+    weighted average of P(tag | word) over their words, averaged with
+    P(tag | existing tag) when tags are already set. Scores are between 0 and 1.
+    
+    Writes are queued as count deltas and folded into the matrices by the sync
+    loop, so suggestions never wait on a rebuild. GPT is only asked when no
+    local tag scores at least tag_suggestion_min_confidence.
+    """
+    
+    def __init__(self):
+        """Initialize an empty model (it is built by start())."""
+        self._tag_index: Dict[str, int] = {}
+        self._tags: List[str] = []
+        self._docs: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._documents = 0
+        self._df = np.zeros(N_FEATURES, dtype=np.int64)
+        self._tag_counts = np.zeros(0, dtype=np.int64)
+        self._word_tag = sparse.csr_matrix((N_FEATURES, 0), dtype=np.int64)
+        self._cooccurrence = sparse.csr_matrix((0, 0), dtype=np.int64)
+        # What queries read, swapped as a whole: P(tag | word), P(tag | tag) and word IDF
+        self._model: Tuple[sparse.csr_matrix, sparse.csr_matrix, np.ndarray] = (
+            sparse.csr_matrix((N_FEATURES, 0), dtype=np.float32),
+            sparse.csr_matrix((0, 0), dtype=np.float32),
+            np.zeros(N_FEATURES, dtype=np.float32)
+        )
+        self._deltas: List[Tuple[np.ndarray, np.ndarray, int]] = []
+        self._pending: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.watermark: Optional[str] = None
+    
+    def start(self):
+        """Start building the model and keeping it in sync."""
+        self._task = asyncio.create_task(self._sync_loop())
+    
+    async def stop(self):
+        """Stop syncing."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+    
+    def suggest(
+        self,
+        title: str,
+        description: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        limit: int = 5
+    ) -> List[Tuple[str, float]]:
+        """Suggest tags from the local model, as (tag, score), best first."""
+        p_word, p_tag, idf = self._model
+        if not p_word.shape[1]:
+            return []
+        
+        scores = np.zeros(p_word.shape[1], dtype=np.float32)
+        counts = _features(title, description)
+        features = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        if len(features):
+            weights = (1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * idf[features]
+            if weights.sum() > 0:
+                scores = _weighted_row_sum(p_word, features, weights / weights.sum())
+        
+        given = [
+            self._tag_index[tag] for tag in _normalize_tags(tags)
+            if self._tag_index.get(tag, len(scores)) < len(scores)
+        ]
+        if given:
+            given_scores = _weighted_row_sum(p_tag, np.array(given), np.full(len(given), 1 / len(given)))
+            scores = (scores + given_scores) / 2
+            scores[given] = 0
+        
+        top = np.argsort(-scores)[:limit]
+        return [
+            (self._tags[i], float(scores[i]))
+            for i in top
+            if scores[i] >= settings.tag_suggestion_min_score
+        ]
+    
+    async def suggest_tags(
+        self,
+        title: str,
+        description: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        limit: int = 5
+    ) -> Tuple[List[str], float, str]:
+        """Suggest tags as (tags, local confidence, source), asking GPT only when the local model is unsure."""
+        from services.openai_service import openai_service
+        
+        suggestions = self.suggest(title, description, tags, limit)
+        confidence = suggestions[0][1] if suggestions else 0.0
+        if confidence >= settings.tag_suggestion_min_confidence:
+            return [tag for tag, _ in suggestions], confidence, "local"
+        
+        suggested = await openai_service.suggest_tags(title, description)
+        existing = set(_normalize_tags(tags))
+        return [tag for tag in _normalize_tags(suggested) if tag not in existing][:limit], confidence, "ai"
+    
+    def _learn(self, document_id: str, doc: Optional[Dict[str, Any]]):
+        """Replace what was learned from a document (None forgets it)."""
+        previous = self._docs.pop(document_id, None)
+        if previous is not None:
+            self._deltas.append((*previous, -1))
+        
+        tags = _normalize_tags(doc.get("tags")) if doc else []
+        if not tags:
+            return
+        
+        for tag in tags:
+            if tag not in self._tag_index:
+                self._tag_index[tag] = len(self._tags)
+                self._tags.append(tag)
+        features = np.fromiter(_features(doc.get("title"), doc.get("description")), dtype=np.int64)
+        tag_ids = np.array([self._tag_index[tag] for tag in tags], dtype=np.int64)
+        self._docs[document_id] = (features, tag_ids)
+        self._deltas.append((features, tag_ids, 1))
+    
+    def refresh(self):
+        """
+        Fold the queued deltas into the count matrices and renormalize them.
+        
+        Runs in a worker thread; queries keep reading the previous model until it is swapped.
+        """
+        if not self._deltas:
+            return
+        
+        deltas, self._deltas = self._deltas, []
+        n_tags = len(self._tags)
+        rows, columns, values = [], [], []
+        pair_rows, pair_columns, pair_values = [], [], []
+        for features, tag_ids, sign in deltas:
+            self._documents += sign
+            self._df[features] += sign
+            rows.append(np.repeat(features, len(tag_ids)))
+            columns.append(np.tile(tag_ids, len(features)))
+            values.append(np.full(len(features) * len(tag_ids), sign, dtype=np.int64))
+            pair_rows.append(np.repeat(tag_ids, len(tag_ids)))
+            pair_columns.append(np.tile(tag_ids, len(tag_ids)))
+            pair_values.append(np.full(len(tag_ids) ** 2, sign, dtype=np.int64))
+        
+        self._word_tag.resize((N_FEATURES, n_tags))
+        self._word_tag = (self._word_tag + sparse.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+            shape=(N_FEATURES, n_tags)
+        )).tocsr()
+        self._word_tag.eliminate_zeros()
+        
+        # The diagonal of the co-occurrence matrix counts the documents carrying each tag
+        self._cooccurrence.resize((n_tags, n_tags))
+        self._cooccurrence = (self._cooccurrence + sparse.csr_matrix(
+            (np.concatenate(pair_values), (np.concatenate(pair_rows), np.concatenate(pair_columns))),
+            shape=(n_tags, n_tags)
+        )).tocsr()
+        self._cooccurrence.eliminate_zeros()
+        self._tag_counts = self._cooccurrence.diagonal()
+        
+        with np.errstate(divide="ignore"):
+            inverse_df = np.where(self._df > 0, 1.0 / self._df, 0.0)
+            inverse_counts = np.where(self._tag_counts > 0, 1.0 / self._tag_counts, 0.0)
+        self._model = (
+            sparse.diags(inverse_df.astype(np.float32)).dot(self._word_tag).astype(np.float32).tocsr(),
+            sparse.diags(inverse_counts.astype(np.float32)).dot(self._cooccurrence).astype(np.float32).tocsr(),
+            np.where(self._df > 0, np.log((1 + self._documents) / (1 + self._df)) + 1, 0).astype(np.float32)
+        )
+        logger.info(f"Tag model refreshed: {self._documents} tagged documents, {len(self._tags)} tags")
+    
+    def on_document_change(self, event: str, document: Dict[str, Any]):
+        """Queue a document written by this process for learning."""
+        if event == "deleted":
+            self._learn(document["id"], None)
+        elif "tags" in document:
+            self._learn(document["id"], document)
+        else:
+            self._pending.add(document["id"])
+        self._wakeup.set()
+    
+    async def _sync_loop(self):
+        """Fold local writes in right away and catch up with other processes' writes periodically."""
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Tag model sync failed: {e}")
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.tag_sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    async def sync(self):
+        """Bring the model up to date: pending documents, then the change feed."""
+        pending, self._pending = self._pending, set()
+        if pending:
+            for doc in await supabase_service.get_documents_by_ids(list(pending), columns=TAG_COLUMNS):
+                self._learn(doc["id"], doc)
+        
+        while True:
+            changes = await supabase_service.get_changes(
+                since=self.watermark,
+                limit=SYNC_BATCH_SIZE,
+                columns=TAG_COLUMNS
+            )
+            for deletion in changes["deletions"]:
+                self._learn(deletion["id"], None)
+            for doc in changes["documents"]:
+                self._learn(doc["id"], doc)
+            self.watermark = changes["watermark"]
+            if not changes["has_more"]:
+                break
+        
+        await asyncio.to_thread(self.refresh)
+
+
+# Global service instance, kept in sync with this process's writes
+tag_service = TagService()
+supabase_service.on_change(tag_service.on_document_change)
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single development process owns the index
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    Cosine similarity index over float32 vectors stored in a memory-mapped file.
+    
+    Vectors are L2-normalized on insert, so scoring is a single matrix-vector
+    product. Above exact_threshold vectors, searches only score the candidates
+    found by random-hyperplane LSH (several tables of bit signatures, probing
+    each signature and its one-bit neighbours). Every change updates the
+    buckets in place.
+    
+    Only one process may own an index directory. Processes that cannot take
+    the directory lock build a private index in a temporary directory, which
+    is never shared and is removed by close().
+    """
+    
+    INITIAL_CAPACITY = 1024
+    
+    def __init__(
+        self,
+        directory: str,
+        dimension: int,
+        name: str,
+        exact_threshold: int = 20000,
+        lsh_tables: int = 8,
+        lsh_bits: int = 12,
+        seed: int = 0
+    ):
+        """Open the index in directory, starting empty if it was built for another provider."""
+        self.dimension = dimension
+        self.name = name
+        self.exact_threshold = exact_threshold
+        self.watermark: Optional[str] = None
+        
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, "index.lock"), "a")
+        self.persistent = self._try_lock()
+        if not self.persistent:
+            logger.info(f"Embedding index {directory} is owned by another process, using a private copy")
+            directory = tempfile.mkdtemp(prefix="embeddings-")
+        self.directory = directory
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._meta_path = os.path.join(directory, "meta.json")
+        
+        # Fixed random hyperplanes: the same seed always yields the same buckets
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((lsh_tables * lsh_bits, dimension)).astype(np.float32)
+        self._lsh_tables = lsh_tables
+        self._lsh_bits = lsh_bits
+        self._bit_values = (1 << np.arange(lsh_bits)).astype(np.int64)
+        self._buckets: Optional[List[Dict[int, Set[int]]]] = None
+        
+        self._ids: List[Optional[str]] = []
+        self._hashes: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        # Serializes writes of the saved files (a background save may still be running at close())
+        self._save_lock = threading.Lock()
+        self._load()
+    
+    def _try_lock(self) -> bool:
+        """Take the directory lock without waiting."""
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+    
+    def _load(self):
+        """Load the saved index, or create an empty one."""
+        meta = None
+        if os.path.exists(self._meta_path) and os.path.exists(self._vectors_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if meta.get("dimension") != self.dimension or meta.get("name") != self.name:
+                logger.info(f"Embedding index was built by {meta.get('name')}, rebuilding for {self.name}")
+                meta = None
+        
+        if meta is None:
+            self._open_vectors(self.INITIAL_CAPACITY, create=True)
+            return
+        
+        self._ids = meta["ids"]
+        self._hashes = meta["hashes"]
+        self.watermark = meta.get("watermark")
+        self._rows = {document_id: row for row, document_id in enumerate(self._ids) if document_id}
+        self._free = [row for row, document_id in enumerate(self._ids) if not document_id]
+        capacity = os.path.getsize(self._vectors_path) // (4 * self.dimension)
+        self._open_vectors(max(capacity, len(self._ids), self.INITIAL_CAPACITY))
+        logger.info(f"Loaded {len(self._rows)} embeddings from {self.directory}")
+    
+    def _open_vectors(self, capacity: int, create: bool = False):
+        """Map the vectors file, growing it to capacity rows."""
+        with open(self._vectors_path, "wb" if create else "r+b") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self._vectors = np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, self.dimension)
+        )
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._rows
+    
+    def text_hash(self, document_id: str) -> Optional[str]:
+        """Hash of the text the stored vector was computed from."""
+        row = self._rows.get(document_id)
+        return self._hashes[row] if row is not None else None
+    
+    def get(self, document_id: str) -> Optional[np.ndarray]:
+        """Get the stored vector of a document."""
+        row = self._rows.get(document_id)
+        return np.array(self._vectors[row]) if row is not None else None
+    
+    def upsert(self, document_id: str, vector: np.ndarray, text_hash: str):
+        """Store or replace the vector of a document."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        
+        row = self._rows.get(document_id)
+        if row is not None:
+            self._unbucket(row)
+        elif self._free:
+            row = self._free.pop()
+        else:
+            row = len(self._ids)
+            self._ids.append(None)
+            self._hashes.append(None)
+            if row >= self._vectors.shape[0]:
+                self._vectors.flush()
+                self._open_vectors(self._vectors.shape[0] * 2)
+        
+        self._vectors[row] = vector
+        self._ids[row] = document_id
+        self._hashes[row] = text_hash
+        self._rows[document_id] = row
+        self._bucket(row)
+    
+    def remove(self, document_id: str):
+        """Remove the vector of a document, if stored."""
+        row = self._rows.pop(document_id, None)
+        if row is None:
+            return
+        self._unbucket(row)
+        self._vectors[row] = 0
+        self._ids[row] = None
+        self._hashes[row] = None
+        self._free.append(row)
+    
+    def search(
+        self,
+        vector: np.ndarray,
+        limit: int,
+        exclude: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Find the documents most similar to vector, as (id, cosine score), best first."""
+        if not self._rows:
+            return []
+        
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        
+        rows = self._candidates(query, limit + 1)
+        if rows is None:
+            # Exact: one product over the contiguous matrix, free rows masked out
+            rows = np.arange(len(self._ids))
+            scores = self._vectors[:len(self._ids)] @ query
+            if self._free:
+                scores[self._free] = -np.inf
+        else:
+            scores = self._vectors[rows] @ query
+        
+        k = min(limit + 1, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        results = [
+            (self._ids[rows[i]], float(scores[i]))
+            for i in top
+            if self._ids[rows[i]] not in (None, exclude)
+        ]
+        return results[:limit]
+    
+    def _signatures(self, vectors: np.ndarray) -> np.ndarray:
+        """LSH bucket key of each vector in each table, shape (n, tables)."""
+        bits = (vectors @ self._planes.T > 0).reshape(len(vectors), self._lsh_tables, self._lsh_bits)
+        return bits.astype(np.int64) @ self._bit_values
+    
+    def _candidates(self, query: np.ndarray, needed: int) -> Optional[np.ndarray]:
+        """Rows sharing an LSH bucket with query, or None to scan every row."""
+        if len(self._rows) <= self.exact_threshold:
+            return None
+        if self._buckets is None:
+            self._build_buckets()
+        
+        candidates: Set[int] = set()
+        keys = self._signatures(query[np.newaxis])[0]
+        for table, key in enumerate(keys):
+            buckets = self._buckets[table]
+            candidates |= buckets.get(int(key), set())
+            for bit in self._bit_values:
+                candidates |= buckets.get(int(key ^ bit), set())
+        
+        if len(candidates) < needed:
+            return None
+        return np.fromiter(candidates, dtype=np.int64)
+    
+    def _build_buckets(self):
+        """Hash every stored vector into the LSH tables."""
+        self._buckets = [{} for _ in range(self._lsh_tables)]
+        rows = np.fromiter(self._rows.values(), dtype=np.int64)
+        for start in range(0, len(rows), 10000):
+            batch = rows[start:start + 10000]
+            for row, keys in zip(batch, self._signatures(self._vectors[batch])):
+                for table, key in enumerate(keys):
+                    self._buckets[table].setdefault(int(key), set()).add(int(row))
+        logger.info(f"Built LSH buckets for {len(rows)} embeddings")
+    
+    def _bucket(self, row: int):
+        """Add a row to its LSH buckets, once they exist."""
+        if self._buckets is None:
+            return
+        for table, key in enumerate(self._signatures(self._vectors[row:row + 1])[0]):
+            self._buckets[table].setdefault(int(key), set()).add(row)
+    
+    def _unbucket(self, row: int):
+        """Remove a row from its LSH buckets, once they exist."""
+        if self._buckets is None:
+            return
+        for table, key in enumerate(self._signatures(self._vectors[row:row + 1])[0]):
+            bucket = self._buckets[table].get(int(key))
+            if bucket is not None:
+                bucket.discard(row)
+                if not bucket:
+                    del self._buckets[table][int(key)]
+    
+    def _snapshot(self) -> Dict[str, Any]:
+        """Metadata to save, copied so the index can keep changing while it is written."""
+        return {
+            "name": self.name,
+            "dimension": self.dimension,
+            "watermark": self.watermark,
+            "ids": list(self._ids),
+            "hashes": list(self._hashes)
+        }
+    
+    def _write(self, vectors: np.memmap, meta: Dict[str, Any]):
+        """Flush the vectors and write the metadata atomically."""
+        with self._save_lock:
+            vectors.flush()
+            temp_path = f"{self._meta_path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(temp_path, self._meta_path)
+    
+    def save(self):
+        """Flush the vectors and write the metadata atomically."""
+        self._write(self._vectors, self._snapshot())
+    
+    async def save_async(self):
+        """save() in a worker thread: the metadata JSON grows with every document indexed."""
+        await asyncio.to_thread(self._write, self._vectors, self._snapshot())
+    
+    def close(self):
+        """Save the index and release the directory."""
+        self.save()
+        del self._vectors
+        self._lock_file.close()
+        if not self.persistent:
+            shutil.rmtree(self.directory, ignore_errors=True)
@@ -46,8 +46,13 @@ if all_ok:
     
     # Testar Supabase
     try:
-        from supabase import create_client
-        supabase = create_client(configs["SUPABASE_URL"], configs["SUPABASE_KEY"])
+        import httpx
+        response = httpx.get(
+            f"{configs['SUPABASE_URL'].rstrip('/')}/rest/v1/",
+            headers={"apikey": configs["SUPABASE_KEY"], "Authorization": f"Bearer {configs['SUPABASE_KEY']}"},
+            timeout=10
+        )
+        response.raise_for_status()
         print("✅ Conexão com Supabase: OK")
     except Exception as e:
         print(f"❌ Erro ao conectar com Supabase: {str(e)[:100]}")
@@ -0,0 +1,59 @@
+import os
+import tempfile
+from typing import Callable, List, Tuple
+import httpx
+import pytest
+
+# Settings are read at import time, so point them at test values and a
+# throwaway data directory before any application module is imported
+DATA_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.update(
+    SUPABASE_URL="https://test.supabase.co",
+    SUPABASE_KEY="test-key",
+    OPENAI_API_KEY="sk-test",
+    ANALYSIS_CACHE_PATH=os.path.join(DATA_DIR, "analysis_cache.sqlite3"),
+    EMBEDDING_INDEX_DIR=os.path.join(DATA_DIR, "embeddings"),
+    CATEGORY_CLASSIFIER_PATH=os.path.join(DATA_DIR, "category_model.npz"),
+)
+
+from services.supabase_service import supabase_service  # noqa: E402
+
+
+class MockSupabase:
+    """Answers the PostgREST and Storage calls of supabase_service with handlers."""
+    
+    def __init__(self):
+        self.requests: List[httpx.Request] = []
+        self._handlers: List[Tuple[str, str, Callable[[httpx.Request], httpx.Response]]] = []
+    
+    def route(self, method: str, path: str, handler: Callable[[httpx.Request], httpx.Response]):
+        """Answer method requests to path (e.g. "/rest/v1/documents") with handler(request)."""
+        self._handlers.append((method, path, handler))
+    
+    @staticmethod
+    def select(request: httpx.Request, rows: List[dict]) -> List[dict]:
+        """Project rows onto the columns the request selects, as PostgREST does."""
+        columns = request.url.params["select"].split(",")
+        return [{column: row.get(column) for column in columns} for row in rows]
+    
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        for method, path, handler in reversed(self._handlers):
+            if request.method == method and request.url.path == path:
+                return handler(request)
+        return httpx.Response(404, json={"message": f"No mock for {request.method} {request.url.path}"})
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def supabase():
+    """Route supabase_service through a MockSupabase for the test."""
+    mock = MockSupabase()
+    http = supabase_service.http
+    supabase_service.http = httpx.AsyncClient(base_url=supabase_service.base_url, transport=httpx.MockTransport(mock))
+    yield mock
+    supabase_service.http = http
@@ -0,0 +1,230 @@
+import json
+import os
+import httpx
+import pytest
+from config import settings
+from metrics import classifier_collector
+from models import AnalysisUpdate, CategoryEnum, DocumentUpdate
+from services.category_classifier import CategoryClassifier
+from services.supabase_service import decode_watermark, supabase_service
+
+pytestmark = pytest.mark.anyio
+
+TEXTS = {
+    "fin": ("invoice.pdf", "Supplier invoice payment budget finance quarter revenue"),
+    "hr": ("vacation.pdf", "Employee vacation leave onboarding policy benefits"),
+    "tech": ("server.pdf", "Server deployment database kubernetes cluster api"),
+}
+
+
+def _document(document_id: str, category: CategoryEnum, **fields) -> dict:
+    return {"id": document_id, "category": category.value, "tags": ["x"], "description": None, **fields}
+
+
+def _serve_texts(supabase, texts: dict):
+    """Answer get_documents_by_ids with file names and texts keyed by ID."""
+    def get(request: httpx.Request) -> httpx.Response:
+        ids = request.url.params["id"][len("in.("):-1].split(",")
+        return httpx.Response(200, json=[
+            {"id": i, "file_name": texts[i][0], "file_type": "pdf", "content_text": texts[i][1]}
+            for i in ids
+        ])
+    
+    supabase.route("GET", "/rest/v1/documents", get)
+
+
+@pytest.fixture
+def classifier(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "category_classifier_min_documents", 3)
+    monkeypatch.setattr(settings, "category_classifier_path", str(tmp_path / "category_model.npz"))
+    return CategoryClassifier()
+
+
+async def _train(classifier, supabase, docs):
+    texts = {}
+    for doc in docs:
+        key = doc["id"].rstrip("0123456789")
+        texts[doc["id"]] = TEXTS[key]
+    _serve_texts(supabase, texts)
+    return await classifier._learn(docs)
+
+
+async def test_predicts_nothing_until_the_model_is_large_enough(classifier, supabase):
+    await _train(classifier, supabase, [_document("fin1", CategoryEnum.FINANCEIRO)])
+    
+    assert classifier.predict("invoice.pdf", "pdf", "supplier invoice") == (None, 0.0)
+
+
+async def test_predicts_the_category_of_similar_documents(classifier, supabase):
+    trained = await _train(classifier, supabase, [
+        _document("fin1", CategoryEnum.FINANCEIRO),
+        _document("hr1", CategoryEnum.RH),
+        _document("tech1", CategoryEnum.TECNICO),
+    ])
+    
+    category, probability = classifier.predict("payment.pdf", "pdf", "invoice payment revenue budget")
+    
+    assert trained == 3
+    assert category == CategoryEnum.FINANCEIRO
+    assert probability > 0.5
+
+
+async def test_uncurated_uploads_and_self_applied_categories_are_not_examples(classifier, supabase):
+    trained = await _train(classifier, supabase, [
+        {"id": "fin1", "category": CategoryEnum.GERAL.value, "tags": [], "description": None},
+        _document("hr1", CategoryEnum.RH, category_source="classifier"),
+        _document("tech1", CategoryEnum.TECNICO),
+    ])
+    
+    assert trained == 1
+    assert classifier._documents.sum() == 1
+    assert set(classifier._labels) == {"tech1"}
+
+
+async def test_self_applied_category_removes_the_earlier_label(classifier, supabase):
+    await _train(classifier, supabase, [_document("fin1", CategoryEnum.FINANCEIRO)])
+    
+    await _train(classifier, supabase, [_document("fin1", CategoryEnum.RH, category_source="classifier")])
+    
+    assert classifier._documents.sum() == 0
+    assert classifier._totals.sum() == 0
+    assert "fin1" not in classifier._labels
+
+
+async def test_relabeling_moves_the_counts(classifier, supabase):
+    await _train(classifier, supabase, [_document("fin1", CategoryEnum.FINANCEIRO)])
+    counts = classifier._counts.sum()
+    
+    await _train(classifier, supabase, [_document("fin1", CategoryEnum.LEGAL)])
+    
+    documents = dict(zip(CategoryEnum, classifier._documents.tolist()))
+    assert documents[CategoryEnum.FINANCEIRO] == 0
+    assert documents[CategoryEnum.LEGAL] == 1
+    assert classifier._counts.sum() == counts
+    assert classifier._counts.min() == 0
+
+
+async def test_unchanged_labels_read_no_text(classifier, supabase):
+    await _train(classifier, supabase, [_document("fin1", CategoryEnum.FINANCEIRO)])
+    requests = len(supabase.requests)
+    
+    assert await classifier._learn([_document("fin1", CategoryEnum.FINANCEIRO)]) == 0
+    assert len(supabase.requests) == requests
+
+
+async def test_classify_counts_hits_and_exports_them(classifier, supabase, monkeypatch):
+    await _train(classifier, supabase, [
+        _document("fin1", CategoryEnum.FINANCEIRO),
+        _document("hr1", CategoryEnum.RH),
+        _document("tech1", CategoryEnum.TECNICO),
+    ])
+    monkeypatch.setattr(settings, "category_classifier_min_confidence", 0.5)
+    monkeypatch.setattr(classifier_collector, "_classifier", classifier)
+    
+    confident, guess = classifier.classify("payment.pdf", "pdf", "invoice payment revenue budget")
+    unsure, _ = classifier.classify("notes.txt", "txt", "meeting")
+    classifier.record_agreement(CategoryEnum.RH, CategoryEnum.RH)
+    
+    assert confident == guess == CategoryEnum.FINANCEIRO
+    assert unsure is None
+    metrics = {
+        metric.name: metric.samples[0].value
+        for metric in classifier_collector.collect()
+    }
+    assert metrics["category_classifier_predictions"] == 2
+    assert metrics["category_classifier_hits"] == 1
+    assert metrics["category_classifier_hit_ratio"] == 0.5
+    assert metrics["category_classifier_agreement_ratio"] == 1.0
+
+
+async def test_saved_model_is_loaded_with_its_watermark(classifier, supabase):
+    await _train(classifier, supabase, [
+        _document("fin1", CategoryEnum.FINANCEIRO),
+        _document("hr1", CategoryEnum.RH),
+    ])
+    classifier.watermark = "2025-01-01T00:00:00+00:00"
+    classifier._write(classifier._snapshot())
+    
+    loaded = CategoryClassifier()
+    loaded._load()
+    
+    directory = os.path.dirname(settings.category_classifier_path)
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+    assert loaded.watermark == classifier.watermark
+    assert loaded._labels == classifier._labels
+    assert (loaded._counts == classifier._counts).all()
+
+
+def _serve_feed(supabase, rows):
+    """Answer the change feed and text reads from rows, honoring the selected columns."""
+    def get(request: httpx.Request) -> httpx.Response:
+        ids = request.url.params.get("id")
+        selected = [row for row in rows if not ids or row["id"] in ids[len("in.("):-1].split(",")]
+        return httpx.Response(200, json=supabase.select(request, selected))
+    
+    supabase.route("GET", "/rest/v1/documents", get)
+    supabase.route("GET", "/rest/v1/document_deletions", lambda request: httpx.Response(200, json=[]))
+
+
+def _feed_rows():
+    return [
+        {
+            **_document(document_id, category),
+            "file_name": TEXTS[document_id[:-1]][0],
+            "file_type": "pdf",
+            "content_text": TEXTS[document_id[:-1]][1],
+            "updated_at": f"2025-01-0{day}T00:00:00+00:00"
+        }
+        for day, (document_id, category) in enumerate(
+            [("fin1", CategoryEnum.FINANCEIRO), ("hr1", CategoryEnum.RH), ("tech1", CategoryEnum.TECNICO)],
+            start=1
+        )
+    ]
+
+
+async def test_sync_trains_on_stored_documents(classifier, supabase):
+    _serve_feed(supabase, _feed_rows())
+    
+    await classifier.sync()
+    
+    assert classifier._documents.sum() == 3
+    assert decode_watermark(classifier.watermark)[0] == ["2025-01-03T00:00:00+00:00", "tech1"]
+    assert classifier.predict("payment.pdf", "pdf", "invoice payment revenue budget")[0] == CategoryEnum.FINANCEIRO
+
+
+async def test_sync_saves_at_most_once_per_interval(classifier, supabase, monkeypatch):
+    monkeypatch.setattr(settings, "category_classifier_sync_interval", 3600)
+    classifier._saved_at = float("inf")
+    rows = _feed_rows()
+    _serve_feed(supabase, rows[:1])
+    
+    await classifier.sync()
+    
+    assert not os.path.exists(settings.category_classifier_path)
+    
+    _serve_feed(supabase, rows)
+    classifier._saved_at = 0.0
+    await classifier.sync()
+    
+    loaded = CategoryClassifier()
+    loaded._load()
+    assert loaded.watermark == classifier.watermark
+    assert loaded._documents.sum() == 3
+
+
+async def test_update_document_records_the_category_source(supabase):
+    patches = []
+    
+    def patch(request: httpx.Request) -> httpx.Response:
+        patches.append(json.loads(request.content))
+        return httpx.Response(200, json=[{"id": "1"}])
+    
+    supabase.route("PATCH", "/rest/v1/documents", patch)
+    
+    await supabase_service.update_document("1", AnalysisUpdate(category=CategoryEnum.RH, category_source="classifier"))
+    await supabase_service.update_document("1", DocumentUpdate(category=CategoryEnum.RH))
+    await supabase_service.update_document("1", DocumentUpdate(title="Renamed"))
+    
+    assert patches[0]["category_source"] == "classifier"
+    assert patches[1]["category_source"] is None
+    assert "category_source" not in patches[2]
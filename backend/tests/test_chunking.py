@@ -0,0 +1,41 @@
+from services.chunking import count_tokens, split_into_chunks
+
+
+def _document(paragraphs: int) -> str:
+    return "\n\n".join(
+        f"Paragraph {i} discusses quarterly results, hiring plans and budget item {i * 7}."
+        for i in range(paragraphs)
+    )
+
+
+def test_chunks_respect_max_tokens_and_keep_every_paragraph():
+    text = _document(200)
+    
+    chunks = split_into_chunks(text, max_tokens=120, min_tokens=40)
+    
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 120 + len(chunk.splitlines()) for chunk in chunks)
+    assert "\n".join(chunks).splitlines() == [line for line in text.splitlines() if line]
+
+
+def test_editing_one_paragraph_keeps_the_other_chunks():
+    text = _document(200)
+    edited = text.replace("Paragraph 100 discusses", "Paragraph 100 now covers")
+    
+    before = split_into_chunks(text, max_tokens=120, min_tokens=40)
+    after = split_into_chunks(edited, max_tokens=120, min_tokens=40)
+    
+    # Only the chunks around the edit change; the ones before and after it are reused
+    unchanged = set(before) & set(after)
+    assert len(before) - len(unchanged) <= 3
+    assert len(after) - len(unchanged) <= 3
+    assert any("Paragraph 100 now covers" in chunk for chunk in set(after) - unchanged)
+
+
+def test_long_lines_are_split_by_words():
+    line = " ".join(f"word{i}" for i in range(2000))
+    
+    chunks = split_into_chunks(line, max_tokens=100, min_tokens=50)
+    
+    assert " ".join(chunks).split() == line.split()
+    assert all(count_tokens(chunk) <= 110 for chunk in chunks)
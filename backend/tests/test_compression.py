@@ -0,0 +1,69 @@
+import gzip
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from compression import CompressionMiddleware, brotli
+
+BODY = "document metadata " * 200
+
+
+def _stream(request):
+    async def chunks():
+        for _ in range(3):
+            yield BODY
+    
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+app = Starlette(routes=[
+    Route("/text", lambda request: PlainTextResponse(BODY)),
+    Route("/small", lambda request: PlainTextResponse("ok")),
+    Route("/stream", _stream),
+    Route("/gzip", lambda request: Response(gzip.compress(BODY.encode()), media_type="application/gzip")),
+])
+client = TestClient(CompressionMiddleware(app, minimum_size=1024))
+
+
+def test_gzip_response_has_its_compressed_length():
+    response = client.get("/text", headers={"Accept-Encoding": "gzip"})
+    
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.text == BODY
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_brotli_is_preferred_when_accepted():
+    response = client.get("/text", headers={"Accept-Encoding": "gzip, br"})
+    
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == BODY
+
+
+def test_refused_encodings_and_small_bodies_are_sent_as_they_are():
+    refused = client.get("/text", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    
+    assert "content-encoding" not in refused.headers
+    assert refused.headers["vary"] == "Accept-Encoding"
+    assert refused.text == BODY
+    assert "content-encoding" not in small.headers
+    assert small.text == "ok"
+
+
+def test_streamed_bodies_are_compressed_chunk_by_chunk():
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == BODY * 3
+
+
+def test_already_compressed_types_pass_through():
+    response = client.get("/gzip", headers={"Accept-Encoding": "gzip"})
+    
+    assert "content-encoding" not in response.headers
+    assert gzip.decompress(response.content) == BODY.encode()
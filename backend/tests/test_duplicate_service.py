@@ -0,0 +1,98 @@
+import json
+import httpx
+import numpy as np
+import pytest
+from services.duplicate_service import (
+    DuplicateService,
+    MINHASH_PERMUTATIONS,
+    decode_signature,
+    encode_signature,
+    minhash_signature
+)
+from services.supabase_service import decode_watermark
+
+WORDS = [f"word{i}" for i in range(400)]
+TEXT = " ".join(WORDS)
+
+
+def _jaccard(a: str, b: str, size: int = 5) -> float:
+    def shingles(text):
+        words = text.split()
+        return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return len(shingles(a) & shingles(b)) / len(shingles(a) | shingles(b))
+
+
+def test_signature_similarity_estimates_jaccard():
+    edited = " ".join(WORDS[:380] + [f"other{i}" for i in range(20)])
+    
+    similarity = (minhash_signature(TEXT) == minhash_signature(edited)).mean()
+    
+    assert similarity == pytest.approx(_jaccard(TEXT, edited), abs=0.1)
+    assert (minhash_signature(TEXT) == minhash_signature(TEXT.upper())).all()
+
+
+def test_signature_encoding_round_trip():
+    signature = minhash_signature(TEXT)
+    encoded = encode_signature(signature)
+    
+    assert encoded.startswith("\\x") and len(encoded) == 2 + MINHASH_PERMUTATIONS * 8
+    np.testing.assert_array_equal(decode_signature(encoded), signature)
+
+
+def test_documents_without_text_have_no_signature():
+    assert minhash_signature("  ... ") is None
+    assert encode_signature(None) == "\\x"
+    assert decode_signature("\\x") is None and decode_signature(None) is None
+
+
+def test_index_finds_near_duplicates_above_the_threshold():
+    service = DuplicateService()
+    near = " ".join(WORDS[:390] + ["changed"] * 10)
+    service.add("original", minhash_signature(TEXT))
+    service.add("near", minhash_signature(near))
+    service.add("unrelated", minhash_signature(" ".join(f"other{i}" for i in range(400))))
+    
+    matches = service.find(minhash_signature(TEXT), exclude="original")
+    
+    assert [document_id for document_id, _ in matches] == ["near"]
+    assert matches[0][1] >= 0.8
+    
+    service.remove("near")
+    assert service.find(minhash_signature(TEXT), exclude="original") == []
+    service.remove("original")
+    service.remove("unrelated")
+    assert all(not buckets for buckets in service._bands)
+
+
+@pytest.mark.anyio
+async def test_sync_backfills_missing_signatures(supabase):
+    rows = [
+        {
+            "id": "stored",
+            "updated_at": "2025-01-01T00:00:00+00:00",
+            "content_text": TEXT,
+            "content_minhash": encode_signature(minhash_signature(TEXT))
+        },
+        {"id": "missing", "updated_at": "2025-01-02T00:00:00+00:00", "content_text": TEXT, "content_minhash": None},
+    ]
+    patches = {}
+    
+    def documents(request: httpx.Request) -> httpx.Response:
+        if request.url.params.get("id") == "in.(missing)":
+            return httpx.Response(200, json=supabase.select(request, rows[1:]))
+        return httpx.Response(200, json=supabase.select(request, rows))
+    
+    def patch(request: httpx.Request) -> httpx.Response:
+        patches[request.url.params["id"]] = json.loads(request.content)["content_minhash"]
+        return httpx.Response(204)
+    
+    supabase.route("GET", "/rest/v1/documents", documents)
+    supabase.route("GET", "/rest/v1/document_deletions", lambda request: httpx.Response(200, json=[]))
+    supabase.route("PATCH", "/rest/v1/documents", patch)
+    service = DuplicateService()
+    
+    await service.sync()
+    
+    assert patches == {"eq.missing": encode_signature(minhash_signature(TEXT))}
+    assert decode_watermark(service.watermark)[0] == ["2025-01-02T00:00:00+00:00", "missing"]
+    assert sorted(service.find(minhash_signature(TEXT))) == [("missing", 1.0), ("stored", 1.0)]
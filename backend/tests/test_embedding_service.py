@@ -0,0 +1,69 @@
+import json
+import os
+import httpx
+import pytest
+from config import settings
+from services.embedding_service import EmbeddingService, HashingEmbeddingProvider
+from services.supabase_service import decode_watermark
+from services.vector_index import VectorIndex
+
+pytestmark = pytest.mark.anyio
+
+ROWS = [
+    {"id": "a", "title": "Budget report", "description": "Quarterly finance numbers", "updated_at": "2025-01-01T00:00:00+00:00"},
+    {"id": "b", "title": "Vacation policy", "description": "Employee leave rules", "updated_at": "2025-01-02T00:00:00+00:00"},
+]
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = EmbeddingService()
+    service.provider = HashingEmbeddingProvider()
+    service.index = VectorIndex(str(tmp_path / "index"), service.provider.dimension, service.provider.name)
+    yield service
+    service.index.close()
+
+
+def _serve_changes(supabase, rows):
+    supabase.route("GET", "/rest/v1/documents", lambda request: httpx.Response(200, json=supabase.select(request, rows)))
+    supabase.route("GET", "/rest/v1/document_deletions", lambda request: httpx.Response(200, json=[]))
+
+
+async def test_sync_indexes_stored_documents_and_moves_the_watermark(service, supabase):
+    _serve_changes(supabase, ROWS)
+    
+    await service.sync()
+    
+    assert len(service.index) == 2
+    assert decode_watermark(service.index.watermark)[0] == ["2025-01-02T00:00:00+00:00", "b"]
+    assert service.index.search(service.index.get("a"), limit=1)[0][0] == "a"
+
+
+async def test_sync_saves_only_after_the_interval(service, supabase, monkeypatch):
+    meta_path = os.path.join(service.index.directory, "meta.json")
+    _serve_changes(supabase, ROWS[:1])
+    monkeypatch.setattr(settings, "embedding_sync_interval", 3600)
+    service._saved_at = float("inf")
+    
+    await service.sync()
+    
+    assert not os.path.exists(meta_path)
+    
+    service._saved_at = 0.0
+    await service.sync()
+    
+    with open(meta_path) as f:
+        saved = json.load(f)
+    assert saved["watermark"] == service.index.watermark
+    assert saved["ids"] == ["a"]
+
+
+async def test_stop_saves_and_releases_an_empty_index(tmp_path):
+    service = EmbeddingService()
+    service.provider = HashingEmbeddingProvider()
+    service.index = VectorIndex(str(tmp_path / "index"), service.provider.dimension, service.provider.name)
+    
+    await service.stop()
+    
+    assert service.index is None
+    assert os.path.exists(tmp_path / "index" / "meta.json")
@@ -0,0 +1,52 @@
+import os
+import zipfile
+import pytest
+from services import extraction_service as extraction_module
+from services.extraction_service import extract_text, extraction_service
+
+WORD_XML = (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    '<w:p><w:r><w:t>First</w:t></w:r><w:r><w:tab/><w:t>paragraph</w:t></w:r></w:p>'
+    '<w:p><w:r><w:t>Second</w:t></w:r></w:p>'
+    '</w:body></w:document>'
+)
+
+
+def test_text_files_fall_back_to_windows_1252(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes("Relatório de ações\n".encode("cp1252"))
+    
+    assert extract_text(str(path), "txt", 1000) == "Relatório de ações"
+
+
+def test_utf8_text_is_decoded_across_windows(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction_module, "TEXT_WINDOW_SIZE", 3)
+    path = tmp_path / "notes.csv"
+    path.write_bytes("﻿ação,é\n".encode("utf-8"))
+    
+    assert extract_text(str(path), "csv", 1000) == "ação,é"
+
+
+def test_docx_paragraphs_and_max_chars(tmp_path):
+    path = tmp_path / "report.docx"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", WORD_XML)
+    
+    assert extract_text(str(path), "docx", 1000) == "First\tparagraph\nSecond"
+    assert extract_text(str(path), "docx", 5) == "First"
+
+
+@pytest.mark.anyio
+async def test_spooled_copy_is_removed_after_extraction(tmp_path):
+    source = tmp_path / "upload.txt"
+    source.write_bytes(b"spooled text")
+    
+    with open(source, "rb") as upload:
+        path = await extraction_service.spool(upload)
+    
+    try:
+        assert open(path, "rb").read() == b"spooled text"
+        assert await extraction_service.extract(path, "txt") == "spooled text"
+        assert not os.path.exists(path)
+    finally:
+        extraction_service.shutdown()
@@ -0,0 +1,123 @@
+import json
+from typing import Any, AsyncIterator, List, Tuple
+import httpx
+import pytest
+from services import import_service as import_module
+from services.import_service import import_service
+
+pytestmark = pytest.mark.anyio
+
+
+def _record(title: str, **fields: Any) -> dict:
+    return {
+        "title": title,
+        "file_name": f"{title}.pdf",
+        "file_type": "pdf",
+        "file_size": 10,
+        "file_url": f"https://files/{title}.pdf",
+        **fields
+    }
+
+
+async def _chunks(body: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+async def _parse(body: bytes, size: int = 7) -> List[Tuple[Any, Any]]:
+    return [record async for record in import_service.parse(_chunks(body, size))]
+
+
+async def test_parse_ndjson_across_chunk_boundaries():
+    body = b'{"a": 1}\n\n{"a": "\xc3\xa9"}\r\n{"a": 3}'
+    
+    assert await _parse(body, size=3) == [({"a": 1}, None), ({"a": "é"}, None), ({"a": 3}, None)]
+
+
+async def test_parse_ndjson_reports_invalid_lines_and_continues():
+    records = await _parse(b'{"a": 1}\nnot json\n{"a": 2}\n')
+    
+    assert records[0] == ({"a": 1}, None)
+    assert records[1][0] is None and records[1][1].startswith("Invalid JSON")
+    assert records[2] == ({"a": 2}, None)
+
+
+async def test_parse_json_array_split_inside_elements():
+    body = b' [ {"a": [1, 2]}, {"b": "x,]"} ,{"c": null}]'
+    
+    assert await _parse(body, size=4) == [({"a": [1, 2]}, None), ({"b": "x,]"}, None), ({"c": None}, None)]
+
+
+async def test_parse_unterminated_array_stops_with_error():
+    records = await _parse(b'[{"a": 1}, {"b": ')
+    
+    assert records == [({"a": 1}, None), (None, "Malformed or unterminated JSON array, import stopped")]
+
+
+async def test_parse_oversized_record_stops_with_error(monkeypatch):
+    monkeypatch.setattr(import_module, "MAX_RECORD_SIZE", 16)
+    
+    records = await _parse(b'{"a": 1}\n{"long": "' + b"x" * 64 + b'"}\n{"b": 2}\n', size=8)
+    
+    assert records[0] == ({"a": 1}, None)
+    assert records[-1] == (None, "Record larger than 16 bytes, import stopped")
+    assert ({"b": 2}, None) not in records
+
+
+async def test_import_reports_failures_by_record_index(supabase):
+    def insert(request: httpx.Request) -> httpx.Response:
+        rows = json.loads(request.content)
+        if any(row["title"] == "rejected" for row in rows):
+            return httpx.Response(400, json={"message": "check constraint violated"})
+        return httpx.Response(201, json=[{**row, "id": row["title"]} for row in rows])
+    
+    supabase.route("POST", "/rest/v1/documents", insert)
+    records = [
+        _record("a"),
+        {"title": "missing fields"},
+        _record("b"),
+        _record("rejected"),
+        _record("c"),
+    ]
+    body = b"".join(json.dumps(record).encode() + b"\n" for record in records) + b"{broken\n"
+    
+    result = await import_service.import_documents(_chunks(body, 32), batch_size=4)
+    
+    assert (result.received, result.imported, result.failed) == (6, 3, 3)
+    assert [failure.index for failure in result.errors] == [1, 3, 5]
+    assert "file_name" in result.errors[0].error
+    assert "check constraint" in result.errors[1].error
+    assert result.errors[2].error.startswith("Invalid JSON")
+
+
+async def test_import_rejected_batch_is_bisected(supabase):
+    inserted = []
+    
+    def insert(request: httpx.Request) -> httpx.Response:
+        rows = json.loads(request.content)
+        if any(row["title"] == "rejected" for row in rows):
+            return httpx.Response(400, json={"message": "rejected"})
+        inserted.extend(row["title"] for row in rows)
+        return httpx.Response(201, json=[{**row, "id": row["title"]} for row in rows])
+    
+    supabase.route("POST", "/rest/v1/documents", insert)
+    titles = [f"doc{i}" for i in range(7)] + ["rejected"]
+    body = json.dumps([_record(title) for title in titles]).encode()
+    
+    result = await import_service.import_documents(_chunks(body, 64), batch_size=8)
+    
+    assert result.imported == 7
+    assert [failure.index for failure in result.errors] == [7]
+    assert sorted(inserted) == sorted(titles[:7])
+    # One full batch, then halves down to the bad row: 1 + 2 + 2 + 2 inserts
+    assert len(supabase.requests) == 7
+
+
+async def test_import_server_errors_fail_the_whole_batch(supabase):
+    supabase.route("POST", "/rest/v1/documents", lambda request: httpx.Response(503, text="unavailable"))
+    body = b"".join(json.dumps(_record(f"doc{i}")).encode() + b"\n" for i in range(3))
+    
+    result = await import_service.import_documents(_chunks(body, 64), batch_size=10)
+    
+    assert (result.imported, result.failed) == (0, 3)
+    assert len(supabase.requests) == 1
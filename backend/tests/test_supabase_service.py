@@ -0,0 +1,87 @@
+import httpx
+import pytest
+from services.supabase_service import (
+    decode_cursor,
+    decode_watermark,
+    encode_cursor,
+    encode_watermark,
+    supabase_service
+)
+
+ROW = {"id": "6f1c3b1e-0000-4000-8000-000000000001", "created_at": "2025-01-01T12:00:00.123456+00:00"}
+
+
+def test_cursor_round_trip_is_url_safe():
+    cursor = encode_cursor(ROW)
+    
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == [ROW["created_at"], ROW["id"]]
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_cursor(ROW)[:-3], "WzFd"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.mark.anyio
+async def test_cursor_page_is_read_by_keyset(supabase):
+    supabase.route("GET", "/rest/v1/documents", lambda request: httpx.Response(200, json=[]))
+    
+    await supabase_service.get_documents(limit=10, offset=40, cursor=encode_cursor(ROW), columns="id")
+    
+    params = supabase.requests[0].url.params
+    assert params["and"] == (
+        f'(or(created_at.lt."{ROW["created_at"]}",and(created_at.eq."{ROW["created_at"]}",id.lt.{ROW["id"]})))'
+    )
+    assert params["order"] == "created_at.desc,id.desc"
+    assert "offset" not in params
+
+
+def test_watermark_round_trip():
+    documents = ["2025-01-02T00:00:00+00:00", "a"]
+    
+    assert decode_watermark(encode_watermark(documents, None)) == (documents, None)
+
+
+@pytest.mark.parametrize("watermark", ["", "e30", encode_watermark(["2025-01-01", "a", "b"], None), "%%%"])
+def test_malformed_watermark_is_rejected(watermark):
+    with pytest.raises(ValueError, match="Invalid watermark"):
+        decode_watermark(watermark)
+
+
+@pytest.mark.anyio
+async def test_changes_advance_the_watermark_per_stream(supabase):
+    documents = [
+        {"id": "a", "updated_at": "2025-01-01T00:00:00+00:00"},
+        {"id": "b", "updated_at": "2025-01-02T00:00:00+00:00"},
+    ]
+    deletions = [{"id": 7, "document_id": "c", "deleted_at": "2025-01-03T00:00:00+00:00"}]
+    supabase.route("GET", "/rest/v1/documents", lambda request: httpx.Response(200, json=documents))
+    supabase.route("GET", "/rest/v1/document_deletions", lambda request: httpx.Response(200, json=deletions))
+    
+    changes = await supabase_service.get_changes(limit=2, columns="title")
+    
+    # The watermark columns are selected whatever the caller asks for
+    selects = [request.url.params["select"] for request in supabase.requests if request.url.path == "/rest/v1/documents"]
+    assert selects == ["title,updated_at,id"]
+    assert changes["documents"] == documents
+    assert changes["deletions"] == [{"id": "c", "deleted_at": "2025-01-03T00:00:00+00:00"}]
+    assert changes["has_more"] is True
+    assert decode_watermark(changes["watermark"]) == (
+        ["2025-01-02T00:00:00+00:00", "b"],
+        ["2025-01-03T00:00:00+00:00", 7]
+    )
+    
+    # The next read continues after each stream's mark; an empty stream keeps its mark
+    supabase.route("GET", "/rest/v1/documents", lambda request: httpx.Response(200, json=[]))
+    supabase.route("GET", "/rest/v1/document_deletions", lambda request: httpx.Response(200, json=[]))
+    
+    following = await supabase_service.get_changes(since=changes["watermark"], limit=2, columns="id,updated_at")
+    
+    documents_filter = [
+        request.url.params["and"] for request in supabase.requests if request.url.path == "/rest/v1/documents"
+    ][-1]
+    assert 'or(updated_at.gt."2025-01-02T00:00:00+00:00",and(updated_at.eq."2025-01-02T00:00:00+00:00",id.gt.b))' in documents_filter
+    assert following["watermark"] == changes["watermark"]
+    assert following["has_more"] is False
@@ -0,0 +1,116 @@
+import httpx
+import pytest
+from config import settings
+from services.supabase_service import decode_watermark
+from services.tag_service import TagService
+
+DOCUMENTS = [
+    ("1", "Quarterly budget report", "Finance numbers for the quarter", ["finance", "budget"]),
+    ("2", "Annual budget plan", "Budget and finance forecast", ["finance", "budget"]),
+    ("3", "Invoice March", "Supplier invoice and payment", ["finance", "invoice"]),
+    ("4", "Onboarding checklist", "New employee onboarding steps", ["hr", "onboarding"]),
+    ("5", "Vacation policy", "Employee vacation and leave rules", ["hr", "policy"]),
+]
+
+
+@pytest.fixture
+def service():
+    service = TagService()
+    for document_id, title, description, tags in DOCUMENTS:
+        service.on_document_change("created", {
+            "id": document_id,
+            "title": title,
+            "description": description,
+            "tags": tags
+        })
+    service.refresh()
+    return service
+
+
+def test_suggestions_follow_the_words_of_tagged_documents(service):
+    suggestions = service.suggest("Budget review", "Finance figures for the board")
+    
+    tags = [tag for tag, _ in suggestions]
+    assert set(tags[:2]) == {"finance", "budget"}
+    assert "hr" not in tags
+    assert all(0 < score <= 1 for _, score in suggestions)
+
+
+def test_existing_tags_add_co_occurring_tags_and_are_not_repeated(service):
+    suggestions = dict(service.suggest("Notes", tags=["onboarding"]))
+    
+    assert "onboarding" not in suggestions
+    assert suggestions.get("hr", 0) >= 0.5
+
+
+def test_retagged_and_deleted_documents_are_forgotten(service):
+    for document_id, title, description, _ in DOCUMENTS[:3]:
+        service.on_document_change("updated", {
+            "id": document_id,
+            "title": title,
+            "description": description,
+            "tags": ["accounting"]
+        })
+    service.on_document_change("deleted", {"id": "4"})
+    service.on_document_change("deleted", {"id": "5"})
+    service.refresh()
+    
+    tags = [tag for tag, _ in service.suggest("Quarterly budget report", "Finance numbers")]
+    
+    assert tags == ["accounting"]
+    assert service._documents == 3
+
+
+def test_unknown_words_suggest_nothing(service):
+    assert service.suggest("zzz qqq") == []
+    assert TagService().suggest("Quarterly budget") == []
+
+
+@pytest.mark.anyio
+async def test_ai_is_asked_only_when_the_local_model_is_unsure(service, monkeypatch):
+    from services.openai_service import openai_service
+    
+    async def suggest_tags(title, description=None):
+        return ["from-ai", "hr", " "]
+    
+    monkeypatch.setattr(openai_service, "suggest_tags", suggest_tags)
+    monkeypatch.setattr(settings, "tag_suggestion_min_confidence", 0.3)
+    
+    tags, confidence, source = await service.suggest_tags("Budget review", "Finance figures")
+    assert source == "local" and confidence >= 0.3 and "finance" in tags
+    
+    # hr alone only half-predicts its co-occurring tags, below the confidence needed
+    tags, confidence, source = await service.suggest_tags("zzz qqq", tags=["hr"])
+    assert (tags, source) == (["from-ai"], "ai")
+    assert confidence == pytest.approx(0.25)
+
+
+@pytest.mark.anyio
+async def test_sync_learns_stored_documents_and_deletions(supabase):
+    rows = [
+        {
+            "id": document_id,
+            "title": title,
+            "description": description,
+            "tags": tags,
+            "updated_at": f"2025-01-0{document_id}T00:00:00+00:00"
+        }
+        for document_id, title, description, tags in DOCUMENTS
+    ]
+    supabase.route("GET", "/rest/v1/documents", lambda request: httpx.Response(200, json=supabase.select(request, rows)))
+    supabase.route("GET", "/rest/v1/document_deletions", lambda request: httpx.Response(200, json=[]))
+    service = TagService()
+    
+    await service.sync()
+    
+    assert service._documents == 5
+    assert decode_watermark(service.watermark)[0] == ["2025-01-05T00:00:00+00:00", "5"]
+    assert {"finance", "budget"} <= {tag for tag, _ in service.suggest("Budget review", "Finance figures")}
+    
+    deletions = [{"id": 1, "document_id": "5", "deleted_at": "2025-01-06T00:00:00+00:00"}]
+    supabase.route("GET", "/rest/v1/documents", lambda request: httpx.Response(200, json=[]))
+    supabase.route("GET", "/rest/v1/document_deletions", lambda request: httpx.Response(200, json=deletions))
+    
+    await service.sync()
+    
+    assert service._documents == 4
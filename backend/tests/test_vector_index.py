@@ -0,0 +1,129 @@
+import os
+import numpy as np
+import pytest
+from services.embedding_service import EmbeddingProvider, HashingEmbeddingProvider
+from services.vector_index import VectorIndex
+
+DIMENSION = 16
+
+
+def _vector(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(DIMENSION).astype(np.float32)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = VectorIndex(str(tmp_path / "index"), DIMENSION, "test")
+    yield index
+    if hasattr(index, "_vectors"):
+        index.close()
+
+
+def test_search_ranks_by_cosine_similarity(index):
+    for i in range(10):
+        index.upsert(f"doc{i}", _vector(i), f"hash{i}")
+    
+    query = _vector(3) * 5 + _vector(100) * 0.1
+    results = index.search(query, limit=3)
+    
+    assert results[0][0] == "doc3"
+    assert results[0][1] == pytest.approx(1.0, abs=0.01)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    assert "doc3" not in [document_id for document_id, _ in index.search(query, limit=3, exclude="doc3")]
+
+
+def test_removed_rows_are_reused_and_never_returned(index):
+    index.upsert("a", _vector(1), "ha")
+    index.upsert("b", _vector(2), "hb")
+    
+    index.remove("a")
+    
+    assert "a" not in index and index.text_hash("a") is None
+    assert [document_id for document_id, _ in index.search(_vector(1), limit=5)] == ["b"]
+    index.upsert("c", _vector(3), "hc")
+    assert len(index._ids) == 2
+
+
+def test_index_grows_past_its_initial_capacity(tmp_path, monkeypatch):
+    monkeypatch.setattr(VectorIndex, "INITIAL_CAPACITY", 4)
+    index = VectorIndex(str(tmp_path / "index"), DIMENSION, "test")
+    
+    for i in range(9):
+        index.upsert(f"doc{i}", _vector(i), f"hash{i}")
+    
+    assert index._vectors.shape[0] >= 9
+    assert index.search(_vector(8), limit=1)[0][0] == "doc8"
+    index.close()
+
+
+def test_index_is_saved_and_reloaded(tmp_path):
+    directory = str(tmp_path / "index")
+    index = VectorIndex(directory, DIMENSION, "test")
+    index.upsert("a", _vector(1), "ha")
+    index.upsert("b", _vector(2), "hb")
+    index.remove("a")
+    index.watermark = "mark"
+    index.close()
+    
+    reopened = VectorIndex(directory, DIMENSION, "test")
+    
+    assert reopened.watermark == "mark"
+    assert "a" not in reopened and reopened.text_hash("b") == "hb"
+    np.testing.assert_allclose(reopened.get("b"), _vector(2) / np.linalg.norm(_vector(2)), rtol=1e-6)
+    reopened.close()
+    
+    # Vectors of another provider are not comparable: start over
+    rebuilt = VectorIndex(directory, DIMENSION, "other")
+    assert len(rebuilt) == 0 and rebuilt.watermark is None
+    rebuilt.close()
+
+
+def test_lsh_search_finds_near_vectors(tmp_path):
+    index = VectorIndex(str(tmp_path / "index"), DIMENSION, "test", exact_threshold=0)
+    for i in range(300):
+        index.upsert(f"doc{i}", _vector(i), f"hash{i}")
+    
+    for i in (0, 150, 299):
+        assert index.search(_vector(i) + _vector(1000 + i) * 0.05, limit=1)[0][0] == f"doc{i}"
+    
+    # Buckets follow updates and removals
+    index.remove("doc150")
+    index.upsert("moved", _vector(150), "moved")
+    assert index.search(_vector(150), limit=1)[0][0] == "moved"
+    index.close()
+
+
+def test_second_process_gets_a_private_copy(tmp_path, index):
+    if not index.persistent:
+        pytest.skip("directory locks are not available")
+    
+    other = VectorIndex(str(tmp_path / "index"), DIMENSION, "test")
+    
+    assert not other.persistent
+    assert other.directory != index.directory
+    other.upsert("private", _vector(1), "h")
+    other.close()
+    assert not os.path.exists(other.directory)
+    assert "private" not in index
+
+
+def test_embedding_providers_must_implement_embed():
+    with pytest.raises(TypeError):
+        EmbeddingProvider()
+
+
+@pytest.mark.anyio
+async def test_hashing_embeddings_are_deterministic_and_similar_for_shared_words():
+    provider = HashingEmbeddingProvider()
+    
+    vectors = await provider.embed([
+        "quarterly budget report",
+        "quarterly budget report",
+        "budget report for the quarter",
+        "employee onboarding checklist",
+    ])
+    
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert vectors.shape == (4, provider.dimension)
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+    assert unit[0] @ unit[2] > unit[0] @ unit[3]
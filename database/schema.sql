@@ -5,6 +5,9 @@
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Enable trigram matching (partial-word search fallback)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- =====================================================
 -- Categories Table
 -- =====================================================
@@ -50,6 +53,76 @@ CREATE TABLE IF NOT EXISTS documents (
         ON DELETE SET DEFAULT
 );
 
+-- Columns added after the initial release (safe to re-run on existing databases)
+
+-- SHA-256 of the file bytes, used to deduplicate Storage objects
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+
+-- Text extracted from the file at upload (PDF, DOCX, TXT, CSV), reused by AI analysis
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_text TEXT;
+
+-- MinHash signature of content_text (128 x 4 bytes) for near-duplicate detection.
+-- Empty when the document has no text; NULL until computed
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_minhash BYTEA;
+
+-- 'classifier' when the category was applied from a local classifier prediction
+-- without review; NULL when a person or GPT-4 chose it. The classifier does not
+-- train on its own labels
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS category_source VARCHAR(20);
+
+-- Weighted full-text search document: title (A), author (B), description (C)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('portuguese', COALESCE(author, '')), 'B') ||
+        setweight(to_tsvector('portuguese', COALESCE(description, '')), 'C')
+    ) STORED;
+
+-- =====================================================
+-- Analytics Rollups Table
+-- =====================================================
+-- Pre-aggregated counters served by /api/analytics/stats.
+-- dimension is one of: 'total', 'category', 'tag', 'type', 'day'.
+-- Maintained incrementally by the maintain_documents_rollups_* triggers.
+CREATE TABLE IF NOT EXISTS document_rollups (
+    dimension VARCHAR(20) NOT NULL,
+    bucket TEXT NOT NULL,
+    document_count BIGINT NOT NULL DEFAULT 0,
+    total_size BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, bucket)
+);
+
+-- =====================================================
+-- Analysis Jobs Table
+-- =====================================================
+-- Background AI enrichment queue, processed by the API's job workers.
+-- status is one of: 'queued', 'running', 'completed', 'failed'.
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMP WITH TIME ZONE,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- =====================================================
+-- Document Deletions Log
+-- =====================================================
+-- Tombstones served by /api/documents/changes so incremental syncs see deletions.
+-- Filled by the log_document_deletion trigger. Rows can be pruned once every
+-- client has synced past them, e.g. DELETE ... WHERE deleted_at < NOW() - INTERVAL '90 days'.
+CREATE TABLE IF NOT EXISTS document_deletions (
+    id BIGSERIAL PRIMARY KEY,
+    document_id UUID NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
 -- =====================================================
 -- Indexes for Performance
 -- =====================================================
@@ -60,18 +133,44 @@ CREATE INDEX IF NOT EXISTS idx_documents_category ON documents(category);
 -- Index for file type filtering
 CREATE INDEX IF NOT EXISTS idx_documents_file_type ON documents(file_type);
 
--- Index for created_at sorting
-CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents(created_at DESC);
+-- Index for content hash deduplication lookups
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
+
+-- Index for checking whether a deleted document's file is still used by another one
+CREATE INDEX IF NOT EXISTS idx_documents_file_url ON documents(file_url);
 
--- Index for text search on title
-CREATE INDEX IF NOT EXISTS idx_documents_title ON documents USING gin(to_tsvector('portuguese', title));
+-- Index for the change feed, read by keyset on (updated_at, id)
+CREATE INDEX IF NOT EXISTS idx_documents_updated_at_id ON documents(updated_at, id);
 
--- Index for text search on author
-CREATE INDEX IF NOT EXISTS idx_documents_author ON documents USING gin(to_tsvector('portuguese', author));
+-- Index for reading deletion tombstones by keyset on (deleted_at, id)
+CREATE INDEX IF NOT EXISTS idx_document_deletions_deleted_at_id ON document_deletions(deleted_at, id);
+
+-- Index for created_at sorting and keyset pagination on (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_documents_created_at_id ON documents(created_at DESC, id DESC);
+
+-- Superseded by idx_documents_created_at_id
+DROP INDEX IF EXISTS idx_documents_created_at;
+
+-- Index for full-text search over title, author and description
+CREATE INDEX IF NOT EXISTS idx_documents_search_vector ON documents USING gin(search_vector);
+
+-- Trigram indexes for partial-word and typo-tolerant search on title and author
+CREATE INDEX IF NOT EXISTS idx_documents_title_trgm ON documents USING gin(title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_documents_author_trgm ON documents USING gin(author gin_trgm_ops);
+
+-- Superseded by idx_documents_search_vector
+DROP INDEX IF EXISTS idx_documents_title;
+DROP INDEX IF EXISTS idx_documents_author;
 
 -- Index for array search on tags
 CREATE INDEX IF NOT EXISTS idx_documents_tags ON documents USING gin(tags);
 
+-- Index for ranking rollup buckets (top tags, categories)
+CREATE INDEX IF NOT EXISTS idx_document_rollups_count ON document_rollups(dimension, document_count DESC);
+
+-- Index for claiming due jobs
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_due ON analysis_jobs(status, run_after);
+
 -- =====================================================
 -- Functions and Triggers
 -- =====================================================
@@ -85,13 +184,160 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function to update updated_at on documents. Writes that change nothing but
+-- derived data (content_minhash, backfilled by the API) keep updated_at, so
+-- they do not send the row through the change feed again
+CREATE OR REPLACE FUNCTION update_documents_updated_at_column()
+RETURNS TRIGGER AS $$
+DECLARE
+    unchanged documents := OLD;
+BEGIN
+    unchanged.content_minhash := NEW.content_minhash;
+    unchanged.search_vector := NEW.search_vector;
+    unchanged.updated_at := NEW.updated_at;
+    
+    IF unchanged IS NOT DISTINCT FROM NEW THEN
+        NEW.updated_at = OLD.updated_at;
+    ELSE
+        NEW.updated_at = NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Trigger to automatically update updated_at
 DROP TRIGGER IF EXISTS update_documents_updated_at ON documents;
 CREATE TRIGGER update_documents_updated_at
     BEFORE UPDATE ON documents
     FOR EACH ROW
+    EXECUTE FUNCTION update_documents_updated_at_column();
+
+-- Trigger to automatically update updated_at on jobs
+DROP TRIGGER IF EXISTS update_analysis_jobs_updated_at ON analysis_jobs;
+CREATE TRIGGER update_analysis_jobs_updated_at
+    BEFORE UPDATE ON analysis_jobs
+    FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Function: Rollup buckets of one document, counted with sign (1 = add, -1 = remove)
+CREATE OR REPLACE FUNCTION document_rollup_buckets(
+    category VARCHAR,
+    tags TEXT[],
+    file_type VARCHAR,
+    file_size BIGINT,
+    created_at TIMESTAMPTZ,
+    sign INTEGER
+)
+RETURNS SETOF document_rollups AS $$
+    SELECT dimension::VARCHAR(20), bucket, sign::BIGINT, (sign * COALESCE(file_size, 0))::BIGINT
+    FROM (VALUES
+        ('total', ''),
+        ('category', COALESCE(category, 'Geral')),
+        ('type', file_type),
+        ('day', ((created_at AT TIME ZONE 'UTC')::DATE)::TEXT)
+    ) AS buckets(dimension, bucket)
+    UNION ALL
+    SELECT 'tag', tag, sign * COUNT(*), 0
+    FROM UNNEST(COALESCE(tags, '{}')) AS tag
+    GROUP BY tag;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Function to apply the rollup deltas of one statement, one upsert per bucket.
+-- Buckets are locked in key order, so concurrent writers cannot deadlock.
+CREATE OR REPLACE FUNCTION apply_document_rollup_deltas(deltas document_rollups[])
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO document_rollups (dimension, bucket, document_count, total_size)
+    SELECT dimension, bucket, SUM(document_count)::BIGINT, SUM(total_size)::BIGINT
+    FROM UNNEST(deltas)
+    GROUP BY dimension, bucket
+    HAVING SUM(document_count) <> 0 OR SUM(total_size) <> 0
+    ORDER BY dimension, bucket
+    ON CONFLICT (dimension, bucket) DO UPDATE SET
+        document_count = document_rollups.document_count + EXCLUDED.document_count,
+        total_size = document_rollups.total_size + EXCLUDED.total_size;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Function to move rollup counts between buckets as a statement changes documents.
+-- Runs once per statement over its transition tables, so a bulk write takes each
+-- bucket's row lock (e.g. the single 'total' row) once instead of once per document.
+CREATE OR REPLACE FUNCTION maintain_document_rollups()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM apply_document_rollup_deltas(ARRAY(
+            SELECT b
+            FROM new_rows n,
+                LATERAL document_rollup_buckets(n.category, n.tags, n.file_type, n.file_size, n.created_at, 1) b
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM apply_document_rollup_deltas(ARRAY(
+            SELECT b
+            FROM old_rows o,
+                LATERAL document_rollup_buckets(o.category, o.tags, o.file_type, o.file_size, o.created_at, -1) b
+        ));
+    ELSE
+        PERFORM apply_document_rollup_deltas(ARRAY(
+            SELECT ROW(b.dimension, b.bucket, b.document_count, b.total_size)::document_rollups
+            FROM old_rows o
+            JOIN new_rows n ON n.id = o.id,
+                LATERAL (
+                    SELECT * FROM document_rollup_buckets(o.category, o.tags, o.file_type, o.file_size, o.created_at, -1)
+                    UNION ALL
+                    SELECT * FROM document_rollup_buckets(n.category, n.tags, n.file_type, n.file_size, n.created_at, 1)
+                ) b
+            WHERE (o.category, o.tags, o.file_type, o.file_size, o.created_at)
+                IS DISTINCT FROM (n.category, n.tags, n.file_type, n.file_size, n.created_at)
+        ));
+    END IF;
+    
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Triggers to keep analytics rollups in sync with every write. Transition tables
+-- are only allowed on single-event triggers, hence one trigger per operation.
+DROP TRIGGER IF EXISTS maintain_documents_rollups ON documents;
+DROP TRIGGER IF EXISTS maintain_documents_rollups_insert ON documents;
+CREATE TRIGGER maintain_documents_rollups_insert
+    AFTER INSERT ON documents
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION maintain_document_rollups();
+
+DROP TRIGGER IF EXISTS maintain_documents_rollups_update ON documents;
+CREATE TRIGGER maintain_documents_rollups_update
+    AFTER UPDATE ON documents
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION maintain_document_rollups();
+
+DROP TRIGGER IF EXISTS maintain_documents_rollups_delete ON documents;
+CREATE TRIGGER maintain_documents_rollups_delete
+    AFTER DELETE ON documents
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION maintain_document_rollups();
+
+DROP FUNCTION IF EXISTS apply_document_rollup(documents, INTEGER);
+
+-- Function to record a tombstone for every deleted document
+CREATE OR REPLACE FUNCTION log_document_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO document_deletions (document_id) VALUES (OLD.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Trigger to log deletions for the change feed
+DROP TRIGGER IF EXISTS log_documents_deletion ON documents;
+CREATE TRIGGER log_documents_deletion
+    AFTER DELETE ON documents
+    FOR EACH ROW
+    EXECUTE FUNCTION log_document_deletion();
+
 -- =====================================================
 -- Row Level Security (RLS)
 -- =====================================================
@@ -118,6 +364,31 @@ CREATE POLICY "Allow read for all" ON categories
     FOR SELECT
     USING (true);
 
+-- Enable RLS on rollups table (writes happen through SECURITY DEFINER functions)
+ALTER TABLE document_rollups ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Allow read for all users
+CREATE POLICY "Allow read for all" ON document_rollups
+    FOR SELECT
+    USING (true);
+
+-- Enable RLS on jobs table
+ALTER TABLE analysis_jobs ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Allow all operations (jobs are created and processed by the API)
+CREATE POLICY "Allow all for API" ON analysis_jobs
+    FOR ALL
+    USING (true)
+    WITH CHECK (true);
+
+-- Enable RLS on deletions log (writes happen through the SECURITY DEFINER trigger)
+ALTER TABLE document_deletions ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Allow read for all users
+CREATE POLICY "Allow read for all" ON document_deletions
+    FOR SELECT
+    USING (true);
+
 -- =====================================================
 -- Storage Bucket
 -- =====================================================
@@ -147,6 +418,71 @@ LEFT JOIN documents d ON d.category = c.name
 GROUP BY c.name, c.color
 ORDER BY document_count DESC;
 
+-- View: Document statistics by tag
+CREATE OR REPLACE VIEW document_stats_by_tag AS
+SELECT 
+    tag,
+    COUNT(*) AS document_count
+FROM documents, UNNEST(tags) AS tag
+GROUP BY tag
+ORDER BY document_count DESC;
+
+-- View: Document statistics by file type
+CREATE OR REPLACE VIEW document_stats_by_type AS
+SELECT 
+    file_type,
+    COUNT(*) AS document_count,
+    COALESCE(SUM(file_size), 0) AS total_size
+FROM documents
+GROUP BY file_type
+ORDER BY document_count DESC;
+
+-- View: Documents created per day (UTC)
+CREATE OR REPLACE VIEW document_stats_timeline AS
+SELECT 
+    (created_at AT TIME ZONE 'UTC')::DATE AS date,
+    COUNT(*) AS document_count
+FROM documents
+GROUP BY 1
+ORDER BY 1;
+
+-- View: Rollups recomputed from the documents table (used for drift checks)
+CREATE OR REPLACE VIEW document_rollups_expected AS
+SELECT 'total'::VARCHAR(20) AS dimension, ''::TEXT AS bucket,
+    COUNT(*) AS document_count, COALESCE(SUM(file_size), 0) AS total_size
+FROM documents
+UNION ALL
+SELECT 'category', COALESCE(category, 'Geral'), COUNT(*), COALESCE(SUM(file_size), 0)
+FROM documents
+GROUP BY 2
+UNION ALL
+SELECT 'type', file_type, COUNT(*), COALESCE(SUM(file_size), 0)
+FROM documents
+GROUP BY 2
+UNION ALL
+SELECT 'day', ((created_at AT TIME ZONE 'UTC')::DATE)::TEXT, COUNT(*), COALESCE(SUM(file_size), 0)
+FROM documents
+GROUP BY 2
+UNION ALL
+SELECT 'tag', tag, COUNT(*), 0
+FROM documents, UNNEST(tags) AS tag
+GROUP BY 2;
+
+-- View: Rollup buckets whose stored counters differ from the documents table
+CREATE OR REPLACE VIEW document_rollups_drift AS
+SELECT
+    COALESCE(e.dimension, r.dimension) AS dimension,
+    COALESCE(e.bucket, r.bucket) AS bucket,
+    COALESCE(e.document_count, 0) AS expected_count,
+    COALESCE(r.document_count, 0) AS actual_count,
+    COALESCE(e.total_size, 0) AS expected_size,
+    COALESCE(r.total_size, 0) AS actual_size
+FROM document_rollups_expected e
+FULL OUTER JOIN document_rollups r
+    ON r.dimension = e.dimension AND r.bucket = e.bucket
+WHERE COALESCE(e.document_count, 0) <> COALESCE(r.document_count, 0)
+    OR COALESCE(e.total_size, 0) <> COALESCE(r.total_size, 0);
+
 -- View: Recent documents
 CREATE OR REPLACE VIEW recent_documents AS
 SELECT 
@@ -161,6 +497,261 @@ FROM documents
 ORDER BY created_at DESC
 LIMIT 10;
 
+-- =====================================================
+-- RPC Functions
+-- =====================================================
+
+-- Function: Full analytics payload for /api/analytics/stats, read from the rollups
+CREATE OR REPLACE FUNCTION get_document_analytics(top_tags_limit INTEGER DEFAULT 10)
+RETURNS JSON AS $$
+    WITH totals AS (
+        SELECT
+            COALESCE(SUM(document_count), 0) AS total_documents,
+            COALESCE(SUM(total_size), 0) AS total_size
+        FROM document_rollups
+        WHERE dimension = 'total'
+    )
+    SELECT json_build_object(
+        'total_documents', totals.total_documents,
+        'total_size', totals.total_size,
+        'categories', COALESCE((
+            SELECT json_agg(json_build_object(
+                'category', bucket,
+                'count', document_count,
+                'percentage', ROUND(document_count::NUMERIC / NULLIF(totals.total_documents, 0) * 100, 2)
+            ) ORDER BY document_count DESC)
+            FROM document_rollups
+            WHERE dimension = 'category' AND document_count > 0
+        ), '[]'::JSON),
+        'top_tags', COALESCE((
+            SELECT json_agg(json_build_object('tag', bucket, 'count', document_count))
+            FROM (
+                SELECT bucket, document_count
+                FROM document_rollups
+                WHERE dimension = 'tag' AND document_count > 0
+                ORDER BY document_count DESC, bucket
+                LIMIT top_tags_limit
+            ) t
+        ), '[]'::JSON),
+        'timeline', COALESCE((
+            SELECT json_agg(json_build_object('date', bucket, 'count', document_count) ORDER BY bucket)
+            FROM document_rollups
+            WHERE dimension = 'day' AND document_count > 0
+        ), '[]'::JSON),
+        'documents_by_type', COALESCE((
+            SELECT json_object_agg(bucket, document_count)
+            FROM document_rollups
+            WHERE dimension = 'type' AND document_count > 0
+        ), '{}'::JSON)
+    )
+    FROM totals;
+$$ LANGUAGE sql STABLE;
+
+-- Function: Compare rollups against the documents table and optionally repair drift
+CREATE OR REPLACE FUNCTION reconcile_document_rollups(repair BOOLEAN DEFAULT TRUE)
+RETURNS JSON AS $$
+DECLARE
+    drift_count INTEGER;
+    drift_sample JSON;
+BEGIN
+    -- Block trigger writes so the comparison sees a consistent state
+    LOCK TABLE document_rollups IN EXCLUSIVE MODE;
+    
+    SELECT COUNT(*) INTO drift_count FROM document_rollups_drift;
+    
+    SELECT json_agg(row_to_json(d)) INTO drift_sample
+    FROM (SELECT * FROM document_rollups_drift LIMIT 50) d;
+    
+    IF repair AND drift_count > 0 THEN
+        DELETE FROM document_rollups;
+        INSERT INTO document_rollups (dimension, bucket, document_count, total_size)
+        SELECT dimension, bucket, document_count, total_size
+        FROM document_rollups_expected
+        WHERE document_count > 0;
+    END IF;
+    
+    RETURN json_build_object(
+        'drifted_buckets', drift_count,
+        'repaired', repair AND drift_count > 0,
+        'drift', COALESCE(drift_sample, '[]'::JSON)
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Function: Apply per-document metadata updates in a single statement.
+-- updates is a JSON array of {"id": ..., "title": ..., ...}; missing or null fields are left unchanged.
+CREATE OR REPLACE FUNCTION bulk_update_documents(updates JSONB)
+RETURNS SETOF documents AS $$
+    UPDATE documents d SET
+        title = COALESCE(u.title, d.title),
+        author = COALESCE(u.author, d.author),
+        category = COALESCE(u.category, d.category),
+        category_source = CASE WHEN u.category IS NULL THEN d.category_source ELSE u.category_source END,
+        tags = COALESCE(u.tags, d.tags),
+        description = COALESCE(u.description, d.description)
+    FROM jsonb_to_recordset(updates) AS u(
+        id UUID,
+        title VARCHAR(255),
+        author VARCHAR(100),
+        category VARCHAR(50),
+        category_source VARCHAR(20),
+        tags TEXT[],
+        description TEXT
+    )
+    WHERE d.id = u.id
+    RETURNING d.*;
+$$ LANGUAGE sql;
+
+-- Function: Claim due analysis jobs for a worker.
+-- Also reclaims running jobs whose lease expired (e.g. the worker crashed).
+-- SKIP LOCKED lets many API workers poll the queue without blocking each other.
+CREATE OR REPLACE FUNCTION claim_analysis_jobs(batch_size INTEGER DEFAULT 1, lease_seconds INTEGER DEFAULT 300)
+RETURNS SETOF analysis_jobs AS $$
+    UPDATE analysis_jobs j SET
+        status = 'running',
+        attempts = j.attempts + 1,
+        locked_until = NOW() + make_interval(secs => lease_seconds)
+    WHERE j.id IN (
+        SELECT id
+        FROM analysis_jobs
+        WHERE (status = 'queued' AND run_after <= NOW())
+            OR (status = 'running' AND locked_until < NOW())
+        ORDER BY run_after
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.*;
+$$ LANGUAGE sql;
+
+-- Function: Full-text search ranked by relevance.
+-- Every word matches as a prefix. When nothing matches, falls back to trigram
+-- matching on title and author (substrings and typos).
+CREATE OR REPLACE FUNCTION search_documents(
+    search_query TEXT,
+    filter_category TEXT DEFAULT NULL,
+    filter_file_type TEXT DEFAULT NULL,
+    result_limit INTEGER DEFAULT 50,
+    result_offset INTEGER DEFAULT 0
+)
+RETURNS SETOF documents AS $$
+DECLARE
+    terms TEXT;
+    ts TSQUERY;
+    pattern TEXT;
+BEGIN
+    SELECT string_agg(word || ':*', ' & ') INTO terms
+    FROM regexp_split_to_table(
+        trim(regexp_replace(search_query, '[^[:alnum:][:space:]]', ' ', 'g')),
+        '\s+'
+    ) AS word
+    WHERE word <> '';
+    
+    IF terms IS NULL THEN
+        RETURN;
+    END IF;
+    
+    ts := to_tsquery('portuguese', terms);
+    
+    IF EXISTS (
+        SELECT 1 FROM documents d
+        WHERE d.search_vector @@ ts
+            AND (filter_category IS NULL OR d.category = filter_category)
+            AND (filter_file_type IS NULL OR d.file_type = filter_file_type)
+    ) THEN
+        RETURN QUERY
+        SELECT d.* FROM documents d
+        WHERE d.search_vector @@ ts
+            AND (filter_category IS NULL OR d.category = filter_category)
+            AND (filter_file_type IS NULL OR d.file_type = filter_file_type)
+        ORDER BY ts_rank_cd(d.search_vector, ts) DESC, d.created_at DESC, d.id DESC
+        LIMIT result_limit OFFSET result_offset;
+        RETURN;
+    END IF;
+    
+    -- Trigram fallback (ILIKE and <% are both served by the gin_trgm_ops indexes)
+    pattern := '%' || replace(replace(replace(search_query, '\', '\\'), '%', '\%'), '_', '\_') || '%';
+    
+    RETURN QUERY
+    SELECT d.* FROM documents d
+    WHERE (
+            d.title ILIKE pattern
+            OR d.author ILIKE pattern
+            OR search_query <% d.title
+            OR search_query <% d.author
+        )
+        AND (filter_category IS NULL OR d.category = filter_category)
+        AND (filter_file_type IS NULL OR d.file_type = filter_file_type)
+    ORDER BY GREATEST(
+            word_similarity(search_query, d.title),
+            word_similarity(search_query, COALESCE(d.author, ''))
+        ) DESC,
+        d.created_at DESC,
+        d.id DESC
+    LIMIT result_limit OFFSET result_offset;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Function: Apply the same metadata update to every document matching the IDs and/or filters.
+-- NULL fields in patch keep their value. With no IDs and no filters nothing is updated.
+CREATE OR REPLACE FUNCTION update_documents(
+    patch JSONB,
+    ids UUID[] DEFAULT NULL,
+    filter_category VARCHAR DEFAULT NULL,
+    filter_file_type VARCHAR DEFAULT NULL
+)
+RETURNS SETOF documents AS $$
+    UPDATE documents d SET
+        title = COALESCE(u.title, d.title),
+        author = COALESCE(u.author, d.author),
+        category = COALESCE(u.category, d.category),
+        -- A category set by a person is reviewed, whatever set it before
+        category_source = CASE WHEN u.category IS NULL THEN d.category_source END,
+        tags = COALESCE(u.tags, d.tags),
+        description = COALESCE(u.description, d.description)
+    FROM jsonb_to_record(patch) AS u(
+        title VARCHAR(255),
+        author VARCHAR(100),
+        category VARCHAR(50),
+        tags TEXT[],
+        description TEXT
+    )
+    WHERE (ids IS NOT NULL OR filter_category IS NOT NULL OR filter_file_type IS NOT NULL)
+        AND (ids IS NULL OR d.id = ANY(ids))
+        AND (filter_category IS NULL OR d.category = filter_category)
+        AND (filter_file_type IS NULL OR d.file_type = filter_file_type)
+    RETURNING d.*;
+$$ LANGUAGE sql;
+
+-- Function: Delete every document matching the IDs and/or filters in one statement.
+-- file_orphaned is true when no remaining document uses the file, so it can be
+-- removed from Storage. With no IDs and no filters nothing is deleted.
+CREATE OR REPLACE FUNCTION delete_documents(
+    ids UUID[] DEFAULT NULL,
+    filter_category VARCHAR DEFAULT NULL,
+    filter_file_type VARCHAR DEFAULT NULL
+)
+RETURNS TABLE (id UUID, file_url TEXT, file_orphaned BOOLEAN) AS $$
+    WITH deleted AS (
+        DELETE FROM documents d
+        WHERE (ids IS NOT NULL OR filter_category IS NOT NULL OR filter_file_type IS NOT NULL)
+            AND (ids IS NULL OR d.id = ANY(ids))
+            AND (filter_category IS NULL OR d.category = filter_category)
+            AND (filter_file_type IS NULL OR d.file_type = filter_file_type)
+        RETURNING d.id, d.file_url
+    )
+    -- The statement still sees the deleted rows in documents, so they are excluded explicitly
+    SELECT x.id, x.file_url, NOT EXISTS (
+        SELECT 1
+        FROM documents o
+        WHERE o.file_url = x.file_url
+            AND o.id NOT IN (SELECT deleted.id FROM deleted)
+    )
+    FROM deleted x;
+$$ LANGUAGE sql;
+
+-- Backfill rollups for documents that existed before the trigger was installed
+SELECT reconcile_document_rollups();
+
 -- =====================================================
 -- Sample Queries
 -- =====================================================
@@ -172,8 +763,7 @@ LIMIT 10;
 
 -- Search documents by text
 -- SELECT * FROM documents 
--- WHERE to_tsvector('portuguese', title || ' ' || COALESCE(description, '')) 
--- @@ to_tsquery('portuguese', 'search_term');
+-- WHERE search_vector @@ to_tsquery('portuguese', 'search_term:*');
 
 -- Get documents by tag
 -- SELECT * FROM documents WHERE 'tag_name' = ANY(tags);
@@ -36,6 +36,8 @@ class API {
         if (filters.search) params.append('search', filters.search);
         if (filters.limit) params.append('limit', filters.limit);
         if (filters.offset) params.append('offset', filters.offset);
+        if (filters.cursor) params.append('cursor', filters.cursor);
+        if (filters.fields) params.append('fields', filters.fields);
 
         const query = params.toString();
         const endpoint = query ? `${API_CONFIG.endpoints.documents}?${query}` : API_CONFIG.endpoints.documents;
@@ -86,6 +88,11 @@ class API {
         });
     }
 
+    // Get background job status
+    async getJob(id) {
+        return await this.request(`${API_CONFIG.endpoints.jobs}/${id}`);
+    }
+
     // Get analytics
     async getAnalytics() {
         return await this.request(API_CONFIG.endpoints.analytics);
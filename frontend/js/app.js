@@ -76,6 +76,7 @@ class DocumentManager {
 
         let successCount = 0;
         let errorCount = 0;
+        const jobIds = [];
 
         for (let i = 0; i < files.length; i++) {
             const file = files[i];
@@ -83,7 +84,8 @@ class DocumentManager {
             ui.updateProgress(progress);
 
             try {
-                await api.uploadFile(file, useAI);
+                const result = await api.uploadFile(file, useAI);
+                if (result.job_id) jobIds.push(result.job_id);
                 successCount++;
             } catch (error) {
                 console.error(`Error uploading ${file.name}:`, error);
@@ -102,12 +104,35 @@ class DocumentManager {
         if (errorCount > 0) {
             ui.showToast(`${errorCount} arquivo(s) falharam no upload`, 'error');
         }
+
+        if (jobIds.length > 0) {
+            this.waitForJobs(jobIds);
+        }
+    }
+
+    // Poll AI analysis jobs and refresh the list once they finish
+    async waitForJobs(jobIds, interval = 2000, maxAttempts = 60) {
+        let pending = [...jobIds];
+
+        for (let attempt = 0; attempt < maxAttempts && pending.length > 0; attempt++) {
+            await new Promise(resolve => setTimeout(resolve, interval));
+
+            const jobs = await Promise.all(
+                pending.map(id => api.getJob(id).catch(() => null))
+            );
+            pending = pending.filter((id, i) =>
+                jobs[i] && !['completed', 'failed'].includes(jobs[i].status)
+            );
+        }
+
+        await this.loadDocuments();
+        await dashboard.loadAnalytics();
     }
 
     // Load and display documents
     async loadDocuments() {
         try {
-            this.documents = await api.getDocuments(this.filters);
+            this.documents = await api.getDocuments({ ...this.filters, fields: CARD_FIELDS });
             this.renderDocuments();
         } catch (error) {
             console.error('Error loading documents:', error);
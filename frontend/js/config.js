@@ -5,10 +5,14 @@ const API_CONFIG = {
         documents: '/api/documents',
         analytics: '/api/analytics/stats',
         upload: '/api/documents/upload',
-        uploadAnalyze: '/api/documents/analyze-upload'
+        uploadAnalyze: '/api/documents/analyze-upload',
+        jobs: '/api/jobs'
     }
 };
 
+// Fields needed to render a document card
+const CARD_FIELDS = 'id,title,author,category,tags,description,file_type,file_size,created_at';
+
 // Category colors mapping
 const CATEGORY_COLORS = {
     'Financeiro': '#10b981',